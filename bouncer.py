@@ -0,0 +1,216 @@
+import json
+import os
+import socket
+import stat
+from itertools import islice
+
+from buffers import is_channel_name
+from framing import LineFramer
+from irc_message import parse_line
+
+SNAPSHOT_VERSION = 1
+NAMES_LINE_LENGTH = 400
+NO_NICK = "*"
+
+
+class Attacher:
+    def __init__(self, sock, number):
+        self.sock = sock
+        self.number = number
+        self.framer = LineFramer()
+        self.pending = bytearray()
+
+
+class BouncerServer:
+    max_pending = 4 * 1024 * 1024
+    backlog_lines = 200
+
+    def __init__(self, irc, path):
+        self.irc = irc
+        self.loop = irc.loop
+        self.path = path
+        self.attachers = {}
+        self.attached_total = 0
+        self.dropped = 0
+        if os.path.exists(path) and stat.S_ISSOCK(os.stat(path).st_mode):
+            os.remove(path)
+        self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.listener.bind(path)
+        os.chmod(path, 0o600)
+        self.listener.listen(8)
+        self.listener.setblocking(False)
+        self.loop.add_reader(self.listener, self.on_accept)
+
+    def on_accept(self, listener):
+        try:
+            sock, _ = listener.accept()
+        except OSError:
+            return
+        sock.setblocking(False)
+        self.attached_total += 1
+        attacher = Attacher(sock, self.attached_total)
+        self.attachers[sock] = attacher
+        self.loop.add_reader(sock, self.on_readable)
+        for line in self.snapshot():
+            self.write(attacher, line)
+        self.status(
+            f"UI {attacher.number} attached ({len(self.attachers)} attached)"
+        )
+
+    def status(self, message):
+        ui = self.irc.ui
+        ui.add_status_message(message, ui.buffers.status)
+
+    def snapshot(self):
+        # A header, then each buffer as a BUFFER line, the nick list as
+        # ordinary 353/366 replies and the last few lines of backlog.
+        irc = self.irc
+        yield "BOUNCER SNAPSHOT :" + json.dumps(
+            {
+                "version": SNAPSHOT_VERSION,
+                "nick": irc.nick,
+                "server": irc.server,
+                "connected": irc.connected,
+            }
+        )
+        source = f":{irc.server or 'bouncer'}"
+        for buffer in irc.ui.buffers:
+            if buffer.connection is not irc:
+                continue
+            yield "BOUNCER BUFFER :" + json.dumps(
+                {
+                    "name": buffer.name,
+                    "channel": buffer.is_channel,
+                    "joined": buffer.joined,
+                    "topic": buffer.topic,
+                }
+            )
+            if buffer.is_channel:
+                names = []
+                length = 0
+                for nick in buffer.nicknames:
+                    names.append(nick)
+                    length += len(nick) + 1
+                    if length > NAMES_LINE_LENGTH:
+                        yield (
+                            f"{source} 353 {irc.nick} = {buffer.name} "
+                            f":{' '.join(names)}"
+                        )
+                        names = []
+                        length = 0
+                if names:
+                    yield (
+                        f"{source} 353 {irc.nick} = {buffer.name} "
+                        f":{' '.join(names)}"
+                    )
+                yield f"{source} 366 {irc.nick} {buffer.name} :End"
+            scrollback = buffer.scrollback
+            skip = max(0, len(scrollback) - self.backlog_lines)
+            for entry in islice(scrollback.entries, skip, None):
+                timestamp, _, color, text = entry
+                nick = scrollback.get_nick(entry) or NO_NICK
+                yield (
+                    f"BOUNCER LINE {buffer.name} {timestamp!r} {color} "
+                    f"{nick} :{text}"
+                )
+        yield "BOUNCER END"
+
+    def received(self, line):
+        # The daemon answers PINGs itself.
+        if not line or line.startswith("PING "):
+            return
+        self.broadcast(line)
+
+    def broadcast(self, line, skip=None):
+        for attacher in list(self.attachers.values()):
+            if attacher is not skip:
+                self.write(attacher, line)
+
+    def write(self, attacher, line):
+        attacher.pending += (line + "\r\n").encode()
+        if len(attacher.pending) > self.max_pending:
+            # Never let a stuck UI hold data back from the others or
+            # stall the upstream reader.
+            self.dropped += 1
+            self.detach(attacher, "too slow")
+            return
+        self.flush(attacher)
+
+    def flush(self, attacher):
+        sock = attacher.sock
+        try:
+            sent = sock.send(attacher.pending)
+        except BlockingIOError:
+            sent = 0
+        except OSError:
+            self.detach(attacher, "write failed")
+            return
+        del attacher.pending[:sent]
+        if attacher.pending:
+            if not self.loop.has_writer(sock):
+                self.loop.add_writer(sock, self.on_writable)
+        elif self.loop.has_writer(sock):
+            self.loop.remove_writer(sock)
+
+    def on_writable(self, sock):
+        attacher = self.attachers.get(sock)
+        if attacher is not None:
+            self.flush(attacher)
+
+    def on_readable(self, sock):
+        attacher = self.attachers.get(sock)
+        if attacher is None:
+            return
+        try:
+            received = attacher.framer.fill(sock)
+        except BlockingIOError:
+            return
+        except OSError:
+            received = 0
+        if not received:
+            self.detach(attacher)
+            return
+        for line in attacher.framer.pop_lines():
+            if sock not in self.attachers:
+                break
+            self.handle_input(attacher, line)
+
+    def handle_input(self, attacher, line):
+        message = parse_line(line)
+        command = message.command
+        if command == "QUIT":
+            self.detach(attacher)
+            return
+        if command in ("USER", "PASS", "PONG", "CAP"):
+            return
+        self.irc.send(line)
+        if command in ("PRIVMSG", "NOTICE") and message.params:
+            if is_channel_name(message.params[0]):
+                # The server does not echo our own messages, so the
+                # backlog and the other UIs get a copy from here.
+                irc = self.irc
+                echo = f":{irc.nick}!{irc.user}@{irc.host} {line}"
+                irc.handle_message(parse_line(echo))
+                self.broadcast(echo, skip=attacher)
+
+    def detach(self, attacher, reason=None):
+        sock = attacher.sock
+        if self.attachers.pop(sock, None) is None:
+            return
+        self.loop.remove_reader(sock)
+        self.loop.remove_writer(sock)
+        sock.close()
+        message = f"UI {attacher.number} detached"
+        if reason:
+            message += f" ({reason})"
+        self.status(message)
+
+    def close(self):
+        for attacher in list(self.attachers.values()):
+            self.detach(attacher)
+        self.loop.remove_reader(self.listener)
+        self.listener.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
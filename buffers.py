@@ -0,0 +1,83 @@
+from nicklist import NickList, fold_nick
+from scrollback import Scrollback
+
+STATUS_BUFFER = "status"
+CHANNEL_PREFIXES = "#&+!"
+
+
+def is_channel_name(name):
+    return bool(name) and name[0] in CHANNEL_PREFIXES
+
+
+class Buffer:
+    def __init__(self, name, connection=None, is_channel=False):
+        self.name = name
+        self.connection = connection
+        self.is_channel = is_channel
+        self.joined = False
+        self.topic = ""
+        self.nicknames = NickList()
+        self.pending_names = None
+        self.scrollback = Scrollback()
+        self.scroll_offset = 0
+        self.unread = 0
+        self.highlights = 0
+
+    def mark_read(self):
+        self.unread = 0
+        self.highlights = 0
+
+
+class BufferList:
+    def __init__(self):
+        self.status = Buffer(STATUS_BUFFER)
+        self.buffers = [self.status]
+        self.active = self.status
+
+    def __iter__(self):
+        return iter(self.buffers)
+
+    def __len__(self):
+        return len(self.buffers)
+
+    def find(self, connection, name):
+        folded = fold_nick(name)
+        for buffer in self.buffers:
+            if (
+                buffer.connection is connection
+                and fold_nick(buffer.name) == folded
+            ):
+                return buffer
+        return None
+
+    def get(self, connection, name):
+        buffer = self.find(connection, name)
+        if buffer is None:
+            buffer = Buffer(name, connection, is_channel_name(name))
+            self.buffers.append(buffer)
+        return buffer
+
+    def remove(self, buffer):
+        if buffer is self.status or buffer not in self.buffers:
+            return
+        index = self.buffers.index(buffer)
+        self.buffers.remove(buffer)
+        if self.active is buffer:
+            self.active = self.buffers[min(index, len(self.buffers)) - 1]
+
+    def number(self, buffer):
+        return self.buffers.index(buffer) + 1
+
+    def select(self, number):
+        if 1 <= number <= len(self.buffers):
+            self.active = self.buffers[number - 1]
+            self.active.mark_read()
+            return self.active
+        return None
+
+    def activity(self):
+        return [
+            (number, buffer)
+            for number, buffer in enumerate(self.buffers, 1)
+            if buffer.unread and buffer is not self.active
+        ]
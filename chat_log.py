@@ -0,0 +1,257 @@
+import mmap
+import os
+import re
+import threading
+import time
+from queue import Queue, Empty
+
+LOG_SUFFIX = ".log"
+UNSAFE_NAME_CHARS = re.compile(r"[^\w#&+!.-]")
+LEADING_DOTS = re.compile(r"^\.+")
+
+
+def safe_name(name):
+    # "." and ".." would point outside the server or log directory.
+    name = UNSAFE_NAME_CHARS.sub("_", name.lower())
+    return LEADING_DOTS.sub("_", name) or "_"
+
+
+def format_line(timestamp, nick, text):
+    stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(timestamp))
+    if nick is None:
+        return f"{stamp} {text}\n"
+    return f"{stamp} <{nick}> {text}\n"
+
+
+def parse_log_name(filename):
+    if not filename.endswith(LOG_SUFFIX):
+        return None
+    date, _, index = filename[: -len(LOG_SUFFIX)].partition(".")
+    if len(date) != 10 or (index and not index.isdigit()):
+        return None
+    return date, int(index or 0)
+
+
+class FlushRequest:
+    def __init__(self, sync):
+        self.sync = sync
+        self.done = threading.Event()
+
+
+class LogFile:
+    def __init__(self, directory, date, index):
+        self.directory = directory
+        self.date = date
+        self.index = index
+        self.file = open(self.path(), "ab")
+
+    def path(self):
+        if self.index:
+            name = f"{self.date}.{self.index}{LOG_SUFFIX}"
+        else:
+            name = f"{self.date}{LOG_SUFFIX}"
+        return os.path.join(self.directory, name)
+
+    def size(self):
+        return self.file.tell()
+
+    def close(self):
+        self.file.close()
+
+
+class ChatLogger:
+    def __init__(
+        self,
+        directory,
+        flush_bytes=64 * 1024,
+        flush_interval=1.0,
+        max_file_bytes=16 * 1024 * 1024,
+        fsync=True,
+    ):
+        self.directory = directory
+        self.flush_bytes = flush_bytes
+        self.flush_interval = flush_interval
+        self.max_file_bytes = max_file_bytes
+        self.fsync = fsync
+        self.queue = Queue()
+        self.pending = {}
+        self.pending_bytes = 0
+        self.files = {}
+        self.lines_written = 0
+        self.flushes = 0
+        self.rotations = 0
+        self.write_errors = 0
+        self.last_error = None
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def log(self, server, buffer_name, text, nick=None, timestamp=None):
+        if timestamp is None:
+            timestamp = time.time()
+        self.queue.put((server, buffer_name, timestamp, nick, text))
+
+    def flush(self, timeout=None, sync=True):
+        if not self.thread.is_alive():
+            return False
+        request = FlushRequest(sync)
+        self.queue.put(request)
+        return request.done.wait(timeout)
+
+    def close(self):
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+
+    def run(self):
+        last_flush = time.monotonic()
+        while True:
+            wait = max(0, last_flush + self.flush_interval - time.monotonic())
+            try:
+                item = self.queue.get(True, wait)
+            except Empty:
+                item = ()
+            if item is None:
+                self.write_pending()
+                break
+            if isinstance(item, FlushRequest):
+                self.write_pending(item.sync)
+                last_flush = time.monotonic()
+                item.done.set()
+                continue
+            if item:
+                self.add_pending(*item)
+            if (
+                self.pending_bytes >= self.flush_bytes
+                or time.monotonic() - last_flush >= self.flush_interval
+            ):
+                self.write_pending()
+                last_flush = time.monotonic()
+        for log_file in self.files.values():
+            try:
+                log_file.close()
+            except OSError:
+                pass
+        self.files = {}
+
+    def add_pending(self, server, buffer_name, timestamp, nick, text):
+        date = time.strftime("%Y-%m-%d", time.localtime(timestamp))
+        data = format_line(timestamp, nick, text).encode("utf-8", "replace")
+        key = (safe_name(server), safe_name(buffer_name), date)
+        self.pending.setdefault(key, []).append(data)
+        self.pending_bytes += len(data)
+
+    def write_pending(self, sync=True):
+        if not self.pending:
+            return
+        for (server, buffer_name, date), lines in self.pending.items():
+            # A bad directory or a full disk loses these lines, not the
+            # writer thread.
+            try:
+                self.write_lines(server, buffer_name, date, lines, sync)
+            except OSError as error:
+                self.write_errors += 1
+                self.last_error = error
+                log_file = self.files.pop((server, buffer_name), None)
+                if log_file is not None:
+                    try:
+                        log_file.close()
+                    except OSError:
+                        pass
+        self.pending = {}
+        self.pending_bytes = 0
+        self.flushes += 1
+
+    def write_lines(self, server, buffer_name, date, lines, sync):
+        log_file = self.get_file(server, buffer_name, date)
+        data = b"".join(lines)
+        if (
+            log_file.size()
+            and log_file.size() + len(data) > self.max_file_bytes
+        ):
+            log_file = self.rotate(server, buffer_name, log_file)
+        log_file.file.write(data)
+        log_file.file.flush()
+        if self.fsync and sync:
+            os.fsync(log_file.file.fileno())
+        self.lines_written += len(lines)
+
+    def channel_directory(self, server, buffer_name):
+        return os.path.join(self.directory, server, buffer_name)
+
+    def get_file(self, server, buffer_name, date):
+        log_file = self.files.get((server, buffer_name))
+        if log_file is not None and log_file.date == date:
+            return log_file
+        if log_file is not None:
+            log_file.close()
+        directory = self.channel_directory(server, buffer_name)
+        os.makedirs(directory, exist_ok=True)
+        indexes = [
+            parsed[1]
+            for parsed in map(parse_log_name, os.listdir(directory))
+            if parsed and parsed[0] == date
+        ]
+        log_file = LogFile(directory, date, max(indexes, default=0))
+        self.files[(server, buffer_name)] = log_file
+        return log_file
+
+    def rotate(self, server, buffer_name, log_file):
+        log_file.close()
+        self.rotations += 1
+        log_file = LogFile(
+            log_file.directory, log_file.date, log_file.index + 1
+        )
+        self.files[(server, buffer_name)] = log_file
+        return log_file
+
+    def log_files(self, server=None, buffer_name=None):
+        result = []
+        if not os.path.isdir(self.directory):
+            return result
+        servers = [safe_name(server)] if server else os.listdir(self.directory)
+        for server_name in servers:
+            server_directory = os.path.join(self.directory, server_name)
+            if not os.path.isdir(server_directory):
+                continue
+            if buffer_name:
+                names = [safe_name(buffer_name)]
+            else:
+                names = os.listdir(server_directory)
+            for name in names:
+                directory = os.path.join(server_directory, name)
+                if not os.path.isdir(directory):
+                    continue
+                for filename in os.listdir(directory):
+                    parsed = parse_log_name(filename)
+                    if parsed:
+                        path = os.path.join(directory, filename)
+                        result.append((parsed, path))
+        result.sort(reverse=True)
+        return [path for parsed, path in result]
+
+    def search(self, pattern, server=None, buffer_name=None):
+        # Reads only need the data in the files, not on disk.
+        self.flush(sync=False)
+        if isinstance(pattern, str):
+            pattern = re.compile(
+                pattern.encode("utf-8"), re.IGNORECASE | re.MULTILINE
+            )
+        for path in self.log_files(server, buffer_name):
+            channel = os.path.basename(os.path.dirname(path))
+            for line in search_file(pattern, path):
+                yield channel, line.decode("utf-8", "replace")
+
+
+def search_file(pattern, path):
+    with open(path, "rb") as log:
+        if os.fstat(log.fileno()).st_size == 0:
+            return
+        with mmap.mmap(log.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            end = len(data)
+            if data[end - 1:end] == b"\n":
+                end -= 1
+            while end > 0:
+                start = data.rfind(b"\n", 0, end) + 1
+                if pattern.search(data, start, end):
+                    yield data[start:end]
+                end = start - 1
@@ -0,0 +1,188 @@
+import errno
+import os
+import random
+import socket
+import threading
+
+IN_PROGRESS = (0, errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EAGAIN)
+
+
+def interleave_families(addresses):
+    families = {}
+    for address in addresses:
+        families.setdefault(address[0], []).append(address)
+    groups = list(families.values())
+    result = []
+    while groups:
+        for group in list(groups):
+            result.append(group.pop(0))
+            if not group:
+                groups.remove(group)
+    return result
+
+
+def backoff_delay(attempt, base, maximum):
+    delay = min(maximum, base * 2 ** attempt)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+class Connector:
+    resolve_poll_interval = 0.005
+
+    def __init__(
+        self,
+        loop,
+        host,
+        port,
+        on_connected,
+        on_failed,
+        timeout=10,
+        stagger=0.25,
+    ):
+        self.loop = loop
+        self.host = host
+        self.port = port
+        self.on_connected = on_connected
+        self.on_failed = on_failed
+        self.timeout = timeout
+        self.stagger = stagger
+        self.addresses = []
+        self.attempts = []
+        self.resolved = None
+        self.last_error = None
+        self.deadline_timer = None
+        self.stagger_timer = None
+        self.resolve_timer = None
+        self.done = False
+
+    def start(self, addresses=None):
+        self.deadline_timer = self.loop.call_later(
+            self.timeout, self.on_timeout
+        )
+        if addresses is not None:
+            self.connect_to(addresses)
+            return
+        try:
+            addresses = socket.getaddrinfo(
+                self.host,
+                self.port,
+                type=socket.SOCK_STREAM,
+                flags=socket.AI_NUMERICHOST,
+            )
+        except socket.gaierror:
+            self.resolve_in_thread()
+            return
+        self.connect_to(addresses)
+
+    def resolve_in_thread(self):
+        # getaddrinfo has no non-blocking form, so names are resolved on a
+        # short-lived thread and the loop polls for the answer.
+        resolved = self.resolved = []
+
+        def resolve():
+            try:
+                resolved.append(
+                    socket.getaddrinfo(
+                        self.host, self.port, type=socket.SOCK_STREAM
+                    )
+                )
+            except OSError as e:
+                resolved.append(e)
+
+        threading.Thread(target=resolve, daemon=True).start()
+        self.check_resolved()
+
+    def check_resolved(self):
+        self.resolve_timer = None
+        if self.done:
+            return
+        if not self.resolved:
+            self.resolve_timer = self.loop.call_later(
+                self.resolve_poll_interval, self.check_resolved
+            )
+            return
+        result = self.resolved[0]
+        if isinstance(result, Exception):
+            self.fail(result)
+        else:
+            self.connect_to(result)
+
+    def connect_to(self, addresses):
+        self.addresses = interleave_families(addresses)
+        if not self.addresses:
+            self.fail(OSError(f"no addresses for {self.host}"))
+            return
+        self.attempt_next()
+
+    def attempt_next(self):
+        self.stagger_timer = None
+        if self.done:
+            return
+        if not self.addresses:
+            if not self.attempts:
+                self.fail(self.last_error or OSError("connection failed"))
+            return
+        family, kind, proto, _, address = self.addresses.pop(0)
+        try:
+            sock = socket.socket(family, kind, proto)
+        except OSError as e:
+            self.last_error = e
+            self.attempt_next()
+            return
+        sock.setblocking(False)
+        error = sock.connect_ex(address)
+        if error not in IN_PROGRESS:
+            sock.close()
+            self.last_error = OSError(error, os.strerror(error))
+            self.attempt_next()
+            return
+        self.attempts.append(sock)
+        self.loop.add_writer(sock, self.on_writable)
+        if self.addresses:
+            self.stagger_timer = self.loop.call_later(
+                self.stagger, self.attempt_next
+            )
+
+    def on_writable(self, sock):
+        self.loop.remove_writer(sock)
+        error = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+        if error == 0:
+            self.attempts.remove(sock)
+            self.finish()
+            self.on_connected(sock)
+            return
+        self.attempts.remove(sock)
+        sock.close()
+        self.last_error = OSError(error, os.strerror(error))
+        if self.stagger_timer is not None:
+            self.stagger_timer.cancel()
+        self.attempt_next()
+
+    def on_timeout(self):
+        self.deadline_timer = None
+        self.fail(TimeoutError(f"timed out after {self.timeout}s"))
+
+    def fail(self, error):
+        if self.done:
+            return
+        self.finish()
+        self.on_failed(error)
+
+    def finish(self):
+        self.done = True
+        for timer in (
+            self.deadline_timer,
+            self.stagger_timer,
+            self.resolve_timer,
+        ):
+            if timer is not None:
+                timer.cancel()
+        for sock in self.attempts:
+            self.loop.remove_writer(sock)
+            sock.close()
+        self.attempts = []
+        self.addresses = []
+
+    def cancel(self):
+        if not self.done:
+            self.finish()
@@ -1,16 +1,52 @@
 import curses
+import locale
+import os
+import sys
+import time
+from contextlib import contextmanager
 
+from buffers import Buffer
+from line_editor import KeyDecoder, LineEditor
+from metrics import Histogram
+from ui_backend import UIBackend
 
-class CursesInterface:
-    def __init__(self, irc):
+BRACKETED_PASTE_ON = "\x1b[?2004h"
+BRACKETED_PASTE_OFF = "\x1b[?2004l"
+
+
+class CursesInterface(UIBackend):
+    banner = True
+
+    def __init__(self, irc, max_fps=30, buffer=None):
         self.debug_enabled = False
         self.irc = irc
-        self.buffer = ""
+        self.input = sys.stdin
+        self.editor = LineEditor()
+        self.keys = KeyDecoder()
+        self.input_changed = False
+        self.batch_depth = 0
+        self.update_pending = False
+        self.max_fps = max_fps
+        self.last_frame = 0
+        self.frame_timer = None
+        self.dirty = {"borders", "chat", "nick", "input", "debug"}
+        self.resize_pending = False
+        self.frames_rendered = 0
+        self.frames_skipped = 0
+        self.curses_time = 0
+        self.render_time = Histogram()
+        self.rendering = False
+        self.active = buffer or Buffer("status")
+        self.activity = ""
+        self.nicknames = []
+        self.nick_rows_drawn = 0
+        locale.setlocale(locale.LC_CTYPE, "")
         curses.setupterm()
         self.colors = curses.tigetnum("colors")
         self.screen = curses.initscr()
         curses.cbreak()
         curses.noecho()
+        self.write_terminal(BRACKETED_PASTE_ON)
         if curses.has_colors():
             curses.start_color()
             curses.use_default_colors()
@@ -29,27 +65,81 @@ class CursesInterface:
 
     def run(self):
         while True:
-            self.irc.poll()
-            yield self.poll_kb()
-
-    def poll_kb(self):
-        keycode = self.input_window.getch()
-        kb_input = None
-        if keycode >= 0:
-            if keycode == 10:  # Enter
-                if self.buffer != "":
-                    kb_input = self.buffer
-                    self.buffer = ""
-                    self.clear_input_window()
-            elif keycode == 127:  # Backspace
-                if self.buffer != "":
-                    self.buffer = self.buffer[:-1]
-                    y, x = self.input_window.getyx()
-                    self.input_window.delch(y, x - 1)
-            elif (keycode >= 32) and (keycode < 127):
-                self.buffer = self.buffer + chr(keycode)
-                self.input_window.addch(keycode)
-        return kb_input
+            self.irc.ui.poll()
+            yield from self.read_keyboard()
+
+    def read_keyboard(self):
+        # Everything the terminal has buffered is handled in one go, and
+        # the input line is redrawn once at the end.
+        while True:
+            keycode = self.input_window.getch()
+            if keycode < 0:
+                break
+            kb_input = self.handle_event(self.keys.feed(keycode))
+            if kb_input:
+                yield kb_input
+        if self.input_changed:
+            self.input_changed = False
+            self.redraw_input()
+            self.update()
+
+    def handle_event(self, event):
+        if event is None:
+            return None
+        kind, value = event
+        if kind == "text":
+            self.editor.insert(value)
+            self.input_changed = True
+        elif kind == "paste":
+            self.editor.insert(value)
+            self.input_changed = True
+            if "\n" in value:
+                return self.editor.take_lines()
+        elif kind == "alt":
+            if "0" <= value <= "9":
+                self.irc.ui.switch_buffer(int(value) or 10)
+        else:
+            return self.handle_key(value)
+        return None
+
+    def handle_key(self, keycode):
+        editor = self.editor
+        if keycode == curses.KEY_RESIZE:
+            self.request_resize()
+            return None
+        elif keycode == curses.KEY_PPAGE:
+            self.scroll(self.chat_window_height - 1)
+            return None
+        elif keycode == curses.KEY_NPAGE:
+            self.scroll(-(self.chat_window_height - 1))
+            return None
+        elif keycode in (10, 13, curses.KEY_ENTER):
+            self.input_changed = True
+            return editor.submit() or None
+        elif keycode in (8, 127, curses.KEY_BACKSPACE):
+            editor.backspace()
+        elif keycode == curses.KEY_DC:
+            editor.delete()
+        elif keycode == curses.KEY_LEFT:
+            editor.left()
+        elif keycode == curses.KEY_RIGHT:
+            editor.right()
+        elif keycode in (1, curses.KEY_HOME):  # Ctrl-A
+            editor.home()
+        elif keycode in (5, curses.KEY_END):  # Ctrl-E
+            editor.end()
+        elif keycode == 21:  # Ctrl-U
+            editor.kill_to_start()
+        elif keycode == 23:  # Ctrl-W
+            editor.kill_word()
+        elif keycode == curses.KEY_UP:
+            editor.history_previous()
+        elif keycode == curses.KEY_DOWN:
+            editor.history_next()
+        else:
+            return None
+        self.input_changed = True
+        return None
 
     def make_windows(self):
         self.input_window = curses.newwin(
@@ -84,6 +174,7 @@ class CursesInterface:
         self.nick_window.scrollok(1)
         self.input_window.scrollok(1)
         self.input_window.nodelay(1)
+        self.input_window.keypad(1)
         self.debug_window.scrollok(1)
 
     def update_geometry(self):
@@ -109,12 +200,91 @@ class CursesInterface:
     def resize_window(self):
         self.update_geometry()
         self.make_windows()
+        self.redraw_input()
+        self.redraw_chat()
+        self.nick_rows_drawn = 0
+        if self.nicknames:
+            self.set_nicknames(self.nicknames)
+        self.dirty.update(("borders", "chat", "nick", "input", "debug"))
+
+    def request_resize(self, query_terminal=False):
+        if query_terminal:
+            columns, lines = os.get_terminal_size()
+            curses.resizeterm(lines, columns)
+        self.resize_pending = True
         self.update()
 
+    def mark_dirty(self, *names):
+        self.dirty.update(names)
+
+    @contextmanager
+    def batch(self):
+        self.batch_depth += 1
+        try:
+            yield
+        finally:
+            self.batch_depth -= 1
+            if self.batch_depth == 0 and self.update_pending:
+                self.update()
+
     def update(self):
-        height, width = self.screen.getmaxyx()
-        if width != self.screen_width or height != self.screen_height:
-            self.resize_window()
+        if self.rendering:
+            return
+        if self.batch_depth > 0:
+            self.update_pending = True
+            return
+        self.update_pending = False
+        if self.frame_timer is not None:
+            self.frames_skipped += 1
+            return
+        delay = 0
+        if self.max_fps:
+            delay = self.last_frame + 1 / self.max_fps - time.monotonic()
+        if delay > 0:
+            self.frames_skipped += 1
+            self.frame_timer = self.irc.loop.call_later(
+                delay, self.render_scheduled
+            )
+        else:
+            self.render()
+
+    def render_scheduled(self):
+        self.frame_timer = None
+        self.render()
+
+    def render(self):
+        start = time.perf_counter()
+        self.rendering = True
+        try:
+            if self.resize_pending:
+                self.resize_pending = False
+                self.resize_window()
+            dirty = self.dirty
+            if "borders" in dirty:
+                self.draw_borders()
+                self.screen.noutrefresh()
+            if "chat" in dirty:
+                self.chat_window.noutrefresh()
+            if "nick" in dirty:
+                self.nick_window.noutrefresh()
+            if self.debug_enabled and dirty:
+                if dirty.intersection(("borders", "chat", "nick")):
+                    self.debug_border.touchwin()
+                    self.debug_window.touchwin()
+                self.debug_border.noutrefresh()
+                self.debug_window.noutrefresh()
+            self.input_window.noutrefresh()
+            curses.doupdate()
+            dirty.clear()
+        finally:
+            self.rendering = False
+        self.last_frame = time.monotonic()
+        self.frames_rendered += 1
+        elapsed = time.perf_counter() - start
+        self.curses_time += elapsed
+        self.render_time.record(elapsed)
+
+    def draw_borders(self):
         self.screen.attron(self.border_color_pair)
         self.screen.hline(
             self.chat_window_height, 0, curses.ACS_HLINE, self.screen_width
@@ -128,51 +298,115 @@ class CursesInterface:
         self.screen.addch(
             self.chat_window_height, self.chat_window_width, curses.ACS_BTEE
         )
-        self.screen.refresh()
-        self.chat_window.refresh()
-        self.nick_window.refresh()
-        self.input_window.refresh()
-        if self.debug_enabled:
-            self.debug_border.attron(self.border_color_pair)
-            self.debug_border.border(0)
-            self.debug_border.refresh()
-            self.debug_window.redrawwin()
-            self.debug_window.refresh()
-        curses.doupdate()
+        self.debug_border.attron(self.border_color_pair)
+        self.debug_border.border(0)
+
+    def get_render_stats(self):
+        return {
+            "frames_rendered": self.frames_rendered,
+            "frames_skipped": self.frames_skipped,
+            "curses_time": self.curses_time,
+            "render": self.render_time.summary(),
+        }
 
     def clear_input_window(self):
+        connection = self.active.connection or self.irc
+        name = self.active.name if self.active.connection else "~"
+        prompt = connection.nick + "@" + name
+        if self.activity:
+            prompt += " [" + self.activity + "]"
         self.input_window.move(0, 0)
         self.input_window.deleteln()
-        self.input_window.addstr(
-            self.irc.nick + "@" + self.irc.get_channel() + "> "
-        )
+        self.input_window.addstr(prompt[: self.screen_width // 2] + "> ")
+
+    def redraw_input(self):
+        self.clear_input_window()
+        _, start = self.input_window.getyx()
+        text, cursor = self.editor.view(self.screen_width - start - 1)
+        self.input_window.addstr(text)
+        self.input_window.move(0, start + cursor)
+        self.dirty.add("input")
+
+    def set_activity(self, activity):
+        if activity != self.activity:
+            self.activity = activity
+            self.redraw_input()
+            self.update()
 
-    def add_message(self, message, color):
-        pair = curses.color_pair(color)
-        self.chat_window.addstr("\n" + message, pair)
+    def show_buffer(self, buffer):
+        self.active = buffer
+        self.redraw_chat()
+        self.set_nicknames(buffer.nicknames)
+        self.redraw_input()
         self.update()
 
+    def chat_wrap_width(self):
+        return max(1, self.chat_window_width - 1)
+
+    def add_message(self, buffer):
+        rows = buffer.scrollback.wrap_last(self.chat_wrap_width())
+        if buffer.scroll_offset:
+            buffer.scroll_offset += len(rows)
+            return
+        pair = curses.color_pair(buffer.scrollback.entries[-1][2])
+        for row in rows:
+            self.chat_window.addstr("\n" + row, pair)
+        self.dirty.add("chat")
+        self.update()
+
+    def redraw_chat(self):
+        height = self.chat_window_height
+        rows, self.active.scroll_offset = self.active.scrollback.page(
+            self.active.scroll_offset, height, self.chat_wrap_width()
+        )
+        self.chat_window.erase()
+        top = height - len(rows)
+        for i, (color, row) in enumerate(rows):
+            self.chat_window.addstr(top + i, 0, row, curses.color_pair(color))
+        self.chat_window.move(height - 1, 0)
+        self.dirty.add("chat")
+
+    def scroll(self, rows):
+        offset = max(0, self.active.scroll_offset + rows)
+        if offset != self.active.scroll_offset:
+            self.active.scroll_offset = offset
+            self.redraw_chat()
+            self.update()
+
     def add_debug_message(self, message):
         if self.have_color:
             self.debug_window.addstr("\n" + message, self.debug_color_pair)
         else:
             self.debug_window.addstr("\n" + message)
+        self.dirty.add("debug")
         if self.debug_enabled:
             self.update()
 
-    def set_nicknames(self, nicknames):
-        self.nick_window.clear()
-        nicks = sorted(nicknames)[: self.nick_window_height]
-        for i, nick in enumerate(nicks):
+    def set_nicknames(self, nicknames, start=0):
+        self.nicknames = nicknames
+        height = self.nick_window_height
+        if start >= height:
+            return
+        nicks = nicknames.slice(start, height)
+        for i in range(start, max(start + len(nicks), self.nick_rows_drawn)):
             self.nick_window.move(i, 0)
-            self.nick_window.addstr(self.truncate_name(nick))
+            self.nick_window.clrtoeol()
+            if i - start < len(nicks):
+                self.nick_window.addstr(self.truncate_name(nicks[i - start]))
+        self.nick_rows_drawn = start + len(nicks)
+        self.dirty.add("nick")
         self.update()
 
     def init_colors(self):
         for i in range(self.colors):
             curses.init_pair(i, i, -1)
 
+    def write_terminal(self, sequence):
+        sys.stdout.write(sequence)
+        sys.stdout.flush()
+
     def shutdown(self):
+        self.write_terminal(BRACKETED_PASTE_OFF)
         curses.nocbreak()
         curses.endwin()
 
@@ -180,7 +414,9 @@ class CursesInterface:
         self.debug_enabled = not self.debug_enabled
         self.chat_window.touchwin()
         self.nick_window.touchwin()
+        self.debug_border.touchwin()
         self.debug_window.touchwin()
+        self.dirty.update(("borders", "chat", "nick", "input", "debug"))
         self.update()
 
     def truncate_name(self, s):
@@ -0,0 +1,513 @@
+import ipaddress
+import mmap
+import os
+import socket
+import struct
+import threading
+import time
+from queue import Empty, Queue
+
+from outbound import TokenBucket
+
+CHUNK_SIZE = 256 * 1024
+WINDOW_SIZE = 64 * 1024 * 1024
+ACK = struct.Struct("!I")
+RECV_FLAGS = getattr(socket, "MSG_DONTWAIT", 0)
+PART_SUFFIX = ".part"
+
+
+class DccError(Exception):
+    pass
+
+
+def split_dcc(text):
+    # DCC SEND "file name.log" 2130706433 5000 1234, quotes optional.
+    kind, _, rest = text.strip().partition(" ")
+    rest = rest.strip()
+    if rest.startswith('"'):
+        end = rest.find('"', 1)
+        if end == -1:
+            raise DccError("Unterminated file name")
+        filename = rest[1:end]
+        args = rest[end + 1:].split()
+    else:
+        filename, *args = rest.split() or [""]
+    if not filename:
+        raise DccError("Missing file name")
+    return kind.upper(), filename, args
+
+
+def parse_number(value, what):
+    if not value.isdigit():
+        raise DccError(f"Bad {what}: {value}")
+    return int(value)
+
+
+def encode_address(address):
+    ip = ipaddress.ip_address(address)
+    if ip.version == 4:
+        return str(int(ip))
+    return str(ip)
+
+
+def decode_address(value):
+    if value.isdigit():
+        return str(ipaddress.IPv4Address(int(value)))
+    return str(ipaddress.ip_address(value))
+
+
+def quote_filename(filename):
+    if " " in filename:
+        return f'"{filename}"'
+    return filename
+
+
+def safe_filename(filename):
+    name = os.path.basename(filename.replace("\\", "/")).lstrip(".")
+    return name or "dcc-file"
+
+
+def format_size(size):
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if size < 1024 or unit == "GiB":
+            break
+        size /= 1024
+    if unit == "B":
+        return f"{size} B"
+    return f"{size:.1f} {unit}"
+
+
+class RateLimiter:
+    # A TokenBucket counting bytes, shared between transfer threads.
+
+    def __init__(self, rate, clock=time.monotonic):
+        self.rate = rate
+        self.lock = threading.Lock()
+        self.bucket = TokenBucket(max(4096, rate / 10), rate, clock)
+
+    def capacity(self):
+        return int(self.bucket.capacity)
+
+    def acquire(self, amount, cancelled):
+        while True:
+            with self.lock:
+                delay = self.bucket.delay(amount)
+                if delay == 0:
+                    self.bucket.consume(amount)
+                    return amount
+            if cancelled.wait(delay):
+                return 0
+
+
+class Transfer(threading.Thread):
+    direction = None
+
+    def __init__(self, number, nick, filename, path, size, limiters):
+        super().__init__(daemon=True)
+        self.number = number
+        self.nick = nick
+        self.filename = filename
+        self.path = path
+        self.size = size
+        self.limiters = limiters
+        self.offset = 0
+        self.position = 0
+        self.port = 0
+        self.state = "waiting"
+        self.error = None
+        self.started = None
+        self.finished = None
+        self.cancelled = threading.Event()
+        self.sock = None
+        self.connection = None
+        self.on_finished = None
+
+    def run(self):
+        try:
+            self.transfer()
+        except (OSError, ValueError, DccError) as error:
+            if self.cancelled.is_set():
+                self.state = "cancelled"
+            else:
+                self.state = "failed"
+                self.error = error
+        else:
+            self.state = "done"
+        finally:
+            self.finished = time.monotonic()
+            self.close()
+            if self.on_finished is not None:
+                self.on_finished(self)
+
+    def grant(self, wanted):
+        for limiter in self.limiters:
+            wanted = min(wanted, limiter.capacity())
+        for limiter in self.limiters:
+            if not limiter.acquire(wanted, self.cancelled):
+                raise DccError("Cancelled")
+        return wanted
+
+    def begin(self, sock):
+        if self.cancelled.is_set():
+            sock.close()
+            raise DccError("Cancelled")
+        self.sock = sock
+        self.position = self.offset
+        self.started = time.monotonic()
+        self.state = "active"
+
+    def cancel(self):
+        self.cancelled.set()
+        if self.state in ("waiting", "offered"):
+            self.state = "cancelled"
+        self.close()
+
+    def close(self):
+        sock = self.sock
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            sock.close()
+
+    def rate(self):
+        if self.started is None:
+            return 0
+        elapsed = (self.finished or time.monotonic()) - self.started
+        if elapsed <= 0:
+            return 0
+        return (self.position - self.offset) / elapsed
+
+    def describe(self):
+        if self.direction == "send":
+            what = f"send {self.filename} to {self.nick}"
+        else:
+            what = f"get {self.filename} from {self.nick}"
+        done = self.position / self.size * 100 if self.size else 100
+        text = (
+            f"{self.number}: {what} {self.state} {done:.0f}% "
+            f"{format_size(self.position)}/{format_size(self.size)}"
+        )
+        rate = self.rate()
+        if self.state in ("active", "done") and rate > 0:
+            text += f" {format_size(int(rate))}/s"
+            if self.state == "active":
+                eta = (self.size - self.position) / rate
+                text += f" ETA {eta:.0f}s"
+        elif self.state == "failed":
+            text += f" ({self.error})"
+        return text
+
+
+class SendTransfer(Transfer):
+    direction = "send"
+    accept_timeout = 300
+    accept_poll_interval = 0.5
+    close_timeout = 30
+
+    def __init__(self, number, nick, path, limiters, bind_address=""):
+        size = os.path.getsize(path)
+        super().__init__(
+            number, nick, os.path.basename(path), path, size, limiters
+        )
+        family = socket.AF_INET6 if ":" in bind_address else socket.AF_INET
+        self.listener = socket.socket(family, socket.SOCK_STREAM)
+        self.listener.bind((bind_address, 0))
+        self.listener.listen(1)
+        self.listener.settimeout(self.accept_poll_interval)
+        self.port = self.listener.getsockname()[1]
+        self.acks = bytearray()
+        self.acked = None
+
+    def resume(self, position):
+        if self.state != "waiting" or not 0 <= position <= self.size:
+            return False
+        self.offset = self.position = position
+        return True
+
+    def accept(self):
+        # Closing a listener does not wake a blocked accept everywhere,
+        # so poll for cancellation instead.
+        deadline = time.monotonic() + self.accept_timeout
+        try:
+            while not self.cancelled.is_set():
+                try:
+                    sock, _ = self.listener.accept()
+                except socket.timeout:
+                    if time.monotonic() > deadline:
+                        raise DccError("Nobody connected")
+                    continue
+                sock.settimeout(None)
+                return sock
+            raise DccError("Cancelled")
+        finally:
+            self.listener.close()
+
+    def transfer(self):
+        self.begin(self.accept())
+        with open(self.path, "rb") as source:
+            while self.position < self.size:
+                count = self.grant(min(CHUNK_SIZE, self.size - self.position))
+                sent = self.send_chunk(source, count)
+                if not sent:
+                    raise DccError("File ended early")
+                self.position += sent
+                self.read_acks(RECV_FLAGS)
+        self.finish()
+
+    def send_chunk(self, source, count):
+        if hasattr(os, "sendfile"):
+            return os.sendfile(
+                self.sock.fileno(), source.fileno(), self.position, count
+            )
+        return self.sock.sendfile(source, self.position, count)
+
+    def read_acks(self, flags=0):
+        # The receiver acknowledges every read. Nothing waits for acks
+        # while sending, but they must be read or both sides stall.
+        try:
+            data = self.sock.recv(65536, flags)
+        except (BlockingIOError, InterruptedError):
+            return True
+        acks = self.acks
+        acks += data
+        complete = len(acks) - len(acks) % ACK.size
+        if complete:
+            self.acked = ACK.unpack_from(acks, complete - ACK.size)[0]
+            del acks[:complete]
+        return bool(data)
+
+    def finish(self):
+        # Done only once the receiver has acknowledged the last byte;
+        # acks count modulo 2**32, as the protocol never grew wider.
+        expected = self.size & 0xFFFFFFFF
+        self.sock.shutdown(socket.SHUT_WR)
+        self.sock.settimeout(self.close_timeout)
+        try:
+            while self.acked != expected and self.read_acks():
+                pass
+        except socket.timeout:
+            pass
+        if self.size > self.offset and self.acked != expected:
+            raise DccError("Receiver did not confirm the whole file")
+
+
+class ReceiveTransfer(Transfer):
+    direction = "receive"
+    connect_timeout = 30
+
+    def __init__(self, number, nick, filename, address, port, size, limiters):
+        super().__init__(number, nick, filename, None, size, limiters)
+        self.address = address
+        self.port = port
+        self.state = "offered"
+        self.final_path = None
+        self.resume_position = None
+
+    def transfer(self):
+        sock = socket.create_connection(
+            (self.address, self.port), self.connect_timeout
+        )
+        sock.settimeout(None)
+        self.begin(sock)
+        with open(self.path, "r+b") as target:
+            try:
+                self.receive(target)
+            finally:
+                # The file never claims more than has arrived, so a
+                # later resume starts from the right place.
+                target.truncate(self.position)
+        os.replace(self.path, self.final_path)
+        self.path = self.final_path
+
+    def receive(self, target):
+        window = None
+        window_start = window_end = 0
+        try:
+            while self.position < self.size:
+                if window is None or self.position >= window_end:
+                    if window is not None:
+                        window.close()
+                    window_start = self.position - (
+                        self.position % mmap.ALLOCATIONGRANULARITY
+                    )
+                    window_end = min(self.size, window_start + WINDOW_SIZE)
+                    target.truncate(window_end)
+                    window = mmap.mmap(
+                        target.fileno(),
+                        window_end - window_start,
+                        offset=window_start,
+                    )
+                wanted = min(CHUNK_SIZE, window_end - self.position)
+                count = self.grant(wanted)
+                start = self.position - window_start
+                view = memoryview(window)[start:start + count]
+                try:
+                    received = self.sock.recv_into(view)
+                finally:
+                    view.release()
+                if not received:
+                    raise DccError(
+                        f"Connection closed after {format_size(self.position)}"
+                    )
+                self.position += received
+                self.sock.sendall(ACK.pack(self.position & 0xFFFFFFFF))
+        finally:
+            if window is not None:
+                window.close()
+
+
+class DccManager:
+    def __init__(self, directory=".", rate=0, transfer_rate=0):
+        self.directory = directory
+        self.transfer_rate = transfer_rate
+        self.limiter = RateLimiter(rate) if rate else None
+        self.transfers = {}
+        self.count = 0
+        self.finished = Queue()
+
+    def limiters(self):
+        limiters = []
+        if self.transfer_rate:
+            limiters.append(RateLimiter(self.transfer_rate))
+        if self.limiter is not None:
+            limiters.append(self.limiter)
+        return limiters
+
+    def add(self, transfer):
+        transfer.on_finished = self.finished.put
+        self.transfers[transfer.number] = transfer
+        return transfer
+
+    def next_number(self):
+        self.count += 1
+        return self.count
+
+    def active(self):
+        return any(
+            transfer.finished is None
+            and transfer.state in ("waiting", "active")
+            for transfer in self.transfers.values()
+        )
+
+    def send(self, nick, path, bind_address=""):
+        transfer = SendTransfer(
+            self.next_number(), nick, path, self.limiters(), bind_address
+        )
+        self.add(transfer)
+        transfer.start()
+        return transfer
+
+    def offer(self, nick, text):
+        kind, filename, args = split_dcc(text)
+        if kind != "SEND" or len(args) < 3:
+            raise DccError(f"Unsupported DCC {kind}")
+        address = decode_address(args[0])
+        port = parse_number(args[1], "port")
+        size = parse_number(args[2], "size")
+        if not port:
+            raise DccError("Passive DCC is not supported")
+        return self.add(
+            ReceiveTransfer(
+                self.next_number(),
+                nick,
+                filename,
+                address,
+                port,
+                size,
+                self.limiters(),
+            )
+        )
+
+    def get(self, number):
+        # Returns the resume position to ask for, or None when the
+        # transfer has started straight away.
+        transfer = self.transfers.get(number)
+        if transfer is None or transfer.state != "offered":
+            raise DccError(f"No pending offer {number}")
+        # Downloads land in a .part file that is renamed when complete,
+        # so only files this client left unfinished are ever resumed.
+        os.makedirs(self.directory, exist_ok=True)
+        name = safe_filename(transfer.filename)
+        path = os.path.join(self.directory, name)
+        suffix = 0
+        while True:
+            partial = path + PART_SUFFIX
+            if not os.path.exists(path):
+                if not os.path.exists(partial):
+                    break
+                existing = os.path.getsize(partial)
+                if 0 < existing < transfer.size:
+                    transfer.final_path = path
+                    transfer.path = partial
+                    transfer.resume_position = existing
+                    transfer.state = "waiting"
+                    return existing
+            suffix += 1
+            path = os.path.join(self.directory, f"{name}.{suffix}")
+        # Created up front, so a second offer of the same name picks
+        # another one.
+        open(partial, "xb").close()
+        transfer.final_path = path
+        transfer.path = partial
+        transfer.state = "waiting"
+        transfer.start()
+        return None
+
+    def find(self, direction, nick, port):
+        for transfer in self.transfers.values():
+            if (
+                transfer.direction == direction
+                and transfer.port == port
+                and transfer.nick.lower() == nick.lower()
+                and transfer.state == "waiting"
+            ):
+                return transfer
+        return None
+
+    def resume_requested(self, nick, text):
+        _, _, args = split_dcc(text)
+        port = parse_number(args[0] if args else "", "port")
+        position = parse_number(args[1] if len(args) > 1 else "", "position")
+        transfer = self.find("send", nick, port)
+        if transfer is None or not transfer.resume(position):
+            raise DccError(f"Cannot resume on port {port}")
+        return transfer
+
+    def resume_accepted(self, nick, text):
+        _, _, args = split_dcc(text)
+        port = parse_number(args[0] if args else "", "port")
+        position = parse_number(args[1] if len(args) > 1 else "", "position")
+        transfer = self.find("receive", nick, port)
+        if (
+            transfer is None
+            or transfer.is_alive()
+            or transfer.resume_position is None
+        ):
+            raise DccError(f"No resume pending on port {port}")
+        if position != transfer.resume_position:
+            raise DccError(f"Bad resume position {position}")
+        transfer.offset = transfer.position = position
+        transfer.start()
+        return transfer
+
+    def cancel(self, number):
+        transfer = self.transfers.get(number)
+        if transfer is None:
+            raise DccError(f"No transfer {number}")
+        transfer.cancel()
+        return transfer
+
+    def pop_finished(self):
+        finished = []
+        while True:
+            try:
+                finished.append(self.finished.get_nowait())
+            except Empty:
+                return finished
+
+    def close(self):
+        for transfer in self.transfers.values():
+            if transfer.finished is None:
+                transfer.cancel()
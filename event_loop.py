@@ -0,0 +1,145 @@
+import heapq
+import itertools
+import selectors
+import signal
+import socket
+import time
+
+
+class Timer:
+    def __init__(self, deadline, callback, args):
+        self.deadline = deadline
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class EventLoop:
+    def __init__(self):
+        self.selector = selectors.DefaultSelector()
+        self.timers = []
+        self.sequence = itertools.count()
+        self.running = False
+        self.signal_handlers = {}
+        self.wakeup_reader = None
+        self.wakeup_writer = None
+
+    def get_callbacks(self, fileobj):
+        try:
+            return self.selector.get_key(fileobj).data
+        except (KeyError, ValueError):
+            return None, None
+
+    def set_callbacks(self, fileobj, reader, writer):
+        mask = 0
+        if reader:
+            mask |= selectors.EVENT_READ
+        if writer:
+            mask |= selectors.EVENT_WRITE
+        registered = self.get_callbacks(fileobj) != (None, None)
+        if not mask:
+            if registered:
+                self.selector.unregister(fileobj)
+        elif registered:
+            self.selector.modify(fileobj, mask, (reader, writer))
+        else:
+            self.selector.register(fileobj, mask, (reader, writer))
+
+    def add_reader(self, fileobj, callback):
+        self.set_callbacks(fileobj, callback, self.get_callbacks(fileobj)[1])
+
+    def remove_reader(self, fileobj):
+        self.set_callbacks(fileobj, None, self.get_callbacks(fileobj)[1])
+
+    def has_reader(self, fileobj):
+        return self.get_callbacks(fileobj)[0] is not None
+
+    def add_writer(self, fileobj, callback):
+        self.set_callbacks(fileobj, self.get_callbacks(fileobj)[0], callback)
+
+    def remove_writer(self, fileobj):
+        self.set_callbacks(fileobj, self.get_callbacks(fileobj)[0], None)
+
+    def has_writer(self, fileobj):
+        return self.get_callbacks(fileobj)[1] is not None
+
+    def add_signal_handler(self, signum, callback):
+        if self.wakeup_reader is None:
+            self.wakeup_reader, self.wakeup_writer = socket.socketpair()
+            self.wakeup_reader.setblocking(False)
+            self.wakeup_writer.setblocking(False)
+            signal.set_wakeup_fd(self.wakeup_writer.fileno())
+            self.add_reader(self.wakeup_reader, self.read_signals)
+        self.signal_handlers[signum] = callback
+        signal.signal(signum, self.ignore_signal)
+
+    @staticmethod
+    def ignore_signal(signum, frame):
+        pass
+
+    def read_signals(self, sock):
+        try:
+            data = sock.recv(4096)
+        except (BlockingIOError, InterruptedError):
+            return
+        for signum in set(data):
+            callback = self.signal_handlers.get(signum)
+            if callback:
+                callback()
+
+    def call_later(self, delay, callback, *args):
+        timer = Timer(time.monotonic() + delay, callback, args)
+        heapq.heappush(
+            self.timers, (timer.deadline, next(self.sequence), timer)
+        )
+        return timer
+
+    def next_timeout(self):
+        while self.timers and self.timers[0][2].cancelled:
+            heapq.heappop(self.timers)
+        if not self.timers:
+            return None
+        return max(0, self.timers[0][0] - time.monotonic())
+
+    def run_timers(self):
+        now = time.monotonic()
+        while self.timers and self.timers[0][0] <= now:
+            timer = heapq.heappop(self.timers)[2]
+            if not timer.cancelled:
+                timer.callback(*timer.args)
+
+    def run_once(self, timeout=None):
+        timer_timeout = self.next_timeout()
+        if timeout is None or (
+            timer_timeout is not None and timer_timeout < timeout
+        ):
+            timeout = timer_timeout
+        if self.selector.get_map():
+            events = self.selector.select(timeout)
+        else:
+            if timeout is None:
+                self.running = False
+                return
+            time.sleep(timeout)
+            events = []
+        for key, mask in events:
+            if mask & selectors.EVENT_READ:
+                reader = self.get_callbacks(key.fileobj)[0]
+                if reader:
+                    reader(key.fileobj)
+            if mask & selectors.EVENT_WRITE:
+                writer = self.get_callbacks(key.fileobj)[1]
+                if writer:
+                    writer(key.fileobj)
+        self.run_timers()
+
+    def run_forever(self):
+        self.running = True
+        while self.running:
+            self.run_once()
+
+    def stop(self):
+        self.running = False
@@ -0,0 +1,88 @@
+import codecs
+
+
+class LineFramer:
+    def __init__(
+        self,
+        read_size=4096,
+        max_line_length=8192,
+        encoding="utf-8",
+        errors="replace",
+    ):
+        self.read_size = read_size
+        self.max_line_length = max_line_length
+        self.decode = codecs.getdecoder(encoding)
+        self.errors = errors
+        self.buffer = bytearray(max(read_size, max_line_length) * 2)
+        self.start = 0
+        self.end = 0
+        self.scan = 0
+        self.discarding = False
+        self.dropped_lines = 0
+        self.bytes_received = 0
+        self.lines_received = 0
+
+    def pending(self):
+        return self.end - self.start
+
+    def reserve(self, size):
+        if len(self.buffer) - self.end >= size:
+            return
+        if self.start > 0:
+            length = self.end - self.start
+            self.buffer[:length] = self.buffer[self.start:self.end]
+            self.scan -= self.start
+            self.start = 0
+            self.end = length
+        missing = size - (len(self.buffer) - self.end)
+        if missing > 0:
+            self.buffer.extend(bytes(missing))
+
+    def fill(self, sock):
+        self.reserve(self.read_size)
+        view = memoryview(self.buffer)[self.end:self.end + self.read_size]
+        try:
+            received = sock.recv_into(view, self.read_size)
+        finally:
+            view.release()
+        self.end += received
+        self.bytes_received += received
+        return received
+
+    def feed(self, data):
+        self.reserve(len(data))
+        self.buffer[self.end:self.end + len(data)] = data
+        self.end += len(data)
+        return self.pop_lines()
+
+    def pop_lines(self):
+        lines = []
+        buffer = self.buffer
+        while True:
+            position = buffer.find(b"\n", self.scan, self.end)
+            if position == -1:
+                break
+            if self.discarding:
+                self.discarding = False
+            else:
+                stop = position
+                if stop > self.start and buffer[stop - 1] == 13:  # \r
+                    stop -= 1
+                if stop - self.start > self.max_line_length:
+                    self.dropped_lines += 1
+                else:
+                    lines.append(
+                        self.decode(buffer[self.start:stop], self.errors)[0]
+                    )
+            self.start = self.scan = position + 1
+        if self.start == self.end:
+            self.start = self.end = self.scan = 0
+        else:
+            self.scan = self.end
+            if self.end - self.start > self.max_line_length:
+                if not self.discarding:
+                    self.dropped_lines += 1
+                self.discarding = True
+                self.start = self.scan = self.end
+        self.lines_received += len(lines)
+        return lines
@@ -1,14 +1,58 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-from queue import Queue
-from datetime import datetime
+from itertools import islice
+from queue import Queue, Empty
 import hashlib
+import json
+import os
+import select
+import signal
 import socket
+import ssl
 import threading
+import time
 import argparse
+import sys
+import re
 
 from curses_interface import CursesInterface
+from event_loop import EventLoop
+from framing import LineFramer
+from irc_message import Message, parse_line
+from nicklist import NickList, fold_nick
+from buffers import BufferList, is_channel_name
+from bouncer import NO_NICK, BouncerServer
+from chat_log import ChatLogger
+from connector import Connector, backoff_delay
+from dcc import (
+    DccError,
+    DccManager,
+    encode_address,
+    format_size,
+    quote_filename,
+)
+from ircv3 import WANTED_CAPS, Batch, parse_caps, parse_server_time
+from metrics import Histogram, MetricsExporter, RateMeter, describe_target
+from outbound import SendQueue, TokenBucket
+from profiling import MemoryProfiler, Profiler
+from rules import RuleError, RuleSet, load_rules
+from snapshot import (
+    BufferState,
+    Snapshot,
+    SnapshotError,
+    load_snapshot,
+    save_snapshot,
+)
+from tls import SessionCache, TLSHandshake, make_context, parse_server_url
+from traffic_trace import TraceReplayer, TraceWriter
+from ui_backend import NullInterface, StdoutInterface
+
+UI_BACKENDS = {
+    "curses": CursesInterface,
+    "stdout": StdoutInterface,
+    "null": NullInterface,
+}
 
 
 class IRC:
@@ -20,70 +64,587 @@ class IRC:
     name = "Zeliboba"
     quit_message = "I'm quitting!"
     version = "1.0"
-    channel = ""
-    nicknames = []
     connected = False
-    joined = False
-    stop_thread_request = threading.Event()
-    rx_queue = Queue()
+    poll_timeout = 0.01
+    poll_budget = 0
+    poll_drained = 0
+    poll_backlog = 0
+    threaded = False
+    max_fps = 30
+    log_dir = None
+    rules_file = None
+    ui_backend = "curses"
+    metrics_out = None
+    metrics_interval = 10
+    metrics_sample = 16
+    read_size = 4096
+    max_line_length = 8192
+    decode_errors = "replace"
+    flood_burst = 5
+    flood_rate = 0.5
+    ctcp_burst = 2
+    ctcp_rate = 0.1
+    ctcp_senders_limit = 256
+    ctcp_total_burst = 3
+    ctcp_total_rate = 0.1
+    ctcp_queue_limit = 2
+    connect_timeout = 10
+    connect_stagger = 0.25
+    reconnect = True
+    reconnect_delay = 1
+    reconnect_max_delay = 60
+    rejoin_line_length = 400
+    attach_burst = 1000
+    attach_rate = 1000
+    wanted_caps = WANTED_CAPS
+    tls = False
+    tls_cafile = None
+    tls_verify = True
+    dcc_dir = "."
+    dcc_address = None
+    dcc_rate = 0
+    dcc_transfer_rate = 0
+    dcc_poll_interval = 0.5
+    state_file = None
+    state_interval = 60
+    state_lines = 200
 
-    def __init__(self, nick="", connect_info=None):
+    def __init__(
+        self,
+        nick="",
+        connect_info=None,
+        poll_budget=None,
+        threaded=None,
+        flood_burst=None,
+        flood_rate=None,
+        max_fps=None,
+        log_dir=None,
+        rules_file=None,
+        ui_backend=None,
+        record=None,
+        metrics_out=None,
+        metrics_interval=None,
+        connect_timeout=None,
+        reconnect=None,
+        tls=None,
+        tls_cafile=None,
+        tls_verify=None,
+        dcc_dir=None,
+        dcc_address=None,
+        dcc_rate=None,
+        dcc_transfer_rate=None,
+        state_file=None,
+        ui=None,
+        loop=None,
+    ):
         if nick:
             self.nick = nick
-        self.ui = UserInterface(self)
+        if poll_budget is not None:
+            self.poll_budget = poll_budget
+        if threaded is not None:
+            self.threaded = threaded
+        if flood_burst is not None:
+            self.flood_burst = flood_burst
+        if flood_rate is not None:
+            self.flood_rate = flood_rate
+        if max_fps is not None:
+            self.max_fps = max_fps
+        if log_dir is not None:
+            self.log_dir = log_dir
+        if rules_file is not None:
+            self.rules_file = rules_file
+        if ui_backend is not None:
+            self.ui_backend = ui_backend
+        if metrics_out is not None:
+            self.metrics_out = metrics_out
+        if metrics_interval is not None:
+            self.metrics_interval = metrics_interval
+        if connect_timeout is not None:
+            self.connect_timeout = connect_timeout
+        if reconnect is not None:
+            self.reconnect = reconnect
+        if tls is not None:
+            self.tls = tls
+        if tls_cafile is not None:
+            self.tls_cafile = tls_cafile
+        if tls_verify is not None:
+            self.tls_verify = tls_verify
+        if dcc_dir is not None:
+            self.dcc_dir = dcc_dir
+        if dcc_address is not None:
+            self.dcc_address = dcc_address
+        if dcc_rate is not None:
+            self.dcc_rate = dcc_rate
+        if dcc_transfer_rate is not None:
+            self.dcc_transfer_rate = dcc_transfer_rate
+        if state_file is not None:
+            self.state_file = state_file
+        self.loop = loop or EventLoop()
+        self.rx_queue = Queue()
+        self.stop_thread_request = threading.Event()
+        self.sock = None
+        self.socketThread = None
+        self.outbound = None
+        self.framer = None
+        self.port = None
+        self.connector = None
+        self.reconnect_timer = None
+        self.reconnect_attempts = 0
+        self.bouncer = None
+        self.attached = None
+        self.tls_context = None
+        self.tls_sessions = SessionCache()
+        self.tls_lock = None
+        self.last_handshake = None
+        self.caps = set()
+        self.cap_offered = {}
+        self.cap_negotiating = False
+        self.batches = {}
+        self.current_batch = None
+        self.message_time = None
+        self.away = {}
+        self.lines_processed = 0
+        self.parse_time = Histogram()
+        self.handle_time = Histogram()
+        self.ctcp_buckets = {}
+        self.ctcp_bucket = TokenBucket(
+            self.ctcp_total_burst, self.ctcp_total_rate
+        )
+        self.channels = {}
+        self.trace = TraceWriter(record) if record else None
+        self.replayer = None
+        self.replay_exit = False
+        self.state_timer = None
+        # Read before the UI exists, so the first screen is the restored
+        # one rather than the banner.
+        self.snapshot = None
+        state_error = None
+        if self.state_file:
+            try:
+                self.snapshot = load_snapshot(self.state_file)
+            except FileNotFoundError:
+                pass
+            except (OSError, SnapshotError) as e:
+                state_error = e
+        self.init_handlers()
+        if ui is None:
+            self.ui = UserInterface(self)
+        else:
+            self.ui = ui
+            self.ui.add_connection(self)
         self.keyboard = KeyboardHandler(self)
+        if state_error is not None:
+            self.ui.add_status_message(
+                f"Ignoring state file {self.state_file}: {state_error}"
+            )
         if connect_info:
             self.connect(*connect_info)
+        elif self.snapshot is not None and self.snapshot.server:
+            self.connect(
+                self.snapshot.server, self.snapshot.port, self.snapshot.tls
+            )
+        # The connect is non-blocking, so restoring overlaps its round trip.
+        if self.snapshot is not None:
+            self.restore_snapshot(self.snapshot, keep_nick=bool(nick))
+        if self.state_file:
+            self.schedule_state_save()
+
+    def make_framer(self):
+        return LineFramer(
+            read_size=self.read_size,
+            max_line_length=self.max_line_length,
+            errors=self.decode_errors,
+        )
 
     def start_thread(self):
+        self.framer = self.make_framer()
+        self.stop_thread_request = threading.Event()
         self.socketThread = SocketThread(
-            self.stop_thread_request, self.rx_queue, self.sock,
+            self.stop_thread_request,
+            self.rx_queue,
+            self.sock,
+            self.framer,
+            self.tls_lock,
         )
-        self.stop_thread_request.clear()
         self.socketThread.start()
 
     def stop_thread(self):
         self.stop_thread_request.set()
+        self.loop.remove_reader(self.sock)
 
-    def connect(self, server, port):
-        if not self.connected:
-            self.server = server
-            self.port = port
-            self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            try:
-                self.sock.connect((server, port))
-                self.connected = True
-            except socket.error:
-                self.ui.add_status_message(
-                    f"Unable to connect to {server}:{str(port)}"
+    def start_reader(self):
+        self.framer = self.make_framer()
+        self.loop.add_reader(self.sock, self.on_readable)
+
+    def on_readable(self, sock):
+        try:
+            received = self.framer.fill(sock)
+            if isinstance(sock, ssl.SSLSocket):
+                # Decrypted data left inside the TLS layer does not make
+                # the socket readable again.
+                while sock.pending():
+                    received += self.framer.fill(sock)
+        except ssl.SSLWantReadError:
+            # Only part of a TLS record has arrived so far.
+            return
+        except socket.error:
+            received = 0
+        if not received:
+            self.connection_lost()
+            return
+        lines = self.framer.pop_lines()
+        if lines:
+            with self.ui.batch():
+                for line in lines:
+                    self.process_line(line)
+
+    def connect(self, server, port, tls=None):
+        if self.connected:
+            self.ui.add_status_message("Already connected")
+        elif self.connector is not None:
+            self.ui.add_status_message("Already connecting")
+        else:
+            if tls is not None:
+                self.tls = tls
+            self.cancel_reconnect()
+            self.start_connect(server, port)
+
+    def start_connect(self, server, port):
+        self.server = server
+        self.port = port
+        self.ui.add_status_message(f"Connecting to {server}:{str(port)}")
+        self.connector = Connector(
+            self.loop,
+            server,
+            port,
+            self.on_connected,
+            self.on_connect_failed,
+            self.connect_timeout,
+            self.connect_stagger,
+        )
+        self.connector.start()
+
+    def on_connected(self, sock):
+        self.connector = None
+        if self.tls:
+            self.start_handshake(sock)
+            return
+        # The connect itself is non-blocking; afterwards the socket goes
+        # back to blocking mode for SocketThread and SendQueue.drain.
+        sock.setblocking(True)
+        self.start_session(sock)
+
+    def start_handshake(self, sock):
+        if self.tls_context is None:
+            self.tls_context = make_context(self.tls_cafile, self.tls_verify)
+        self.connector = TLSHandshake(
+            self.loop,
+            sock,
+            self.tls_context,
+            self.server,
+            self.on_handshake_done,
+            self.on_handshake_failed,
+            self.connect_timeout,
+            self.tls_sessions.get(self.server, self.port),
+        )
+        self.connector.start()
+
+    def on_handshake_done(self, sock):
+        # TLS sockets stay non-blocking; see SocketThread and SendQueue.
+        handshake = self.connector
+        self.connector = None
+        self.last_handshake = handshake
+        self.tls_sessions.store(self.server, self.port, sock)
+        self.ui.add_status_message(f"TLS established ({handshake.describe()})")
+        self.start_session(sock)
+
+    def on_handshake_failed(self, error):
+        self.tls_sessions.forget(self.server, self.port)
+        self.on_connect_failed(error)
+
+    def start_session(self, sock):
+        self.use_socket(sock, TokenBucket(self.flood_burst, self.flood_rate))
+        address = sock.getpeername()[0]
+        self.ui.add_status_message(f"Connected to {self.server} ({address})")
+        self.login(self.nick, self.user, self.name, self.host, self.server)
+
+    def use_socket(self, sock, bucket):
+        self.sock = sock
+        self.connected = True
+        if self.threaded and isinstance(sock, ssl.SSLSocket):
+            self.tls_lock = threading.Lock()
+        else:
+            self.tls_lock = None
+        self.outbound = SendQueue(
+            self.sock,
+            bucket,
+            self.loop,
+            self.connection_lost,
+            lock=self.tls_lock,
+        )
+        if self.threaded:
+            self.start_thread()
+        else:
+            self.start_reader()
+
+    def serve(self, path):
+        try:
+            self.bouncer = BouncerServer(self, path)
+        except OSError as e:
+            self.ui.add_status_message(f"Unable to listen on {path}: {e}")
+            return False
+        self.bouncer.status(f"Waiting for UIs on {path}")
+        return True
+
+    def attach(self, path):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(path)
+        except OSError as e:
+            sock.close()
+            self.ui.add_status_message(f"Unable to attach to {path}: {e}")
+            return False
+        # Pacing and reconnects are the daemon's job.
+        self.attached = path
+        self.reconnect = False
+        self.register_handler("BOUNCER", self.on_bouncer)
+        self.use_socket(sock, TokenBucket(self.attach_burst, self.attach_rate))
+        self.ui.add_status_message(f"Attached to {path}")
+        return True
+
+    def on_bouncer(self, message):
+        kind = message.params[0]
+        if kind == "SNAPSHOT":
+            state = json.loads(message.params[-1])
+            self.nick = state["nick"]
+            self.server = state["server"]
+        elif kind == "BUFFER":
+            state = json.loads(message.params[-1])
+            if state["channel"]:
+                buffer = self.get_channel_buffer(state["name"], create=True)
+            else:
+                buffer = self.ui.open_buffer(self, state["name"])
+            buffer.joined = state["joined"]
+            buffer.topic = state["topic"]
+        elif kind == "LINE":
+            name, timestamp, color, nick, text = message.params[1:6]
+            buffer = self.ui.find_buffer(self, name)
+            if buffer is not None:
+                self.ui.add_message(
+                    text,
+                    int(color),
+                    None if nick == NO_NICK else nick,
+                    float(timestamp),
+                    buffer,
+                    log=False,
                 )
-            if self.connected:
-                self.start_thread()
-                self.ui.add_status_message(
-                    f"Connecting to {server}:{str(port)}"
+        elif kind == "END":
+            self.ui.update_status()
+
+    def restore_snapshot(self, snapshot, keep_nick=False):
+        # Channels come back unjoined: welcome rejoins them and the NAMES
+        # replies replace the saved nick lists with the live ones.
+        if snapshot.nick and not keep_nick:
+            self.nick = snapshot.nick
+        active = None
+        with self.ui.batch():
+            for state in snapshot.buffers:
+                if state.is_channel:
+                    buffer = self.get_channel_buffer(state.name, create=True)
+                else:
+                    buffer = self.ui.open_buffer(self, state.name)
+                buffer.topic = state.topic
+                buffer.nicknames = NickList(state.nicknames)
+                for timestamp, color, nick, text in state.lines:
+                    buffer.scrollback.append(text, color, nick, timestamp)
+                if state.name == snapshot.active:
+                    active = buffer
+            if active is not None:
+                self.ui.show_buffer(active)
+        age = max(0, time.time() - snapshot.saved_at)
+        self.ui.add_status_message(
+            f"Restored {len(snapshot.buffers)} buffers from "
+            f"{self.state_file}, saved {age:.0f}s ago"
+        )
+
+    def make_snapshot(self):
+        buffers = []
+        for buffer in self.ui.buffers:
+            if buffer.connection is not self:
+                continue
+            entries = buffer.scrollback.entries
+            start = max(0, len(entries) - self.state_lines)
+            get_nick = buffer.scrollback.get_nick
+            lines = [
+                (entry[0], entry[2], get_nick(entry), entry[3])
+                for entry in islice(entries, start, None)
+            ]
+            buffers.append(
+                BufferState(
+                    buffer.name,
+                    buffer.is_channel,
+                    buffer.joined,
+                    buffer.topic,
+                    list(buffer.nicknames),
+                    lines,
                 )
-                self.login(self.nick, self.user, self.name, self.host, server)
-        else:
-            self.ui.add_status_message("Already connected")
+            )
+        active = self.ui.buffers.active
+        return Snapshot(
+            self.server,
+            self.port or 0,
+            self.tls,
+            self.nick,
+            active.name if active.connection is self else "",
+            buffers,
+        )
+
+    def save_state(self):
+        # An attached UI mirrors the daemon, which keeps its own state.
+        if not self.state_file or self.attached is not None:
+            return
+        try:
+            save_snapshot(self.state_file, self.make_snapshot())
+        except OSError as e:
+            self.ui.add_status_message(f"Unable to save state: {e}")
+
+    def schedule_state_save(self):
+        self.state_timer = self.loop.call_later(
+            self.state_interval, self.on_state_timer
+        )
+
+    def on_state_timer(self):
+        self.save_state()
+        self.schedule_state_save()
+
+    def on_connect_failed(self, error):
+        self.connector = None
+        self.ui.add_status_message(
+            f"Unable to connect to {self.server}:{str(self.port)}: {error}"
+        )
+        if self.reconnect_attempts:
+            self.schedule_reconnect()
+
+    def schedule_reconnect(self):
+        delay = backoff_delay(
+            self.reconnect_attempts,
+            self.reconnect_delay,
+            self.reconnect_max_delay,
+        )
+        self.reconnect_attempts += 1
+        self.ui.add_status_message(f"Reconnecting in {delay:.1f}s")
+        self.reconnect_timer = self.loop.call_later(delay, self.on_reconnect)
 
-    def send(self, command):
+    def on_reconnect(self):
+        self.reconnect_timer = None
+        self.start_connect(self.server, self.port)
+
+    def cancel_reconnect(self):
+        if self.reconnect_timer is not None:
+            self.reconnect_timer.cancel()
+            self.reconnect_timer = None
+        self.reconnect_attempts = 0
+
+    def close_connection(self):
+        if isinstance(self.sock, ssl.SSLSocket):
+            self.tls_sessions.store(self.server, self.port, self.sock)
+        self.stop_thread()
+        self.outbound.close()
+        self.connected = False
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+    def rejoin_channels(self):
+        names = [
+            buffer.name
+            for buffer in self.channels.values()
+            if not buffer.joined
+        ]
+        if not names:
+            return
+        self.ui.add_status_message(f"Rejoining {', '.join(names)}")
+        line = []
+        for name in names:
+            if line and len(",".join(line + [name])) > self.rejoin_line_length:
+                self.send("JOIN " + ",".join(line))
+                line = []
+            line.append(name)
+        self.send("JOIN " + ",".join(line))
+
+    def send(self, command, urgent=False):
         if self.connected:
-            bytes_sent = 0
-            bytes_to_sent = bytes(command + "\n", "UTF-8")
-            while bytes_sent < len(bytes_to_sent):
-                current_sent = self.sock.send(bytes_to_sent[bytes_sent:])
-                if current_sent == 0:
-                    self.ui.add_status_message("Connection lost")
-                    self.disconnect()
-                bytes_sent += current_sent
+            self.outbound.put(command, urgent)
+            if self.trace:
+                self.trace.sent(command)
             self.ui.add_debug_message("-> " + command)
 
+    def get_send_stats(self):
+        if self.outbound is None:
+            return 0, 0
+        return self.outbound.depth(), self.outbound.wait_time()
+
+    def connection_lost(self):
+        if self.connected:
+            self.close_connection()
+            for buffer in self.channels.values():
+                buffer.joined = False
+            self.batches = {}
+            self.ui.add_status_message("Connection lost")
+            self.ui.update_status()
+            if self.reconnect:
+                self.schedule_reconnect()
+
+    def current_buffer(self):
+        buffer = self.ui.get_active_buffer()
+        if buffer.connection is self:
+            return buffer
+        return None
+
+    @property
+    def channel(self):
+        buffer = self.current_buffer()
+        if buffer is not None and buffer.is_channel and buffer.joined:
+            return buffer.name
+        return ""
+
+    @property
+    def joined(self):
+        return self.channel != ""
+
+    @property
+    def nicknames(self):
+        buffer = self.current_buffer()
+        if buffer is None:
+            return NickList()
+        return buffer.nicknames
+
+    def get_channel_buffer(self, channel, create=False):
+        folded = fold_nick(channel)
+        buffer = self.channels.get(folded)
+        if buffer is None and create:
+            buffer = self.ui.open_buffer(self, channel)
+            self.channels[folded] = buffer
+        return buffer
+
+    def close_channel_buffer(self, buffer):
+        self.channels.pop(fold_nick(buffer.name), None)
+        self.ui.close_buffer(buffer)
+
     def send_message(self, message):
-        if self.joined:
-            self.ui.add_nick_message(self.nick, message)
-            self.send(f"PRIVMSG {self.channel} :{message}")
-        else:
+        self.send_messages([message])
+
+    def send_messages(self, messages):
+        buffer = self.current_buffer()
+        if buffer is None or not (buffer.joined or not buffer.is_channel):
             self.ui.add_status_message("Not in a channel")
+            return
+        with self.ui.batch():
+            for message in messages:
+                self.ui.add_nick_message(self.nick, message, buffer)
+                self.send(f"PRIVMSG {buffer.name} :{message}")
 
     def send_private_message(self, nick, message):
         if self.connected:
@@ -96,64 +657,92 @@ class IRC:
         return self.nick, self.server, self.channel, self.topic
 
     def disconnect(self):
-        if self.connected:
-            self.send(f"QUIT :{self.quit_message}")
-            self.stop_thread()
-            self.connected = False
+        if self.connector is not None or self.reconnect_timer is not None:
+            if self.connector is not None:
+                self.connector.cancel()
+                self.connector = None
+            self.cancel_reconnect()
             self.server = ""
+            self.ui.add_status_message("Connection attempt cancelled")
+        elif self.connected:
+            self.send(f"QUIT :{self.quit_message}", urgent=True)
+            self.outbound.drain()
+            self.close_connection()
+            self.cancel_reconnect()
+            self.server = ""
+            for buffer in list(self.channels.values()):
+                self.close_channel_buffer(buffer)
             self.ui.add_status_message("Disconnected")
             self.ui.update_status()
         else:
             self.ui.add_status_message("Not connected")
 
     def login(self, nick, user, name, host, server):
+        # Servers without CAP support just ignore it and register us
+        # on USER/NICK as before.
+        self.caps = set()
+        self.cap_offered = {}
+        self.cap_negotiating = True
+        self.send("CAP LS 302")
         self.send(f"USER {user} {host} {server} {name}")
         self.send(f"NICK {nick}")
         self.ui.add_status_message(f"Using nickname {nick}")
 
     def join(self, channel):
         if self.connected:
-            if not self.joined:
-                self.send(f"JOIN {channel}")
+            buffer = self.get_channel_buffer(channel)
+            if buffer is not None and buffer.joined:
+                self.ui.show_buffer(buffer)
             else:
-                self.ui.add_status_message("Already in a channel")
+                self.send(f"JOIN {channel}")
         else:
             self.ui.add_status_message("Not connected")
 
     def part(self):
-        if self.joined:
-            self.send(f"PART {self.channel}")
-            self.set_nicknames([])
-            self.ui.add_status_message(f"Left channel {self.channel}")
-            self.joined = False
-            self.channel = ""
+        buffer = self.current_buffer()
+        if buffer is not None and buffer.is_channel and buffer.joined:
+            self.send(f"PART {buffer.name}")
+            self.close_channel_buffer(buffer)
+            self.ui.add_status_message(f"Left channel {buffer.name}")
             self.ui.update_status()
+        elif buffer is not None and not buffer.is_channel:
+            self.ui.close_buffer(buffer)
         else:
             self.ui.add_status_message("Not in a channel")
 
-    def add_nick(self, nick):
-        self.nicknames.append(nick)
-        self.nicknames.sort()
-        self.ui.set_nicknames(self.nicknames)
+    def add_nick(self, nick, buffer=None):
+        buffer = buffer or self.current_buffer()
+        index = buffer.nicknames.add(nick)
+        if index is not None:
+            self.ui.set_nicknames(buffer.nicknames, index, buffer)
 
-    def delete_nick(self, nick):
-        if nick in self.nicknames:
-            self.nicknames.remove(nick)
-            self.ui.set_nicknames(self.nicknames)
+    def delete_nick(self, nick, buffer=None):
+        buffer = buffer or self.current_buffer()
+        index = buffer.nicknames.remove(nick)
+        if index is not None:
+            self.ui.set_nicknames(buffer.nicknames, index, buffer)
+        return index is not None
 
-    def replace_nick(self, old_nick, new_nick):
-        self.delete_nick(old_nick)
-        self.add_nick(new_nick)
-        self.ui.set_nicknames(self.nicknames)
-        self.ui.add_status_message(f"{old_nick} is now known as {new_nick}")
+    def replace_nick(self, old_nick, new_nick, buffer=None):
+        buffer = buffer or self.current_buffer()
+        index = buffer.nicknames.rename(old_nick, new_nick)
+        if index is not None:
+            self.ui.set_nicknames(buffer.nicknames, index, buffer)
+            self.ui.add_status_message(
+                f"{old_nick} is now known as {new_nick}", buffer
+            )
+        return index is not None
 
     def request_nicknames(self):
         if self.joined:
             self.send(f"NAMES {self.channel}")
 
-    def set_nicknames(self, nicknames):
-        self.nicknames = nicknames
-        self.ui.set_nicknames(self.nicknames)
+    def set_nicknames(self, nicknames, buffer=None):
+        buffer = buffer or self.current_buffer()
+        if not isinstance(nicknames, NickList):
+            nicknames = NickList(nicknames)
+        buffer.nicknames = nicknames
+        self.ui.set_nicknames(buffer.nicknames, 0, buffer)
 
     def set_nick(self, nick):
         if self.connected:
@@ -165,164 +754,890 @@ class IRC:
         else:
             return "~"
 
-    def handle_ctcp(self, command, message):
+    def allow_ctcp_reply(self, nick):
+        # Replies share the send queue with our own lines, so they also
+        # have a budget across all senders and never wait in a backlog.
+        if self.get_send_stats()[0] > self.ctcp_queue_limit:
+            return False
+        bucket = self.ctcp_buckets.get(nick)
+        if bucket is None:
+            if len(self.ctcp_buckets) >= self.ctcp_senders_limit:
+                self.ctcp_buckets = {
+                    sender: sender_bucket
+                    for sender, sender_bucket in self.ctcp_buckets.items()
+                    if not sender_bucket.is_full()
+                }
+            bucket = TokenBucket(self.ctcp_burst, self.ctcp_rate)
+            self.ctcp_buckets[nick] = bucket
+        return bucket.consume() and self.ctcp_bucket.consume()
+
+    def handle_ctcp(self, command, message, nick="", buffer=None):
         self.ui.add_status_message("Got CTCP message: " + command)
-        if command == "VERSION":
-            self.send("VERSION Zeliboba-IRC %s" % self.version)
-        if command == "ACTION":
-            self.ui.add_emote_message(self.nick, message)
+        for handler in self.ctcp_handlers.get(command, ()):
+            handler(nick, message, buffer)
 
-    def poll(self):
-        rx = ""
+    def on_ctcp_version(self, nick, message, buffer):
+        if nick and self.allow_ctcp_reply(nick):
+            self.send(
+                f"NOTICE {nick} :\x01VERSION Zeliboba-IRC {self.version}\x01"
+            )
+
+    def on_ctcp_action(self, nick, message, buffer):
+        if buffer is None and nick:
+            buffer = self.ui.open_buffer(self, nick)
+        self.ui.add_emote_message(nick, message, buffer)
+
+    def send_ctcp(self, nick, message):
+        self.send(f"PRIVMSG {nick} :\x01{message}\x01")
+
+    def on_ctcp_dcc(self, nick, message, buffer):
+        dcc = self.ui.dcc
+        kind = message.split(" ", 1)[0].upper()
         try:
-            rx = self.rx_queue.get(True, 0.01)
-        except BaseException:
-            pass
+            if kind == "SEND":
+                transfer = dcc.offer(nick, message)
+                transfer.connection = self
+                self.ui.add_status_message(
+                    f"{nick} offers {transfer.filename} "
+                    f"({format_size(transfer.size)}), "
+                    f"/dcc get {transfer.number} to accept"
+                )
+            elif kind == "RESUME":
+                transfer = dcc.resume_requested(nick, message)
+                self.send_ctcp(
+                    nick,
+                    f"DCC ACCEPT {quote_filename(transfer.filename)} "
+                    f"{transfer.port} {transfer.offset}",
+                )
+            elif kind == "ACCEPT":
+                transfer = dcc.resume_accepted(nick, message)
+                self.ui.add_status_message(
+                    f"Resuming {transfer.filename} at "
+                    f"{format_size(transfer.offset)}"
+                )
+                self.ui.watch_dcc()
+            else:
+                self.ui.add_status_message(f"Unsupported DCC {kind}")
+        except DccError as error:
+            self.ui.add_status_message(f"DCC from {nick}: {error}")
+
+    def dcc_send(self, nick, path):
+        if not self.connected:
+            self.ui.add_status_message("Not connected")
+            return None
+        address = self.dcc_address or self.sock.getsockname()[0]
+        try:
+            transfer = self.ui.dcc.send(nick, path, address)
+        except (OSError, ValueError) as error:
+            self.ui.add_status_message(f"Unable to send {path}: {error}")
+            return None
+        transfer.connection = self
+        self.send_ctcp(
+            nick,
+            f"DCC SEND {quote_filename(transfer.filename)} "
+            f"{encode_address(address)} {transfer.port} {transfer.size}",
+        )
+        self.ui.add_status_message(
+            f"Offered {transfer.filename} ({format_size(transfer.size)}) "
+            f"to {nick} as transfer {transfer.number}"
+        )
+        self.ui.watch_dcc()
+        return transfer
+
+    def poll(self, timeout=None):
+        self.loop.run_once(0)
+        if timeout is None:
+            timeout = self.poll_timeout
+        try:
+            rx = self.rx_queue.get(True, timeout)
+        except Empty:
+            self.poll_drained = 0
+            self.poll_backlog = 0
+            return 0
+        pending = self.rx_queue.qsize()
+        if self.poll_budget > 0:
+            pending = min(pending, self.poll_budget - 1)
+        drained = 0
+        with self.ui.batch():
+            while True:
+                drained += 1
+                if isinstance(rx, str):
+                    self.process_line(rx)
+                elif rx is self.socketThread:
+                    self.connection_lost()
+                if drained > pending:
+                    break
+                try:
+                    rx = self.rx_queue.get_nowait()
+                except Empty:
+                    break
+        self.poll_drained = drained
+        self.poll_backlog = self.rx_queue.qsize()
+        return drained
+
+    def process_line(self, rx):
+        if self.trace:
+            self.trace.received(rx)
+        if self.bouncer:
+            self.bouncer.received(rx)
         if rx != "":
             self.ui.add_debug_message("<- " + rx)
-            self.handle_message(self.parse_message(rx))
+            self.lines_processed += 1
+            if self.lines_processed % self.metrics_sample:
+                self.handle_message(parse_line(rx))
+                return
+            # Only every metrics_sample-th line is timed, so the clock
+            # reads stay off the common path.
+            start = time.perf_counter()
+            message = parse_line(rx)
+            parsed = time.perf_counter()
+            self.handle_message(message)
+            self.parse_time.record(parsed - start)
+            self.handle_time.record(time.perf_counter() - parsed)
+
+    def get_poll_stats(self):
+        return self.poll_drained, self.poll_backlog
+
+    def get_metrics(self, rates, now):
+        key = id(self)
+        framer = self.framer
+        rx_bytes = framer.bytes_received if framer else 0
+        rx_lines = framer.lines_received if framer else 0
+        outbound = self.outbound
+        tx_bytes = outbound.bytes_sent if outbound else 0
+        depth, wait_time = self.get_send_stats()
+        channels = {
+            buffer.name: len(buffer.nicknames)
+            for buffer in self.channels.values()
+        }
+        return {
+            "server": self.server,
+            "connected": self.connected,
+            "rx": {
+                "bytes": rx_bytes,
+                "lines": rx_lines,
+                "bytes_per_second": rates.rate((key, "rxb"), rx_bytes, now),
+                "lines_per_second": rates.rate((key, "rxl"), rx_lines, now),
+                "dropped_lines": framer.dropped_lines if framer else 0,
+                "queue_depth": self.rx_queue.qsize(),
+                "poll_backlog": self.poll_backlog,
+            },
+            "parse": self.parse_time.summary(),
+            "handle": self.handle_time.summary(),
+            "tx": {
+                "bytes": tx_bytes,
+                "bytes_per_second": rates.rate((key, "txb"), tx_bytes, now),
+                "writes": outbound.writes if outbound else 0,
+                "stalls": outbound.stalls if outbound else 0,
+                "queue_depth": depth,
+                "wait_time": wait_time,
+            },
+            "nicks": {"total": sum(channels.values()), "channels": channels},
+        }
+
+    def reset_metrics(self):
+        self.parse_time.reset()
+        self.handle_time.reset()
 
     @staticmethod
     def parse_message(message):
-        prefix = ""
-        if message[0] == ":":
-            prefix, message = message[1:].split(" ", 1)
-        if message.find(" :") != -1:
-            message, trail = message.split(" :", 1)
-            args = message.split()
-            args.append(trail)
-        else:
-            args = message.split()
-        command = args.pop(0)
-        return prefix, command, args
+        return parse_line(message).as_tuple()
+
+    def init_handlers(self):
+        self.handlers = {}
+        self.ctcp_handlers = {}
+        self.handler_stats = {}
+        self.handler_timing = False
+        self.register_handler("PING", self.on_ping)
+        self.register_handler("PRIVMSG", self.on_privmsg)
+        self.register_handler("JOIN", self.on_join)
+        self.register_handler("PART", self.on_part)
+        self.register_handler("QUIT", self.on_quit)
+        self.register_handler("TOPIC", self.on_topic)
+        self.register_handler("332", self.on_topic_reply)
+        self.register_handler("353", self.on_names_reply)
+        self.register_handler("366", self.on_end_of_names)
+        self.register_handler("001", self.on_welcome)
+        self.register_handler("376", self.on_end_of_motd)
+        self.register_handler("NICK", self.on_nick)
+        self.register_handler("CAP", self.on_cap)
+        self.register_handler("BATCH", self.on_batch)
+        self.register_handler("AWAY", self.on_away)
+        self.register_ctcp_handler("VERSION", self.on_ctcp_version)
+        self.register_ctcp_handler("ACTION", self.on_ctcp_action)
+        self.register_ctcp_handler("DCC", self.on_ctcp_dcc)
+
+    def register_handler(self, command, handler):
+        self.handlers.setdefault(command.upper(), []).append(handler)
+
+    def unregister_handler(self, command, handler):
+        handlers = self.handlers.get(command.upper(), [])
+        if handler in handlers:
+            handlers.remove(handler)
+            if not handlers:
+                del self.handlers[command.upper()]
+
+    def register_ctcp_handler(self, command, handler):
+        self.ctcp_handlers.setdefault(command.upper(), []).append(handler)
+
+    def unregister_ctcp_handler(self, command, handler):
+        handlers = self.ctcp_handlers.get(command.upper(), [])
+        if handler in handlers:
+            handlers.remove(handler)
+            if not handlers:
+                del self.ctcp_handlers[command.upper()]
+
+    def set_handler_timing(self, enabled):
+        self.handler_timing = enabled
+
+    def reset_handler_stats(self):
+        self.handler_stats = {}
+
+    def get_handler_stats(self):
+        return sorted(
+            (
+                (name, calls, total)
+                for name, (calls, total) in self.handler_stats.items()
+            ),
+            key=lambda stat: stat[2],
+            reverse=True,
+        )
 
     def handle_message(self, message):
-        prefix, command, args = message
-        if command == "PING":
-            self.send(f"PONG {args[0]}")
-        if command == "PRIVMSG":
-            message = " ".join(args[1:])
-            nick = prefix[: prefix.find("!")]
-            if args[1].startswith(chr(1)):
-                ctcp = message.replace(chr(1), "").split()
-                ctcp_command = ctcp[0]
-                ctcp_message = " ".join(ctcp[1:])
-                self.handle_ctcp(ctcp_command, ctcp_message)
-            elif args[0] == self.channel:
-                self.ui.add_nick_message(nick, message)
+        if not isinstance(message, Message):
+            prefix, command, args = message
+            message = Message(command, args, prefix)
+        if message.tag_data:
+            tags = message.tags
+            if self.batches and "batch" in tags:
+                batch = self.batches.get(tags["batch"])
+                if batch is not None:
+                    batch.messages.append(message)
+                    if message.command == "BATCH" and message.params:
+                        # A nested batch is collected into the outer one
+                        # and opened for real when that is replayed.
+                        reference = message.params[0]
+                        if reference.startswith("+"):
+                            self.batches[reference[1:]] = batch
+                    return
+            if "time" in tags:
+                self.message_time = parse_server_time(tags["time"])
+        handlers = self.handlers.get(message.command)
+        if handlers is not None:
+            timing = self.handler_timing
+            for handler in handlers:
+                # One broken handler must not take the connection down.
+                try:
+                    if timing:
+                        self.run_timed_handler(handler, message)
+                    else:
+                        handler(message)
+                except Exception as error:
+                    self.ui.add_status_message(
+                        f"Error in {message.command} handler "
+                        f"{getattr(handler, '__name__', handler)}: {error!r}"
+                    )
+        self.message_time = None
+
+    def run_timed_handler(self, handler, message):
+        start = time.perf_counter()
+        try:
+            handler(message)
+        finally:
+            elapsed = time.perf_counter() - start
+            name = f"{message.command} {handler.__name__}"
+            stats = self.handler_stats.get(name)
+            if stats is None:
+                self.handler_stats[name] = [1, elapsed]
             else:
-                self.ui.add_private_message(nick, message)
-        if command == "JOIN":
-            nick = prefix[: prefix.find("!")]
-            if not self.joined:
-                self.joined = True
-                self.channel = args[0]
-                self.ui.update_status()
-                self.ui.add_status_message(f"Joined channel {self.channel}")
-            elif nick != self.nick:
-                self.add_nick(prefix[: prefix.find("!")])
-                self.ui.add_status_message(f"{nick} joined the channel")
-        if command == "PART" and args[0] == self.channel:
-            nick = prefix[: prefix.find("!")]
-            self.delete_nick(nick)
-            self.ui.add_status_message(f"{nick} left the channel")
-        if command == "353":  # NAMEREPLY
-            nicknames = " ".join(args[3:]).split()
-            self.set_nicknames(nicknames)
-        if command == "376":  # MOTD
-            self.ui.add_status_message("MOTD received, ready for action")
-            self.ui.update_status()
-        if command == "NICK":
-            old_nick = prefix[: prefix.find("!")]
-            new_nick = args[0]
-            if old_nick == self.nick:
-                self.nick = new_nick
-            self.replace_nick(old_nick, new_nick)
-            self.ui.update_status()
+                stats[0] += 1
+                stats[1] += elapsed
+
+    def on_cap(self, message):
+        params = message.params
+        if len(params) < 3:
+            return
+        subcommand = params[1].upper()
+        more = len(params) > 3 and params[2] == "*"
+        caps = parse_caps(params[-1])
+        if subcommand in ("LS", "NEW"):
+            self.cap_offered.update(caps)
+            if more:
+                return
+            if subcommand == "LS":
+                caps = self.cap_offered
+            wanted = [
+                cap
+                for cap in self.wanted_caps
+                if cap in caps and cap not in self.caps
+            ]
+            if wanted:
+                self.send("CAP REQ :" + " ".join(wanted))
+            else:
+                self.end_cap_negotiation()
+        elif subcommand == "ACK":
+            for cap in caps:
+                if cap.startswith("-"):
+                    self.caps.discard(cap[1:])
+                else:
+                    self.caps.add(cap)
+            if not more:
+                self.end_cap_negotiation()
+        elif subcommand == "NAK":
+            self.end_cap_negotiation()
+        elif subcommand == "DEL":
+            self.caps.difference_update(caps)
+            for cap in caps:
+                self.cap_offered.pop(cap, None)
+
+    def end_cap_negotiation(self):
+        if not self.cap_negotiating:
+            return
+        self.cap_negotiating = False
+        self.send("CAP END")
+        if self.caps:
+            self.ui.add_status_message(
+                f"Capabilities: {' '.join(sorted(self.caps))}"
+            )
+
+    def on_batch(self, message):
+        reference = message.params[0]
+        name = reference[1:]
+        if reference.startswith("+"):
+            kind = message.params[1] if len(message.params) > 1 else ""
+            self.batches[name] = Batch(name, kind, message.params[2:])
+        elif reference.startswith("-"):
+            batch = self.batches.pop(name, None)
+            if batch is not None:
+                self.apply_batch(batch)
+
+    def apply_batch(self, batch):
+        # The whole batch lands as one state update and one redraw;
+        # netsplits and netjoins get a line per channel, not per nick.
+        outer = self.current_batch
+        self.current_batch = batch
+        try:
+            with self.ui.batch():
+                for message in batch.messages:
+                    self.handle_message(message)
+                if batch.kind == "netsplit":
+                    self.add_batch_summary(batch, "quit")
+                elif batch.kind == "netjoin":
+                    self.add_batch_summary(batch, "joined")
+        finally:
+            self.current_batch = outer
+
+    def add_batch_summary(self, batch, verb):
+        servers = " ".join(batch.params)
+        for buffer, count in batch.counts.items():
+            self.ui.add_status_message(
+                f"{batch.kind.capitalize()} {servers}: {count} {verb}",
+                buffer,
+            )
+
+    def summarized(self, buffer):
+        batch = self.current_batch
+        if batch is None or not batch.summarized:
+            return False
+        batch.count(buffer)
+        return True
+
+    def on_away(self, message):
+        nick = message.nick
+        folded = fold_nick(nick)
+        query = self.ui.find_buffer(self, nick)
+        if message.params:
+            reason = message.params[-1]
+            self.away[folded] = reason
+            if query is not None:
+                self.ui.add_status_message(f"{nick} is away: {reason}", query)
+        elif self.away.pop(folded, None) is not None and query is not None:
+            self.ui.add_status_message(f"{nick} is back", query)
+
+    def on_ping(self, message):
+        self.send(f"PONG {message.params[0]}", urgent=True)
+
+    def get_target_buffer(self, message):
+        # Query buffers are only looked up here; they are opened once a
+        # line is actually shown, so floods of CTCPs or dropped lines
+        # from new nicks leave nothing behind.
+        target = message.params[0]
+        if is_channel_name(target):
+            return self.get_channel_buffer(target)
+        return self.ui.find_buffer(self, message.nick)
+
+    def check_rules(self, event, message, buffer, text=""):
+        rule = self.ui.rules.match(
+            event,
+            message.nick,
+            message.host,
+            buffer.name if buffer is not None and buffer.is_channel else "",
+            text,
+        )
+        return None if rule is None else rule.action
+
+    def on_privmsg(self, message):
+        args = message.params
+        if len(args) < 2:
+            return
+        text = " ".join(args[1:])
+        nick = message.nick
+        buffer = self.get_target_buffer(message)
+        if args[1].startswith(chr(1)):
+            ctcp = text.replace(chr(1), "").split()
+            if not ctcp:
+                return
+            ctcp_command = ctcp[0]
+            ctcp_message = " ".join(ctcp[1:])
+            self.handle_ctcp(ctcp_command, ctcp_message, nick, buffer)
+            return
+        action = self.check_rules("message", message, buffer, text)
+        if action == "drop":
+            return
+        if buffer is None and not is_channel_name(args[0]):
+            buffer = self.ui.open_buffer(self, nick)
+        if buffer is not None:
+            self.ui.add_nick_message(nick, text, buffer, action)
+        else:
+            self.ui.add_private_message(nick, text)
+
+    def on_join(self, message):
+        nick = message.nick
+        channel = message.params[0]
+        if nick == self.nick:
+            buffer = self.get_channel_buffer(channel)
+            if buffer is None:
+                buffer = self.get_channel_buffer(channel, create=True)
+                self.ui.show_buffer(buffer)
+            buffer.joined = True
+            self.ui.add_status_message(f"Joined channel {channel}", buffer)
+        else:
+            buffer = self.get_channel_buffer(channel)
+            if buffer is not None:
+                self.add_nick(nick, buffer)
+                if self.summarized(buffer):
+                    return
+                action = self.check_rules("join", message, buffer)
+                if action != "drop":
+                    self.ui.add_status_message(
+                        f"{nick} joined the channel", buffer, action=action
+                    )
+
+    def on_part(self, message):
+        buffer = self.get_channel_buffer(message.params[0])
+        if buffer is not None and message.nick != self.nick:
+            nick = message.nick
+            self.delete_nick(nick, buffer)
+            action = self.check_rules("part", message, buffer)
+            if action != "drop":
+                self.ui.add_status_message(
+                    f"{nick} left the channel", buffer, action=action
+                )
+
+    def on_quit(self, message):
+        nick = message.nick
+        reason = message.params[0] if message.params else ""
+        self.away.pop(fold_nick(nick), None)
+        for buffer in self.channels.values():
+            if self.delete_nick(nick, buffer):
+                if self.summarized(buffer):
+                    continue
+                action = self.check_rules("quit", message, buffer, reason)
+                if action != "drop":
+                    self.ui.add_status_message(
+                        f"{nick} quit ({reason})", buffer, action=action
+                    )
+
+    def on_topic(self, message):
+        buffer = self.get_channel_buffer(message.params[0])
+        if buffer is not None:
+            buffer.topic = message.params[-1]
+            self.ui.add_status_message(
+                f"{message.nick} changed the topic to: {buffer.topic}", buffer
+            )
+
+    def on_topic_reply(self, message):
+        buffer = self.get_channel_buffer(message.params[1])
+        if buffer is not None:
+            buffer.topic = message.params[-1]
+            self.ui.add_status_message(f"Topic: {buffer.topic}", buffer)
+
+    def on_names_reply(self, message):
+        buffer = self.get_channel_buffer(message.params[2])
+        if buffer is not None:
+            if buffer.pending_names is None:
+                buffer.pending_names = []
+            buffer.pending_names.extend(" ".join(message.params[3:]).split())
+
+    def on_end_of_names(self, message):
+        buffer = self.get_channel_buffer(message.params[1])
+        if buffer is not None and buffer.pending_names is not None:
+            self.set_nicknames(buffer.pending_names, buffer)
+            buffer.pending_names = None
+
+    def on_welcome(self, message):
+        if message.params:
+            self.nick = message.params[0]
+        self.reconnect_attempts = 0
+        if self.attached is None:
+            self.rejoin_channels()
+        self.ui.update_status()
+
+    def on_end_of_motd(self, message):
+        self.ui.add_status_message("MOTD received, ready for action")
+        self.ui.update_status()
+
+    def on_nick(self, message):
+        old_nick = message.nick
+        new_nick = message.params[0]
+        if old_nick == self.nick:
+            self.nick = new_nick
+            self.ui.add_status_message(
+                f"{old_nick} is now known as {new_nick}"
+            )
+        for buffer in self.channels.values():
+            self.replace_nick(old_nick, new_nick, buffer)
+        query = self.ui.find_buffer(self, old_nick)
+        if query is not None:
+            query.name = new_nick
+        self.ui.update_status()
 
     def run(self):
-        for kb_input in self.ui.run():
+        if self.threaded:
+            for kb_input in self.ui.run():
+                self.keyboard.parse_input(kb_input)
+        else:
+            if self.ui.get_input() is not None:
+                self.loop.add_reader(self.ui.get_input(), self.on_keyboard)
+            if hasattr(signal, "SIGWINCH"):
+                self.loop.add_signal_handler(
+                    signal.SIGWINCH, self.ui.on_terminal_resize
+                )
+            self.loop.add_signal_handler(signal.SIGTERM, self.on_terminate)
+            self.loop.run_forever()
+
+    def replay(self, path, speed=1.0, exit_when_done=False):
+        self.server = "replay"
+        self.replayer = TraceReplayer(
+            self, path, speed, self.on_replay_finished
+        )
+        self.replay_exit = exit_when_done
+        self.ui.add_status_message(f"Replaying {path}")
+        self.replayer.start()
+
+    def on_replay_finished(self, replayer):
+        self.ui.add_status_message(replayer.summary())
+        if self.replay_exit:
+            print(replayer.summary(), file=sys.stderr)
+            self.ui.quit()
+            self.loop.stop()
+            if self.threaded:
+                exit()
+
+    def on_terminate(self):
+        self.ui.quit()
+        self.loop.stop()
+
+    def on_keyboard(self, stdin):
+        for kb_input in self.ui.read_keyboard():
             self.keyboard.parse_input(kb_input)
 
 
 class SocketThread(threading.Thread):
-    def __init__(self, event, rx_queue, sock):
+    tls_wait = 0.5
+
+    def __init__(self, event, rx_queue, sock, framer=None, lock=None):
         super(SocketThread, self).__init__()
         self.stop_thread_request = event
         self.rx_queue = rx_queue
         self.socket = sock
+        self.framer = framer or LineFramer()
+        self.lock = lock
+
+    def read(self):
+        if self.lock is None:
+            return self.framer.fill(self.socket)
+        # A TLS socket is shared with the sending side, so it is
+        # non-blocking: wait for data without the lock, read with it.
+        if not self.socket.pending():
+            select.select([self.socket], [], [], self.tls_wait)
+        with self.lock:
+            received = self.framer.fill(self.socket)
+            while self.socket.pending():
+                received += self.framer.fill(self.socket)
+        return received
 
     def run(self):
-        rx = bytes()
-        while not self.stop_thread_request.isSet():
-            rx = rx + self.socket.recv(1024)
-            if rx:
-                last_line_break_position = rx.rfind(b'\n')
-                if last_line_break_position != -1:
-                    buffer = rx[:last_line_break_position].decode(
-                        'utf-8').split('\n')
-                    rx = rx[last_line_break_position + 1:]
-                    for line in buffer:
-                        line = line.rstrip()
-                        self.rx_queue.put(line)
+        while not self.stop_thread_request.is_set():
+            try:
+                received = self.read()
+            except ssl.SSLWantReadError:
+                continue
+            except (socket.error, ValueError):
+                received = 0
+            if received:
+                for line in self.framer.pop_lines():
+                    self.rx_queue.put(line)
             else:
+                if not self.stop_thread_request.is_set():
+                    # Tells IRC.poll that this connection is gone.
+                    self.rx_queue.put(self)
                 self.stop_thread_request.set()
         return
 
 
 class UserInterface:
+    highlight_color = 1
+
     def __init__(self, irc):
         self.irc = irc
-        self.curses_ui = CursesInterface(self.irc)
-        self.draw_integral()
+        self.connections = [irc]
+        self.active_connection = irc
+        self.buffers = BufferList()
+        self.logger = None
+        if irc.log_dir:
+            self.logger = ChatLogger(irc.log_dir)
+        self.stats_rates = RateMeter()
+        self.exporter = None
+        if irc.metrics_out:
+            self.exporter_rates = RateMeter()
+            self.exporter = MetricsExporter(
+                irc.metrics_out,
+                self.collect_exported_metrics,
+                irc.loop,
+                irc.metrics_interval,
+            )
+            self.exporter.start()
+        backend = UI_BACKENDS[irc.ui_backend]
+        self.backend = backend(irc, irc.max_fps, self.buffers.active)
+        self.dim_color = 8 if self.backend.colors > 8 else 7
+        self.rules = RuleSet()
+        self.dcc = DccManager(
+            irc.dcc_dir, irc.dcc_rate, irc.dcc_transfer_rate
+        )
+        self.dcc_timer = None
+        if self.backend.banner and irc.snapshot is None:
+            self.draw_integral()
         self.add_status_message(
             "Welcome to Zeliboba-IRC version " + self.irc.version
         )
         self.add_status_message("Type /help for a list of commands")
+        if irc.rules_file:
+            self.load_rules(irc.rules_file)
+
+    def watch_dcc(self):
+        if self.dcc_timer is None:
+            self.dcc_timer = self.irc.loop.call_later(
+                self.irc.dcc_poll_interval, self.poll_dcc
+            )
+
+    def poll_dcc(self):
+        # Transfers run on their own threads; this only reports them.
+        self.dcc_timer = None
+        for transfer in self.dcc.pop_finished():
+            self.add_status_message("DCC " + transfer.describe())
+        if self.dcc.active():
+            self.watch_dcc()
+
+    def load_rules(self, path):
+        try:
+            self.rules = load_rules(path)
+        except (OSError, RuleError) as e:
+            self.add_status_message(f"Unable to load rules: {e}")
+            return False
+        self.add_status_message(f"Loaded {len(self.rules)} rules from {path}")
+        return True
 
     def run(self):
-        for kb_input in self.curses_ui.run():
+        for kb_input in self.backend.run():
             if kb_input:
                 yield kb_input
 
-    def add_message(self, message, color):
-        msg = self.get_time_stamp() + " " + message
-        self.curses_ui.add_message(msg, color)
+    def poll(self):
+        for i, connection in enumerate(self.connections):
+            connection.poll(None if i == 0 else 0)
+
+    def read_keyboard(self):
+        return self.backend.read_keyboard()
+
+    def get_input(self):
+        return self.backend.input
+
+    def add_connection(self, connection):
+        self.connections.append(connection)
+        self.active_connection = connection
+
+    def current_connection(self):
+        return self.buffers.active.connection or self.active_connection
+
+    def get_active_buffer(self):
+        return self.buffers.active
+
+    def find_buffer(self, connection, name):
+        return self.buffers.find(connection, name)
+
+    def open_buffer(self, connection, name):
+        return self.buffers.get(connection, name)
+
+    def close_buffer(self, buffer):
+        was_active = buffer is self.buffers.active
+        self.buffers.remove(buffer)
+        if was_active:
+            self.show_buffer(self.buffers.active)
+        else:
+            self.update_activity()
+
+    def show_buffer(self, buffer):
+        self.buffers.select(self.buffers.number(buffer))
+        if buffer.connection is not None:
+            self.active_connection = buffer.connection
+        self.backend.show_buffer(buffer)
+        self.update_activity()
+
+    def switch_buffer(self, number):
+        if 1 <= number <= len(self.buffers):
+            self.show_buffer(self.buffers.buffers[number - 1])
+        else:
+            self.add_status_message(f"No window {number}")
+
+    def list_buffers(self):
+        for number, buffer in enumerate(self.buffers, 1):
+            server = buffer.connection.server if buffer.connection else ""
+            self.add_status_message(
+                f"{number}: {buffer.name} {server} "
+                f"({buffer.unread} unread, {buffer.highlights} highlights)"
+            )
 
-    def add_nick_message(self, nick, message):
+    def update_activity(self):
+        activity = []
+        for number, buffer in self.buffers.activity():
+            activity.append(f"{number}!" if buffer.highlights else str(number))
+        self.backend.set_activity(",".join(activity))
+
+    def is_highlight(self, buffer, message, nick):
+        if buffer.connection is None or nick is None:
+            return False
+        if not buffer.is_channel:
+            return True
+        return fold_nick(buffer.connection.nick) in fold_nick(message)
+
+    def add_message(
+        self,
+        message,
+        color,
+        nick=None,
+        timestamp=None,
+        buffer=None,
+        log=True,
+        action=None,
+    ):
+        buffer = buffer or self.buffers.active
+        if timestamp is None and buffer.connection is not None:
+            # Server-time of the message being handled, if it had one.
+            timestamp = buffer.connection.message_time
+        if action == "dim":
+            color = self.dim_color
+        elif action == "highlight":
+            color = self.highlight_color
+        buffer.scrollback.append(message, color, nick, timestamp)
+        if log and self.logger and buffer.connection is not None:
+            self.logger.log(
+                buffer.connection.server, buffer.name, message, nick, timestamp
+            )
+        if buffer is self.buffers.active:
+            self.backend.add_message(buffer)
+            return
+        self.backend.add_inactive_message(buffer)
+        highlighted = buffer.highlights > 0
+        buffer.unread += 1
+        if action == "highlight" or self.is_highlight(buffer, message, nick):
+            buffer.highlights += 1
+        if buffer.unread == 1 or highlighted != (buffer.highlights > 0):
+            self.update_activity()
+
+    def add_nick_message(self, nick, message, buffer=None, action=None):
         color = self.get_nick_color(nick)
-        self.add_message(f"<{nick}> {message}", color)
+        self.add_message(message, color, nick, buffer=buffer, action=action)
 
-    def add_emote_message(self, nick, message):
+    def add_emote_message(self, nick, message, buffer=None):
         color = self.get_nick_color(nick)
-        self.add_message("* " + nick + " " + message, color)
+        self.add_message("* " + nick + " " + message, color, buffer=buffer)
 
-    def add_private_message(self, nick, message):
-        self.add_nick_message(nick, "[private] " + message)
+    def add_private_message(self, nick, message, buffer=None):
+        self.add_nick_message(nick, "[private] " + message, buffer)
 
-    def add_status_message(self, message):
-        self.add_message("== " + message, 7)
+    def add_status_message(self, message, buffer=None, log=True, action=None):
+        self.add_message(
+            "== " + message, 7, buffer=buffer, log=log, action=action
+        )
 
     def add_debug_message(self, message):
-        self.curses_ui.add_debug_message(message)
+        self.backend.add_debug_message(message)
 
-    def set_nicknames(self, nicknames):
-        self.curses_ui.set_nicknames(nicknames)
+    def batch(self):
+        return self.backend.batch()
+
+    def on_terminal_resize(self):
+        self.backend.request_resize(query_terminal=True)
+
+    def get_render_stats(self):
+        return self.backend.get_render_stats()
+
+    def set_nicknames(self, nicknames, start=0, buffer=None):
+        if buffer is None or buffer is self.buffers.active:
+            self.backend.set_nicknames(nicknames, start)
 
     def init_colors(self):
-        self.curses_ui.init_colors()
+        self.backend.init_colors()
 
     def get_nick_color(self, nick):
         return (
             int(hashlib.md5(nick.encode("utf-8")).hexdigest(), 16)
-            % self.curses_ui.colors
+            % self.backend.colors
         )
 
+    def quit(self):
+        for connection in self.connections:
+            connection.save_state()
+            if connection.connected:
+                connection.disconnect()
+            if connection.trace:
+                connection.trace.close()
+            if connection.bouncer:
+                connection.bouncer.close()
+        self.dcc.close()
+        self.shutdown()
+
+    def get_metrics(self, rates):
+        now = time.monotonic()
+        metrics = {
+            "time": time.time(),
+            "connections": [
+                connection.get_metrics(rates, now)
+                for connection in self.connections
+            ],
+            "ui": self.backend.get_render_stats(),
+            "buffers": len(self.buffers),
+        }
+        if self.logger:
+            metrics["log_lines"] = self.logger.lines_written
+            metrics["log_errors"] = self.logger.write_errors
+        if self.rules:
+            metrics["rules"] = dict(self.rules.counts())
+        return metrics
+
+    def collect_exported_metrics(self):
+        return self.get_metrics(self.exporter_rates)
+
     def shutdown(self):
-        self.curses_ui.shutdown()
+        if self.exporter:
+            self.exporter.close()
+        if self.logger:
+            self.logger.close()
+        self.backend.shutdown()
 
     def toggle_debug(self):
-        self.curses_ui.toggle_debug()
+        self.backend.toggle_debug()
 
     def draw_integral(self):
         self.add_message("MMMMMMMMMMMMMMMMMMMMMMMMMMMMMMMMMMMMMMMM", 2)
@@ -346,19 +1661,29 @@ class UserInterface:
         self.add_message("MMMMMMMMMMMMMMMMMMMMMMMMMMMMMMMMMMMMMMMM", 2)
         self.add_message("MMMMMMMMMMMMMMMMMMMMMMMMMMMMMMMMMMMMMMMM", 3)
 
-    def get_time_stamp(self):
-        return datetime.now().strftime("[%H:%M]")
-
     def update_status(self):
-        self.curses_ui.update()
+        self.backend.redraw_input()
+        self.backend.update()
 
 
 class KeyboardHandler:
+    search_page_size = 20
+
     def __init__(self, irc):
-        self.irc = irc
+        self.primary = irc
+        self.search_results = None
+        self.profiler = Profiler()
+        self.memory_profiler = MemoryProfiler()
+
+    @property
+    def irc(self):
+        return self.primary.ui.current_connection()
 
     def parse_input(self, keyboard_input):
-        if keyboard_input.startswith("/"):
+        if isinstance(keyboard_input, list):
+            # A multi-line paste is sent as text, never run as commands.
+            self.irc.send_messages(keyboard_input)
+        elif keyboard_input.startswith("/"):
             if len(keyboard_input) > 1:
                 self.handle_cmd(keyboard_input[1:])
         else:
@@ -368,16 +1693,17 @@ class KeyboardHandler:
         command = command_input.split()[0]
         args = command_input.split()[1:]
         if command == "connect":
-            if len(args) == 1 and args[0].count(":") == 1:
-                server, port = args[0].split(":")
-                if port.isdigit():
-                    self.irc.connect(server, int(port))
+            if len(args) == 1:
+                try:
+                    server, port, tls = parse_server_url(args[0])
+                except ValueError as error:
+                    self.irc.ui.add_status_message(str(error))
                 else:
-                    self.irc.ui.add_status_message(
-                        "Port must be specified as an integer"
-                    )
+                    self.connect(server, port, tls)
             else:
-                self.irc.ui.add_status_message("Usage: connect <server:port>")
+                self.irc.ui.add_status_message(
+                    "Usage: connect <server:port | ircs://server[:port]>"
+                )
         elif command == "disconnect":
             self.irc.part()
             self.irc.disconnect()
@@ -406,50 +1732,528 @@ class KeyboardHandler:
             self.irc.ui.toggle_debug()
         elif command == "names":
             self.irc.request_nicknames()
+        elif command == "timing":
+            self.handle_timing(args)
+        elif command == "window":
+            if len(args) == 1 and args[0].isdigit():
+                self.irc.ui.switch_buffer(int(args[0]))
+            elif args == ["list"] or not args:
+                self.irc.ui.list_buffers()
+            else:
+                self.irc.ui.add_status_message("Usage: window <number|list>")
+        elif command == "profile":
+            self.handle_profile(args)
+        elif command == "memprofile":
+            self.handle_memprofile(args)
+        elif command == "stats":
+            self.handle_stats(args)
+        elif command == "search":
+            self.handle_search(args)
+        elif command == "rules":
+            self.handle_rules(args)
+        elif command == "dcc":
+            self.handle_dcc(args)
         elif command == "help":
             self.irc.ui.add_status_message("available commands:")
-            self.irc.ui.add_status_message("/connect <server:port>")
+            self.irc.ui.add_status_message(
+                "/connect <server:port | ircs://server[:port]>"
+            )
             self.irc.ui.add_status_message("/disconnect")
             self.irc.ui.add_status_message("/join <channel>")
             self.irc.ui.add_status_message("/part")
             self.irc.ui.add_status_message("/msg <nick> <message>")
             self.irc.ui.add_status_message("/nick <new nick>")
             self.irc.ui.add_status_message("/debug")
+            self.irc.ui.add_status_message("/timing [on|off|reset]")
+            self.irc.ui.add_status_message("/window <number|list>")
+            self.irc.ui.add_status_message("/search [regex [channel]]")
+            self.irc.ui.add_status_message("/stats [reset]")
+            self.irc.ui.add_status_message("/rules [load <file>]")
+            self.irc.ui.add_status_message(
+                "/dcc [send <nick> <file>|get <n>|cancel <n>]"
+            )
+            self.irc.ui.add_status_message("/profile start|stop [file]")
+            self.irc.ui.add_status_message(
+                "/memprofile snapshot|diff [file]|stop"
+            )
             self.irc.ui.add_status_message("/quit")
         elif command == "quit":
-            self.irc.part()
-            self.irc.disconnect()
-            self.irc.ui.shutdown()
+            self.irc.ui.quit()
             exit()
         else:
             msg = "Unknown command: " + command
             self.irc.ui.add_status_message(msg)
 
+    def connect(self, server, port, tls=None):
+        connection = self.irc
+        if not connection.connected:
+            connection.connect(server, port, tls)
+            return
+        IRC(
+            nick=connection.nick,
+            connect_info=(server, port),
+            tls=connection.tls if tls is None else tls,
+            tls_cafile=connection.tls_cafile,
+            tls_verify=connection.tls_verify,
+            dcc_address=connection.dcc_address,
+            poll_budget=connection.poll_budget,
+            threaded=connection.threaded,
+            flood_burst=connection.flood_burst,
+            flood_rate=connection.flood_rate,
+            max_fps=connection.max_fps,
+            log_dir=connection.log_dir,
+            rules_file=connection.rules_file,
+            connect_timeout=connection.connect_timeout,
+            reconnect=connection.reconnect,
+            ui_backend=connection.ui_backend,
+            ui=connection.ui,
+            loop=connection.loop,
+        )
+
+    def handle_search(self, args):
+        ui = self.irc.ui
+        if ui.logger is None:
+            ui.add_status_message("Logging is disabled, start with --log-dir")
+            return
+        if len(args) > 2:
+            ui.add_status_message("Usage: search [regex [channel]]")
+            return
+        if args:
+            try:
+                pattern = re.compile(
+                    args[0].encode("utf-8"), re.IGNORECASE | re.MULTILINE
+                )
+            except re.error as e:
+                ui.add_status_message(f"Invalid pattern: {e}")
+                return
+            channel = args[1] if len(args) > 1 else None
+            self.search_results = ui.logger.search(pattern, None, channel)
+            if ui.logger.last_error is not None:
+                ui.add_status_message(
+                    f"Chat log cannot be written: {ui.logger.last_error}"
+                )
+        if self.search_results is None:
+            ui.add_status_message("Usage: search [regex [channel]]")
+            return
+        shown = 0
+        for channel, line in self.search_results:
+            ui.add_message(f"{channel}: {line}", 7, log=False)
+            shown += 1
+            if shown == self.search_page_size:
+                ui.add_status_message(
+                    "Type /search for more results", log=False
+                )
+                return
+        self.search_results = None
+        ui.add_status_message("End of search results", log=False)
+
+    def handle_profile(self, args):
+        ui = self.irc.ui
+        if args == ["start"]:
+            if self.profiler.running:
+                ui.add_status_message("Profiler is already running")
+            else:
+                self.profiler.start()
+                ui.add_status_message("Profiler started")
+        elif args[:1] == ["stop"] and len(args) <= 2:
+            if not self.profiler.running:
+                ui.add_status_message("Profiler is not running")
+                return
+            try:
+                lines = self.profiler.stop(args[1] if len(args) > 1 else None)
+            except OSError as e:
+                ui.add_status_message(f"Unable to write profile: {e}")
+                return
+            for line in lines:
+                ui.add_debug_message(line)
+            ui.add_status_message(lines[0])
+        else:
+            ui.add_status_message("Usage: profile start|stop [file]")
+
+    def handle_memprofile(self, args):
+        ui = self.irc.ui
+        if args == ["snapshot"]:
+            lines = self.memory_profiler.snapshot()
+        elif args[:1] == ["diff"] and len(args) <= 2:
+            try:
+                lines = self.memory_profiler.diff(
+                    args[1] if len(args) > 1 else None
+                )
+            except OSError as e:
+                ui.add_status_message(f"Unable to write report: {e}")
+                return
+            if lines is None:
+                ui.add_status_message("Take a /memprofile snapshot first")
+                return
+        elif args == ["stop"]:
+            self.memory_profiler.stop()
+            ui.add_status_message("Memory tracing stopped")
+            return
+        else:
+            ui.add_status_message(
+                "Usage: memprofile snapshot|diff [file]|stop"
+            )
+            return
+        for line in lines:
+            ui.add_debug_message(line)
+        ui.add_status_message(lines[0])
+
+    def handle_rules(self, args):
+        ui = self.irc.ui
+        if len(args) == 2 and args[0] == "load":
+            ui.load_rules(args[1])
+            return
+        if args:
+            ui.add_status_message("Usage: rules [load <file>]")
+            return
+        if not ui.rules:
+            ui.add_status_message("No rules loaded")
+            return
+        for number, (rule, matches) in enumerate(ui.rules.counts(), 1):
+            ui.add_status_message(f"{number}: {rule} ({matches} lines)")
+
+    def handle_dcc(self, args):
+        ui = self.irc.ui
+        if len(args) >= 3 and args[0] == "send":
+            path = os.path.expanduser(" ".join(args[2:]))
+            self.irc.dcc_send(args[1], path)
+            return
+        if len(args) == 2 and args[0] in ("get", "cancel"):
+            if not args[1].isdigit():
+                ui.add_status_message("Transfer must be a number")
+                return
+            try:
+                if args[0] == "cancel":
+                    transfer = ui.dcc.cancel(int(args[1]))
+                    ui.add_status_message(f"Cancelled {transfer.filename}")
+                    return
+                self.dcc_get(int(args[1]))
+            except DccError as error:
+                ui.add_status_message(str(error))
+            return
+        if args and args != ["list"]:
+            ui.add_status_message(
+                "Usage: dcc [send <nick> <file>|get <n>|cancel <n>]"
+            )
+            return
+        if not ui.dcc.transfers:
+            ui.add_status_message("No DCC transfers")
+        for transfer in ui.dcc.transfers.values():
+            ui.add_status_message(transfer.describe())
+
+    def dcc_get(self, number):
+        ui = self.irc.ui
+        position = ui.dcc.get(number)
+        transfer = ui.dcc.transfers[number]
+        if position is None:
+            ui.add_status_message(
+                f"Receiving {transfer.filename} into {transfer.final_path}"
+            )
+            ui.watch_dcc()
+            return
+        transfer.connection.send_ctcp(
+            transfer.nick,
+            f"DCC RESUME {quote_filename(transfer.filename)} "
+            f"{transfer.port} {position}",
+        )
+        ui.add_status_message(
+            f"Asking {transfer.nick} to resume {transfer.filename} at "
+            f"{format_size(position)}"
+        )
+
+    def handle_stats(self, args):
+        ui = self.irc.ui
+        if args == ["reset"]:
+            for connection in ui.connections:
+                connection.reset_metrics()
+            ui.add_status_message("Stats reset")
+            return
+        if args:
+            ui.add_status_message("Usage: stats [reset]")
+            return
+        metrics = ui.get_metrics(ui.stats_rates)
+        for connection in metrics["connections"]:
+            rx = connection["rx"]
+            tx = connection["tx"]
+            nicks = connection["nicks"]
+            ui.add_debug_message(
+                f"[{connection['server'] or 'not connected'}] "
+                f"rx {rx['lines']} lines {rx['bytes']} bytes, "
+                f"{rx['lines_per_second']:.0f} lines/s "
+                f"{rx['bytes_per_second'] / 1024:.1f} KiB/s, "
+                f"queue {rx['queue_depth']}, dropped {rx['dropped_lines']}"
+            )
+            for name in ("parse", "handle"):
+                timing = connection[name]
+                ui.add_debug_message(
+                    f"  {name}: {timing['count']} sampled, "
+                    f"p50 {timing['p50_us']:.0f} us, "
+                    f"p99 {timing['p99_us']:.0f} us, "
+                    f"max {timing['max_us']:.0f} us"
+                )
+            ui.add_debug_message(
+                f"  tx {tx['bytes']} bytes in {tx['writes']} writes, "
+                f"{tx['bytes_per_second'] / 1024:.1f} KiB/s, "
+                f"{tx['stalls']} stalls, queue {tx['queue_depth']}"
+            )
+            ui.add_debug_message(
+                f"  nicks {nicks['total']} in "
+                f"{len(nicks['channels'])} channels"
+            )
+        ui_stats = ", ".join(
+            f"{name} {value}"
+            for name, value in metrics["ui"].items()
+            if not isinstance(value, dict)
+        )
+        ui.add_debug_message(f"ui: {ui_stats}")
+        render = metrics["ui"].get("render")
+        if render:
+            ui.add_debug_message(
+                f"  render p50 {render['p50_us']:.0f} us, "
+                f"p99 {render['p99_us']:.0f} us, "
+                f"max {render['max_us']:.0f} us"
+            )
+        if ui.exporter:
+            ui.add_debug_message(
+                f"exporting to {describe_target(ui.exporter.target)}: "
+                f"{ui.exporter.exported} sent, {ui.exporter.dropped} dropped"
+            )
+
+    def handle_timing(self, args):
+        if args and args[0] in ("on", "off"):
+            self.irc.set_handler_timing(args[0] == "on")
+            self.irc.ui.add_status_message(f"Handler timing {args[0]}")
+        elif args and args[0] == "reset":
+            self.irc.reset_handler_stats()
+            self.irc.ui.add_status_message("Handler timing reset")
+        elif args:
+            self.irc.ui.add_status_message("Usage: timing [on|off|reset]")
+        else:
+            stats = self.irc.get_handler_stats()
+            if not stats:
+                self.irc.ui.add_status_message("No handler timings recorded")
+            for name, calls, total in stats:
+                self.irc.ui.add_debug_message(
+                    f"{name}: {calls} calls, {total * 1000:.2f} ms, "
+                    f"{total / calls * 1e6:.1f} us/call"
+                )
+
 
 def server_and_port(value):
-    splitted_connect_info = value.split(":")
-    if len(splitted_connect_info) == 2 and splitted_connect_info[-1].isdigit:
-        server = "".join(splitted_connect_info[:-1])
-        port = int(splitted_connect_info[-1])
+    try:
+        server, port, tls = parse_server_url(value)
+    except ValueError as error:
+        raise argparse.ArgumentTypeError(str(error))
+    if tls is None:
         return server, port
-    else:
-        print("Wrong arguments!")
-        raise argparse.ArgumentParser()
+    return server, port, tls
 
 
 def parse_args():
     parser = argparse.ArgumentParser(description="Curses IRC client")
     parser.set_defaults(nick=None)
     parser.add_argument(
-        "--connect", type=server_and_port, metavar="server:port"
+        "--connect",
+        type=server_and_port,
+        metavar="server:port",
+        help="Also accepts irc:// and ircs:// URLs",
     )
     parser.add_argument("--nick", help="Specify nickname")
-    return parser.parse_args()
+    parser.add_argument(
+        "--poll-budget",
+        type=int,
+        default=0,
+        metavar="lines",
+        help="Maximum received lines handled per tick (0 drains all)",
+    )
+    parser.add_argument(
+        "--threaded",
+        action="store_true",
+        help="Receive on a socket thread instead of the event loop",
+    )
+    parser.add_argument(
+        "--flood-burst",
+        type=int,
+        metavar="lines",
+        help="Commands that may be sent back to back before pacing",
+    )
+    parser.add_argument(
+        "--flood-rate",
+        type=float,
+        metavar="lines/s",
+        help="Steady outbound command rate once the burst is used up",
+    )
+    parser.add_argument(
+        "--fps",
+        type=int,
+        metavar="frames/s",
+        help="Maximum screen refresh rate (0 redraws on every change)",
+    )
+    parser.add_argument(
+        "--headless",
+        nargs="?",
+        const="stdout",
+        choices=("stdout", "null"),
+        help="Run without curses, printing lines to stdout or nowhere",
+    )
+    parser.add_argument(
+        "--record",
+        metavar="file",
+        help="Append received and sent lines with timestamps to a trace",
+    )
+    parser.add_argument(
+        "--replay",
+        metavar="file",
+        help="Feed a recorded trace through the client instead of a server",
+    )
+    parser.add_argument(
+        "--replay-speed",
+        type=float,
+        default=1.0,
+        metavar="factor",
+        help="Replay speed relative to the recording (0 is unthrottled)",
+    )
+    parser.add_argument(
+        "--metrics-out",
+        metavar="file|unix:path",
+        help="Periodically append metrics as JSON lines to a file or socket",
+    )
+    parser.add_argument(
+        "--metrics-interval",
+        type=float,
+        metavar="seconds",
+        help="Seconds between exported metrics lines (default 10)",
+    )
+    parser.add_argument(
+        "--connect-timeout",
+        type=float,
+        metavar="seconds",
+        help="Give up on a connection attempt after this long",
+    )
+    parser.add_argument(
+        "--no-reconnect",
+        dest="reconnect",
+        action="store_false",
+        default=None,
+        help="Do not reconnect automatically when the connection drops",
+    )
+    parser.add_argument(
+        "--tls",
+        action="store_true",
+        default=None,
+        help="Connect with TLS (the default for ircs:// URLs)",
+    )
+    parser.add_argument(
+        "--tls-cafile",
+        metavar="file",
+        help="Verify the server against the certificates in this file",
+    )
+    parser.add_argument(
+        "--tls-no-verify",
+        dest="tls_verify",
+        action="store_false",
+        default=None,
+        help="Do not verify the server certificate",
+    )
+    parser.add_argument(
+        "--dcc-dir",
+        metavar="directory",
+        help="Save files received over DCC here (default: current)",
+    )
+    parser.add_argument(
+        "--dcc-address",
+        metavar="address",
+        help="Address to offer in DCC SEND instead of the local one",
+    )
+    parser.add_argument(
+        "--dcc-rate",
+        type=int,
+        metavar="bytes/s",
+        help="Cap the combined rate of all DCC transfers",
+    )
+    parser.add_argument(
+        "--dcc-transfer-rate",
+        type=int,
+        metavar="bytes/s",
+        help="Cap the rate of each DCC transfer",
+    )
+    parser.add_argument(
+        "--log-dir",
+        metavar="directory",
+        help="Write channel and query logs below this directory",
+    )
+    parser.add_argument(
+        "--rules",
+        metavar="file",
+        help="Drop, dim or highlight lines using the rules in this file",
+    )
+    parser.add_argument(
+        "--daemon",
+        metavar="socket",
+        help="Keep the connection open in the background and serve UIs "
+        "attaching on this unix socket",
+    )
+    parser.add_argument(
+        "--attach",
+        metavar="socket",
+        help="Attach to a daemon started with --daemon",
+    )
+    parser.add_argument(
+        "--state",
+        metavar="file",
+        help="Restore channels, nick lists and backlog from this file on "
+        "startup and keep it updated",
+    )
+    args = parser.parse_args()
+    if args.replay and args.connect:
+        parser.error("--replay cannot be combined with --connect")
+    if args.daemon and args.attach:
+        parser.error("--daemon cannot be combined with --attach")
+    if args.attach and (args.connect or args.replay):
+        parser.error("--attach cannot be combined with --connect or --replay")
+    if args.state and (args.attach or args.replay):
+        parser.error("--state cannot be combined with --attach or --replay")
+    if args.daemon:
+        if args.threaded:
+            parser.error("--daemon runs on the event loop, not --threaded")
+        args.headless = args.headless or "null"
+    return args
 
 
 def main():
     args = parse_args()
-    irc = IRC(nick=args.nick, connect_info=args.connect)
+    irc = IRC(
+        nick=args.nick,
+        connect_info=args.connect,
+        poll_budget=args.poll_budget,
+        threaded=args.threaded,
+        flood_burst=args.flood_burst,
+        flood_rate=args.flood_rate,
+        max_fps=args.fps,
+        log_dir=args.log_dir,
+        rules_file=args.rules,
+        ui_backend=args.headless,
+        record=args.record,
+        metrics_out=args.metrics_out,
+        metrics_interval=args.metrics_interval,
+        connect_timeout=args.connect_timeout,
+        reconnect=args.reconnect,
+        tls=args.tls,
+        tls_cafile=args.tls_cafile,
+        tls_verify=args.tls_verify,
+        dcc_dir=args.dcc_dir,
+        dcc_address=args.dcc_address,
+        dcc_rate=args.dcc_rate,
+        dcc_transfer_rate=args.dcc_transfer_rate,
+        state_file=args.state,
+    )
+    if args.replay:
+        irc.replay(args.replay, args.replay_speed, bool(args.headless))
+    if args.daemon and not irc.serve(args.daemon):
+        irc.ui.quit()
+        sys.exit(1)
+    if args.attach:
+        irc.attach(args.attach)
     irc.run()
 
 
@@ -0,0 +1,115 @@
+TAG_ESCAPES = {":": ";", "s": " ", "\\": "\\", "r": "\r", "n": "\n"}
+
+
+def unescape_tag_value(value):
+    if "\\" not in value:
+        return value
+    result = []
+    escaped = False
+    for char in value:
+        if escaped:
+            result.append(TAG_ESCAPES.get(char, char))
+            escaped = False
+        elif char == "\\":
+            escaped = True
+        else:
+            result.append(char)
+    return "".join(result)
+
+
+def parse_tags(raw_tags):
+    tags = {}
+    for tag in raw_tags.split(";"):
+        if not tag:
+            continue
+        key, _, value = tag.partition("=")
+        tags[key] = unescape_tag_value(value)
+    return tags
+
+
+class Message:
+    __slots__ = ("tag_data", "prefix", "command", "params")
+
+    def __init__(self, command="", params=None, prefix="", raw_tags=""):
+        self.tag_data = raw_tags
+        self.prefix = prefix
+        self.command = command
+        self.params = [] if params is None else params
+
+    @property
+    def nick(self):
+        prefix = self.prefix
+        end = prefix.find("!")
+        if end != -1:
+            return prefix[:end]
+        if "@" in prefix:
+            return prefix.partition("@")[0]
+        return prefix
+
+    @property
+    def user(self):
+        return split_prefix(self.prefix)[1]
+
+    @property
+    def host(self):
+        return split_prefix(self.prefix)[2]
+
+    @property
+    def tags(self):
+        if self.tag_data.__class__ is str:
+            self.tag_data = parse_tags(self.tag_data)
+        return self.tag_data
+
+    def as_tuple(self):
+        return self.prefix, self.command, self.params
+
+    def __iter__(self):
+        return iter((self.prefix, self.command, self.params))
+
+    def __repr__(self):
+        return (
+            f"Message({self.command!r}, {self.params!r}, "
+            f"prefix={self.prefix!r})"
+        )
+
+
+def split_prefix(prefix):
+    nick, _, host = prefix.partition("@")
+    nick, _, user = nick.partition("!")
+    return nick, user, host
+
+
+new_message = object.__new__
+
+
+def parse_line(line):
+    # Tags are cut off first, then one partition and one split cover the
+    # rest, and params is sliced off the split rather than popped from
+    # its front.
+    message = new_message(Message)
+    message.tag_data = ""
+    try:
+        if line[0] == "@":
+            tag_data, _, line = line.partition(" ")
+            message.tag_data = tag_data[1:]
+            line = line.lstrip(" ")
+        head, separator, trail = line.partition(" :")
+        params = head.split()
+        if separator:
+            params.append(trail)
+        first = params[0]
+        if first[0] == ":":
+            message.prefix = first[1:]
+            message.command = params[1]
+            message.params = params[2:]
+        else:
+            message.prefix = ""
+            message.command = first
+            message.params = params[1:]
+    except IndexError:
+        # Empty, tags-only and prefix-only lines.
+        line = line.strip()
+        message.prefix = line[1:] if line[:1] == ":" else ""
+        message.command = ""
+        message.params = []
+    return message
@@ -0,0 +1,48 @@
+from datetime import datetime, timezone
+
+WANTED_CAPS = (
+    "batch",
+    "server-time",
+    "multi-prefix",
+    "userhost-in-names",
+    "away-notify",
+    "extended-join",
+)
+SUMMARIZED_BATCHES = ("netsplit", "netjoin")
+
+
+def parse_caps(text):
+    caps = {}
+    for item in text.split():
+        name, _, value = item.partition("=")
+        caps[name] = value
+    return caps
+
+
+def parse_server_time(value):
+    # server-time stamps look like 2024-05-01T12:34:56.789Z.
+    if value.endswith("Z"):
+        value = value[:-1] + "+00:00"
+    try:
+        moment = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+
+class Batch:
+    def __init__(self, reference, kind, params):
+        self.reference = reference
+        self.kind = kind
+        self.params = params
+        self.messages = []
+        self.counts = {}
+
+    @property
+    def summarized(self):
+        return self.kind in SUMMARIZED_BATCHES
+
+    def count(self, buffer):
+        self.counts[buffer] = self.counts.get(buffer, 0) + 1
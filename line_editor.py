@@ -0,0 +1,155 @@
+import codecs
+
+ESCAPE = 27
+PASTE_START = "[200~"
+PASTE_END = "[201~"
+
+
+class KeyDecoder:
+    def __init__(self):
+        self.utf8 = codecs.getincrementaldecoder("utf-8")("replace")
+        self.escape = None
+        self.paste = None
+
+    def feed(self, keycode):
+        # Turns curses keycodes into ("text", str), ("key", keycode),
+        # ("alt", str) or ("paste", str) events, or None while a sequence
+        # is still incomplete.
+        if self.escape is not None:
+            return self.feed_escape(keycode)
+        if keycode == ESCAPE:
+            self.escape = ""
+            return None
+        if 128 <= keycode < 256:
+            text = self.utf8.decode(bytes((keycode,)))
+            return self.text(text) if text else None
+        if self.paste is not None:
+            if keycode == 13:
+                keycode = 10
+            if keycode < 256:
+                self.paste.append(chr(keycode))
+            return None
+        if 32 <= keycode < 127:
+            return "text", chr(keycode)
+        return "key", keycode
+
+    def text(self, text):
+        if self.paste is not None:
+            self.paste.append(text)
+            return None
+        return "text", text
+
+    def feed_escape(self, keycode):
+        if keycode >= 256:
+            self.escape = None
+            return self.feed(keycode)
+        sequence = self.escape + chr(keycode)
+        if sequence == "[" or (sequence[0] == "[" and keycode < 0x40):
+            self.escape = sequence
+            return None
+        self.escape = None
+        if sequence == PASTE_START:
+            self.paste = []
+        elif sequence == PASTE_END and self.paste is not None:
+            text = "".join(self.paste)
+            self.paste = None
+            return "paste", text
+        elif len(sequence) == 1 and self.paste is None:
+            return "alt", sequence
+        return None
+
+
+class LineEditor:
+    history_size = 100
+
+    def __init__(self):
+        self.chars = []
+        self.cursor = 0
+        self.history = []
+        self.history_index = 0
+        self.draft = None
+
+    @property
+    def text(self):
+        return "".join(self.chars)
+
+    def set_text(self, text):
+        self.chars = list(text)
+        self.cursor = len(self.chars)
+
+    def insert(self, text):
+        self.chars[self.cursor : self.cursor] = text
+        self.cursor += len(text)
+
+    def backspace(self):
+        if self.cursor > 0:
+            self.cursor -= 1
+            del self.chars[self.cursor]
+
+    def delete(self):
+        if self.cursor < len(self.chars):
+            del self.chars[self.cursor]
+
+    def left(self):
+        self.cursor = max(0, self.cursor - 1)
+
+    def right(self):
+        self.cursor = min(len(self.chars), self.cursor + 1)
+
+    def home(self):
+        self.cursor = 0
+
+    def end(self):
+        self.cursor = len(self.chars)
+
+    def kill_to_start(self):
+        del self.chars[: self.cursor]
+        self.cursor = 0
+
+    def kill_word(self):
+        start = self.cursor
+        while start > 0 and self.chars[start - 1] == " ":
+            start -= 1
+        while start > 0 and self.chars[start - 1] != " ":
+            start -= 1
+        del self.chars[start : self.cursor]
+        self.cursor = start
+
+    def history_previous(self):
+        if self.history_index == 0:
+            return
+        if self.history_index == len(self.history):
+            self.draft = self.text
+        self.history_index -= 1
+        self.set_text(self.history[self.history_index])
+
+    def history_next(self):
+        if self.history_index >= len(self.history):
+            return
+        self.history_index += 1
+        if self.history_index == len(self.history):
+            self.set_text(self.draft or "")
+            self.draft = None
+        else:
+            self.set_text(self.history[self.history_index])
+
+    def submit(self):
+        text = self.text
+        self.set_text("")
+        self.draft = None
+        if text and (not self.history or self.history[-1] != text):
+            self.history.append(text)
+            del self.history[: -self.history_size]
+        self.history_index = len(self.history)
+        return text
+
+    def take_lines(self):
+        *lines, rest = self.text.split("\n")
+        self.set_text(rest)
+        return [line for line in lines if line.strip()]
+
+    def view(self, width):
+        # Scrolls horizontally so the cursor always stays visible.
+        width = max(1, width)
+        start = max(0, self.cursor - width + 1)
+        return "".join(self.chars[start : start + width]), self.cursor - start
@@ -0,0 +1,286 @@
+import argparse
+import json
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from event_loop import EventLoop
+from irc_client import IRC, server_and_port
+from metrics import Histogram
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+PAYLOAD_TAG = "lg"
+
+
+class WorkerStats:
+    def __init__(self):
+        self.measuring = False
+        self.clients = 0
+        self.ready = 0
+        self.failed = 0
+        self.sent = 0
+        self.received = 0
+        self.nick_changes = 0
+        self.connect_time = Histogram()
+        self.latency = Histogram()
+
+    def start_measuring(self):
+        # Traffic during the connection ramp is not counted.
+        self.measuring = True
+
+    def merge(self, other):
+        for name in (
+            "clients",
+            "ready",
+            "failed",
+            "sent",
+            "received",
+            "nick_changes",
+        ):
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        self.connect_time.merge(other.connect_time)
+        self.latency.merge(other.latency)
+
+
+class SimulatedClient:
+    def __init__(self, number, options, loop, stats):
+        self.number = number
+        self.options = options
+        self.loop = loop
+        self.stats = stats
+        self.nick_base = f"{options.nick_prefix}{number}"
+        self.renames = 0
+        channel = number % options.channels
+        self.channel = f"#{options.channel_prefix}{channel}"
+        self.started = None
+        self.ready = False
+        self.timers = []
+        rate = max(options.rate * 2, IRC.flood_rate)
+        self.irc = IRC(
+            nick=self.nick_base,
+            ui_backend="null",
+            flood_burst=max(IRC.flood_burst, int(rate) + 1),
+            flood_rate=rate,
+            reconnect=False,
+            loop=loop,
+        )
+        # Received chat is only counted, never rendered.
+        self.irc.unregister_handler("PRIVMSG", self.irc.on_privmsg)
+        self.irc.register_handler("PRIVMSG", self.on_privmsg)
+        self.irc.register_handler("001", self.on_welcome)
+
+    def start(self):
+        self.started = time.monotonic()
+        self.irc.connect(*self.options.connect)
+
+    def on_welcome(self, message):
+        if self.ready:
+            return
+        self.ready = True
+        self.stats.ready += 1
+        self.stats.connect_time.record(time.monotonic() - self.started)
+        self.irc.send(f"JOIN {self.channel}")
+        self.schedule(self.next_talk(), self.talk)
+        if self.options.nick_interval:
+            self.schedule(self.next_rename(), self.rename)
+
+    def schedule(self, delay, callback):
+        self.timers.append(self.loop.call_later(delay, callback))
+
+    def next_talk(self):
+        return random.expovariate(self.options.rate)
+
+    def next_rename(self):
+        return self.options.nick_interval * random.uniform(0.5, 1.5)
+
+    def talk(self):
+        if not self.irc.connected:
+            return
+        self.irc.send(
+            f"PRIVMSG {self.channel} :{PAYLOAD_TAG} {time.time_ns()} "
+            f"{self.options.filler}"
+        )
+        if self.stats.measuring:
+            self.stats.sent += 1
+        self.schedule(self.next_talk(), self.talk)
+
+    def rename(self):
+        if not self.irc.connected:
+            return
+        self.renames += 1
+        self.irc.set_nick(f"{self.nick_base}_{self.renames}")
+        self.stats.nick_changes += 1
+        self.schedule(self.next_rename(), self.rename)
+
+    def on_privmsg(self, message):
+        text = message.params[-1]
+        if not text.startswith(PAYLOAD_TAG + " "):
+            return
+        sent = text.split(" ", 2)[1]
+        if sent.isdigit() and self.stats.measuring:
+            self.stats.received += 1
+            self.stats.latency.record((time.time_ns() - int(sent)) / 1e9)
+
+    def stop(self):
+        for timer in self.timers:
+            timer.cancel()
+        self.timers = []
+        if self.irc.connector is not None or self.irc.connected:
+            self.irc.disconnect()
+        if not self.ready:
+            self.stats.failed += 1
+
+
+def raise_file_limit():
+    if resource is None:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft != hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def run_worker(options, first, count):
+    raise_file_limit()
+    loop = EventLoop()
+    stats = WorkerStats()
+    clients = []
+    for number in range(first, first + count):
+        client = SimulatedClient(number, options, loop, stats)
+        clients.append(client)
+        stats.clients += 1
+        loop.call_later(
+            options.ramp * (number - first) / max(1, count), client.start
+        )
+
+    def finish():
+        for client in clients:
+            client.stop()
+        loop.stop()
+
+    loop.call_later(options.ramp, stats.start_measuring)
+    loop.call_later(options.ramp + options.duration, finish)
+    loop.run_forever()
+    return stats
+
+
+def run_load(options):
+    started = time.monotonic()
+    workers = max(1, min(options.processes, options.clients))
+    shares = [
+        options.clients // workers + (i < options.clients % workers)
+        for i in range(workers)
+    ]
+    firsts = [sum(shares[:i]) for i in range(workers)]
+    stats = WorkerStats()
+    if workers == 1:
+        stats.merge(run_worker(options, 0, options.clients))
+    else:
+        with ProcessPoolExecutor(workers) as pool:
+            futures = [
+                pool.submit(run_worker, options, first, share)
+                for first, share in zip(firsts, shares)
+            ]
+            for future in futures:
+                stats.merge(future.result())
+    return report(options, stats, time.monotonic() - started)
+
+
+def report(options, stats, elapsed):
+    return {
+        "server": f"{options.connect[0]}:{options.connect[1]}",
+        "clients": stats.clients,
+        "processes": options.processes,
+        "ready": stats.ready,
+        "failed": stats.failed,
+        "duration": options.duration,
+        "elapsed": round(elapsed, 3),
+        "sent": stats.sent,
+        "received": stats.received,
+        "nick_changes": stats.nick_changes,
+        "sent_per_second": round(stats.sent / options.duration, 1),
+        "received_per_second": round(stats.received / options.duration, 1),
+        "connect": stats.connect_time.summary(),
+        "latency": stats.latency.summary(),
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Run many scripted IRC clients against one server"
+    )
+    parser.add_argument(
+        "--connect",
+        type=server_and_port,
+        required=True,
+        metavar="server:port",
+    )
+    parser.add_argument("--clients", type=int, default=100)
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=1,
+        help="Spread the clients over this many worker processes",
+    )
+    parser.add_argument(
+        "--channels",
+        type=int,
+        default=10,
+        help="Clients are spread round-robin over this many channels",
+    )
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=0.5,
+        metavar="lines/s",
+        help="Average PRIVMSG rate of each client",
+    )
+    parser.add_argument(
+        "--nick-interval",
+        type=float,
+        default=0,
+        metavar="seconds",
+        help="Change nick about this often (0 never changes)",
+    )
+    parser.add_argument(
+        "--duration", type=float, default=30, metavar="seconds"
+    )
+    parser.add_argument(
+        "--ramp",
+        type=float,
+        default=5,
+        metavar="seconds",
+        help="Spread the connection attempts over this long",
+    )
+    parser.add_argument("--nick-prefix", default="lg")
+    parser.add_argument("--channel-prefix", default="load")
+    parser.add_argument(
+        "--message-size",
+        type=int,
+        default=64,
+        metavar="bytes",
+        help="Pad each message to roughly this many bytes",
+    )
+    parser.add_argument("--output", help="Write JSON results to this file")
+    options = parser.parse_args(argv)
+    options.filler = "x" * max(0, options.message_size - 24)
+    return options
+
+
+def main():
+    options = parse_args()
+    results = run_load(options)
+    text = json.dumps(results, indent=2)
+    if options.output:
+        with open(options.output, "w") as output:
+            output.write(text + "\n")
+    print(text)
+    return 0 if results["ready"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
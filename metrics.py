@@ -0,0 +1,143 @@
+import json
+import os
+import socket
+
+HISTOGRAM_BUCKETS = 32
+
+
+class Histogram:
+    def __init__(self):
+        self.buckets = [0] * HISTOGRAM_BUCKETS
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, seconds):
+        # Bucket n holds values below 2**n microseconds.
+        micros = int(seconds * 1_000_000)
+        self.buckets[min(micros.bit_length(), HISTOGRAM_BUCKETS - 1)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, percent):
+        if not self.count:
+            return 0
+        wanted = self.count * percent / 100
+        seen = 0
+        for bucket, count in enumerate(self.buckets):
+            seen += count
+            if seen >= wanted:
+                return min(1 << bucket, self.max * 1_000_000)
+        return self.max * 1_000_000
+
+    def summary(self):
+        mean = self.total / self.count if self.count else 0
+        return {
+            "count": self.count,
+            "mean_us": round(mean * 1_000_000, 1),
+            "p50_us": round(self.percentile(50), 1),
+            "p99_us": round(self.percentile(99), 1),
+            "max_us": round(self.max * 1_000_000, 1),
+        }
+
+    def merge(self, other):
+        for bucket, count in enumerate(other.buckets):
+            self.buckets[bucket] += count
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def reset(self):
+        self.__init__()
+
+
+class RateMeter:
+    def __init__(self):
+        self.previous = {}
+
+    def rate(self, name, value, now):
+        last = self.previous.get(name)
+        self.previous[name] = value, now
+        if last is None or now <= last[1] or value < last[0]:
+            return 0
+        return (value - last[0]) / (now - last[1])
+
+
+class MetricsExporter:
+    max_pending = 64 * 1024
+
+    def __init__(self, target, collect, loop, interval=10):
+        self.target = target
+        self.collect = collect
+        self.loop = loop
+        self.interval = interval
+        self.file = None
+        self.sock = None
+        self.pending = bytearray()
+        self.exported = 0
+        self.dropped = 0
+        self.timer = None
+        if target.startswith("unix:"):
+            self.path = target[5:]
+        else:
+            self.path = None
+            self.file = open(target, "a", encoding="utf-8")
+
+    def start(self):
+        self.timer = self.loop.call_later(self.interval, self.tick)
+
+    def tick(self):
+        self.export()
+        self.timer = self.loop.call_later(self.interval, self.tick)
+
+    def export(self):
+        line = json.dumps(self.collect(), separators=(",", ":")) + "\n"
+        if self.file is not None:
+            self.file.write(line)
+            self.file.flush()
+            self.exported += 1
+            return
+        if len(self.pending) + len(line) > self.max_pending:
+            self.dropped += 1
+        else:
+            self.pending += line.encode()
+            self.exported += 1
+        self.send_pending()
+
+    def send_pending(self):
+        if self.sock is None:
+            try:
+                self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                self.sock.setblocking(False)
+                self.sock.connect(self.path)
+            except OSError:
+                self.close_socket()
+                return
+        try:
+            sent = self.sock.send(self.pending)
+        except BlockingIOError:
+            return
+        except OSError:
+            self.close_socket()
+            return
+        del self.pending[:sent]
+
+    def close_socket(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    def close(self):
+        if self.timer is not None:
+            self.timer.cancel()
+        if self.file is not None:
+            self.file.close()
+        self.close_socket()
+
+
+def describe_target(target):
+    if target.startswith("unix:"):
+        return f"unix socket {target[5:]}"
+    return os.path.abspath(target)
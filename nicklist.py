@@ -0,0 +1,155 @@
+from bisect import bisect_left, bisect_right, insort
+
+PREFIX_RANKS = {"~": 0, "&": 1, "@": 2, "%": 3, "+": 4}
+NO_PREFIX_RANK = len(PREFIX_RANKS)
+
+
+def split_nick_prefix(name):
+    position = 0
+    while position < len(name) and name[position] in PREFIX_RANKS:
+        position += 1
+    return name[:position], name[position:]
+
+
+def fold_nick(nick):
+    return nick.lower()
+
+
+class NickList:
+    block_size = 512
+
+    def __init__(self, names=()):
+        self.blocks = []
+        self.maxes = []
+        self.members = {}
+        self.length = 0
+        entries = {}
+        for name in names:
+            entry = self.make_entry(name)
+            if entry is not None:
+                entries[entry[1]] = entry
+        if entries:
+            self.members = entries
+            ordered = sorted(entries.values())
+            for start in range(0, len(ordered), self.block_size):
+                block = ordered[start:start + self.block_size]
+                self.blocks.append(block)
+                self.maxes.append(block[-1])
+            self.length = len(ordered)
+
+    @staticmethod
+    def make_entry(name):
+        prefixes, nick = split_nick_prefix(name)
+        nick = nick.split("!", 1)[0]
+        if not nick:
+            return None
+        rank = min(
+            (PREFIX_RANKS[prefix] for prefix in prefixes),
+            default=NO_PREFIX_RANK,
+        )
+        display = prefixes[:1] + nick
+        return rank, fold_nick(nick), display, prefixes
+
+    def __len__(self):
+        return self.length
+
+    def __contains__(self, nick):
+        return fold_nick(split_nick_prefix(nick)[1]) in self.members
+
+    def __iter__(self):
+        for block in self.blocks:
+            for entry in block:
+                yield entry[2]
+
+    def offset(self, block_index):
+        return sum(len(block) for block in self.blocks[:block_index])
+
+    def locate(self, entry):
+        block_index = bisect_left(self.maxes, entry)
+        block = self.blocks[block_index]
+        return block_index, bisect_left(block, entry)
+
+    def add(self, name):
+        entry = self.make_entry(name)
+        if entry is None:
+            return None
+        existing = self.members.get(entry[1])
+        if existing == entry:
+            return None
+        changed = None
+        if existing is not None:
+            changed = self.remove(existing[2])
+        self.members[entry[1]] = entry
+        self.length += 1
+        if not self.blocks:
+            self.blocks.append([entry])
+            self.maxes.append(entry)
+            return 0
+        block_index = bisect_right(self.maxes, entry)
+        if block_index == len(self.blocks):
+            block_index -= 1
+        block = self.blocks[block_index]
+        insort(block, entry)
+        self.maxes[block_index] = block[-1]
+        index = self.offset(block_index) + bisect_left(block, entry)
+        if len(block) > 2 * self.block_size:
+            tail = block[self.block_size:]
+            del block[self.block_size:]
+            self.blocks.insert(block_index + 1, tail)
+            self.maxes.insert(block_index + 1, tail[-1])
+            self.maxes[block_index] = block[-1]
+        if changed is not None:
+            return min(changed, index)
+        return index
+
+    def remove(self, nick):
+        entry = self.members.pop(fold_nick(split_nick_prefix(nick)[1]), None)
+        if entry is None:
+            return None
+        block_index, position = self.locate(entry)
+        block = self.blocks[block_index]
+        index = self.offset(block_index) + position
+        del block[position]
+        self.length -= 1
+        if block:
+            self.maxes[block_index] = block[-1]
+        else:
+            del self.blocks[block_index]
+            del self.maxes[block_index]
+        return index
+
+    def rename(self, old_nick, new_nick):
+        entry = self.members.get(fold_nick(split_nick_prefix(old_nick)[1]))
+        if entry is None:
+            return None
+        removed = self.remove(old_nick)
+        added = self.add(entry[3] + new_nick)
+        if added is None:
+            return removed
+        return min(removed, added)
+
+    def index(self, nick):
+        entry = self.members.get(fold_nick(split_nick_prefix(nick)[1]))
+        if entry is None:
+            return None
+        block_index, position = self.locate(entry)
+        return self.offset(block_index) + position
+
+    def slice(self, start, stop):
+        result = []
+        position = 0
+        for block in self.blocks:
+            if position + len(block) > start:
+                first = max(0, start - position)
+                last = min(len(block), stop - position)
+                result.extend(entry[2] for entry in block[first:last])
+            position += len(block)
+            if position >= stop:
+                break
+        return result
+
+    def clear(self):
+        self.blocks = []
+        self.maxes = []
+        self.members = {}
+        self.length = 0
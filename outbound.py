@@ -0,0 +1,172 @@
+from collections import deque
+from contextlib import nullcontext
+import socket
+import ssl
+import time
+
+SEND_FLAGS = getattr(socket, "MSG_DONTWAIT", 0)
+WOULD_BLOCK = (
+    BlockingIOError,
+    InterruptedError,
+    ssl.SSLWantReadError,
+    ssl.SSLWantWriteError,
+)
+
+
+class TokenBucket:
+    def __init__(self, burst, rate, clock=time.monotonic):
+        self.capacity = burst
+        self.tokens = burst
+        self.rate = rate
+        self.clock = clock
+        self.updated = clock()
+
+    def refill(self):
+        now = self.clock()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated) * self.rate
+        )
+        self.updated = now
+
+    def consume(self, amount=1):
+        self.refill()
+        if self.tokens >= amount:
+            self.tokens -= amount
+            return True
+        return False
+
+    def delay(self, amount=1):
+        self.refill()
+        if self.tokens >= amount:
+            return 0
+        if self.rate <= 0:
+            return None
+        return (amount - self.tokens) / self.rate
+
+    def is_full(self):
+        self.refill()
+        return self.tokens >= self.capacity
+
+
+class SendQueue:
+    drain_timeout = 5
+
+    def __init__(
+        self,
+        sock,
+        bucket,
+        loop,
+        on_error,
+        max_write=4096,
+        encoding="utf-8",
+        lock=None,
+    ):
+        self.sock = sock
+        # TLS sockets are non-blocking and reject send flags; with a
+        # receive thread they also need the lock around every call.
+        if isinstance(sock, ssl.SSLSocket):
+            self.send_flags = 0
+        else:
+            self.send_flags = SEND_FLAGS
+        self.lock = lock or nullcontext()
+        self.bucket = bucket
+        self.loop = loop
+        self.on_error = on_error
+        self.max_write = max_write
+        self.encoding = encoding
+        self.commands = deque()
+        self.pending = bytearray()
+        self.timer = None
+        self.closed = False
+        self.bytes_sent = 0
+        self.writes = 0
+        self.stalls = 0
+        self.last_wait = 0
+
+    def put(self, command, urgent=False):
+        if self.closed:
+            return
+        data = bytes(command + "\n", self.encoding)
+        entry = (data, time.monotonic(), urgent)
+        if urgent:
+            self.commands.appendleft(entry)
+        else:
+            self.commands.append(entry)
+        self.flush()
+
+    def depth(self):
+        return len(self.commands)
+
+    def wait_time(self):
+        if not self.commands:
+            return 0
+        return time.monotonic() - self.commands[0][1]
+
+    def take_commands(self, limit):
+        now = time.monotonic()
+        while self.commands and len(self.pending) < limit:
+            data, queued_at, urgent = self.commands[0]
+            if not urgent and not self.bucket.consume():
+                break
+            self.commands.popleft()
+            self.pending += data
+            self.last_wait = now - queued_at
+
+    def flush(self, sock=None):
+        if self.closed:
+            return
+        if self.timer:
+            self.timer.cancel()
+            self.timer = None
+        self.take_commands(self.max_write)
+        if self.pending:
+            try:
+                with self.lock:
+                    sent = self.sock.send(self.pending, self.send_flags)
+            except WOULD_BLOCK:
+                sent = 0
+                self.stalls += 1
+            except socket.error:
+                self.close()
+                self.on_error()
+                return
+            del self.pending[:sent]
+            self.bytes_sent += sent
+            self.writes += 1
+        if self.pending:
+            self.loop.add_writer(self.sock, self.flush)
+            return
+        self.loop.remove_writer(self.sock)
+        if self.commands:
+            delay = self.bucket.delay()
+            if delay is not None:
+                self.timer = self.loop.call_later(delay, self.flush)
+
+    def drain(self):
+        # Last write before closing: whatever flood control lets out in
+        # one write, with a bounded wait even on a blocking socket, and
+        # the rest is dropped.
+        if self.closed:
+            return
+        self.take_commands(self.max_write)
+        self.commands.clear()
+        with self.lock:
+            timeout = self.sock.gettimeout()
+            try:
+                self.sock.settimeout(self.drain_timeout)
+                self.sock.sendall(self.pending)
+                self.bytes_sent += len(self.pending)
+            except socket.error:
+                pass
+            finally:
+                self.sock.settimeout(timeout)
+        self.pending.clear()
+
+    def close(self):
+        self.closed = True
+        if self.timer:
+            self.timer.cancel()
+            self.timer = None
+        self.loop.remove_writer(self.sock)
+        self.commands.clear()
+        self.pending.clear()
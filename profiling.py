@@ -0,0 +1,151 @@
+import cProfile
+import io
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+REPORT_LINES = 20
+
+
+def default_path(kind, extension):
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    return f"zeliboba-{kind}-{stamp}.{extension}"
+
+
+class ThreadSampler(threading.Thread):
+    def __init__(self, interval=0.005):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.stop_request = threading.Event()
+        self.samples = 0
+        self.own = Counter()
+        self.total = Counter()
+
+    def run(self):
+        main = threading.main_thread().ident
+        names = {}
+        while not self.stop_request.wait(self.interval):
+            for thread in threading.enumerate():
+                names[thread.ident] = thread.name
+            for ident, frame in sys._current_frames().items():
+                if ident in (main, self.ident):
+                    continue
+                self.samples += 1
+                thread_name = names.get(ident, str(ident))
+                self.own[(thread_name, self.describe(frame))] += 1
+                seen = set()
+                while frame is not None:
+                    site = (thread_name, self.describe(frame))
+                    if site not in seen:
+                        seen.add(site)
+                        self.total[site] += 1
+                    frame = frame.f_back
+
+    @staticmethod
+    def describe(frame):
+        code = frame.f_code
+        return f"{code.co_filename}:{code.co_firstlineno}({code.co_name})"
+
+    def stop(self):
+        self.stop_request.set()
+        self.join()
+
+    def report(self):
+        lines = [f"thread samples: {self.samples} every {self.interval}s"]
+        for (thread_name, site), count in self.total.most_common(
+            REPORT_LINES
+        ):
+            own = self.own[(thread_name, site)]
+            lines.append(f"{count:7} {own:7}  [{thread_name}] {site}")
+        return lines
+
+
+class Profiler:
+    def __init__(self):
+        self.profile = None
+        self.sampler = None
+        self.started = None
+
+    @property
+    def running(self):
+        return self.profile is not None
+
+    def start(self):
+        self.started = time.monotonic()
+        self.sampler = ThreadSampler()
+        self.sampler.start()
+        self.profile = cProfile.Profile()
+        self.profile.enable()
+
+    def stop(self, path=None):
+        self.profile.disable()
+        self.sampler.stop()
+        elapsed = time.monotonic() - self.started
+        path = path or default_path("profile", "prof")
+        try:
+            self.profile.dump_stats(path)
+            output = io.StringIO()
+            stats = pstats.Stats(self.profile, stream=output)
+            stats.sort_stats("cumulative").print_stats(REPORT_LINES)
+            lines = [f"profiled {elapsed:.1f}s, main thread stats in {path}"]
+            lines += [line for line in output.getvalue().splitlines() if line]
+            lines += self.sampler.report()
+            with open(path + ".txt", "w") as report:
+                stats = pstats.Stats(self.profile, stream=report)
+                stats.sort_stats("cumulative").print_stats()
+                report.write("\n".join(self.sampler.report()) + "\n")
+        finally:
+            self.profile = None
+            self.sampler = None
+        return lines
+
+
+class MemoryProfiler:
+    frames = 1
+
+    def __init__(self):
+        self.baseline = None
+
+    def take_snapshot(self):
+        snapshot = tracemalloc.take_snapshot()
+        return snapshot.filter_traces(
+            (
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            )
+        )
+
+    def snapshot(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+        self.baseline = self.take_snapshot()
+        stats = self.baseline.statistics("lineno")
+        total = sum(stat.size for stat in stats)
+        lines = [f"baseline: {total / 1024:.1f} KiB in {len(stats)} sites"]
+        lines += [str(stat) for stat in stats[:REPORT_LINES]]
+        return lines
+
+    def diff(self, path=None):
+        if self.baseline is None:
+            return None
+        current = self.take_snapshot()
+        stats = current.compare_to(self.baseline, "lineno")
+        growth = sum(stat.size_diff for stat in stats)
+        path = path or default_path("memprofile", "txt")
+        with open(path, "w") as report:
+            for stat in stats:
+                report.write(f"{stat}\n")
+        lines = [
+            f"growth since baseline: {growth / 1024:+.1f} KiB, "
+            f"full diff in {path}"
+        ]
+        lines += [str(stat) for stat in stats[:REPORT_LINES]]
+        return lines
+
+    def stop(self):
+        self.baseline = None
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
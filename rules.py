@@ -0,0 +1,124 @@
+import re
+
+ACTIONS = ("drop", "dim", "highlight")
+FIELDS = ("nick", "host", "channel", "text")
+EVENTS = ("message", "join", "part", "quit")
+
+
+class RuleError(Exception):
+    pass
+
+
+class Rule:
+    def __init__(self, action, events, field, pattern):
+        self.action = action
+        self.events = events
+        self.field = field
+        self.pattern = pattern
+        self.matches = 0
+
+    def __str__(self):
+        events = ",".join(self.events)
+        return f"{self.action}:{events} {self.field} {self.pattern}"
+
+
+def parse_rule(line):
+    # <action>[:<event>,...] <field> <pattern>
+    parts = line.split(None, 2)
+    if len(parts) < 3:
+        raise RuleError(f"expected '<action> <field> <pattern>': {line}")
+    action, field, pattern = parts
+    action, _, events = action.partition(":")
+    events = tuple(events.split(",")) if events else ("message",)
+    if action not in ACTIONS:
+        raise RuleError(f"unknown action {action!r}")
+    if field not in FIELDS:
+        raise RuleError(f"unknown field {field!r}")
+    for event in events:
+        if event not in EVENTS:
+            raise RuleError(f"unknown event {event!r}")
+    # Patterns end up inside one alternation, where global flags are no
+    # longer at the start and group numbers shift.
+    try:
+        re.compile(f"(?:{pattern})")
+    except re.error as e:
+        raise RuleError(f"bad pattern {pattern!r}: {e}")
+    for escape in re.finditer(r"\\.", pattern):
+        if escape.group()[1] in "123456789":
+            raise RuleError(
+                f"bad pattern {pattern!r}: numbered backreferences are not "
+                "supported, use (?P<name>...) and (?P=name)"
+            )
+    return Rule(action, events, field, pattern)
+
+
+def load_rules(path):
+    rules = []
+    with open(path, encoding="utf-8") as rules_file:
+        for number, line in enumerate(rules_file, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                rules.append(parse_rule(line))
+            except RuleError as e:
+                raise RuleError(f"{path}:{number}: {e}")
+    return RuleSet(rules)
+
+
+def compile_group(patterns):
+    try:
+        return re.compile("|".join(patterns), re.IGNORECASE)
+    except re.error as e:
+        # Rules valid on their own can still clash, e.g. on group names.
+        raise RuleError(f"rules cannot be combined: {e}")
+
+
+class RuleSet:
+    def __init__(self, rules=()):
+        self.rules = list(rules)
+        self.checks = {}
+        self.compile()
+
+    def __len__(self):
+        return len(self.rules)
+
+    def compile(self):
+        # All patterns for one (event, action, field) are joined into a
+        # single alternation, so a line costs at most one search per group
+        # no matter how many rules there are. The named group that matched
+        # tells which rule it was.
+        groups = {}
+        for index, rule in enumerate(self.rules):
+            for event in rule.events:
+                key = event, rule.action, rule.field
+                groups.setdefault(key, []).append(
+                    f"(?P<r{index}>{rule.pattern})"
+                )
+        self.checks = {}
+        for event in EVENTS:
+            checks = []
+            for action in ACTIONS:
+                for field in FIELDS:
+                    patterns = groups.get((event, action, field))
+                    if patterns:
+                        regex = compile_group(patterns)
+                        checks.append((FIELDS.index(field), regex))
+            if checks:
+                self.checks[event] = checks
+
+    def match(self, event, nick, host, channel, text):
+        checks = self.checks.get(event)
+        if checks is None:
+            return None
+        fields = (nick, host, channel, text)
+        for field, regex in checks:
+            found = regex.search(fields[field])
+            if found is not None:
+                rule = self.rules[int(found.lastgroup[1:])]
+                rule.matches += 1
+                return rule
+        return None
+
+    def counts(self):
+        return [(str(rule), rule.matches) for rule in self.rules]
@@ -0,0 +1,113 @@
+import time
+from collections import deque
+
+# Rough per-line bookkeeping cost (tuple, float, str header) used for the
+# byte cap on top of the text itself.
+ENTRY_OVERHEAD = 120
+
+
+class Scrollback:
+    def __init__(self, max_lines=10000, max_bytes=8 * 1024 * 1024):
+        self.max_lines = max_lines
+        self.max_bytes = max_bytes
+        self.entries = deque()
+        self.first_seq = 0
+        self.size = 0
+        self.nicks = []
+        self.nick_ids = {}
+        self.nick_refs = []
+        self.free_nick_ids = []
+        self.wrap_width = None
+        self.wrap_cache = {}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def intern_nick(self, nick):
+        nick_id = self.nick_ids.get(nick)
+        if nick_id is None:
+            if self.free_nick_ids:
+                nick_id = self.free_nick_ids.pop()
+                self.nicks[nick_id] = nick
+                self.nick_refs[nick_id] = 0
+            else:
+                nick_id = len(self.nicks)
+                self.nicks.append(nick)
+                self.nick_refs.append(0)
+            self.nick_ids[nick] = nick_id
+        self.nick_refs[nick_id] += 1
+        return nick_id
+
+    def release_nick(self, nick_id):
+        self.nick_refs[nick_id] -= 1
+        if self.nick_refs[nick_id] == 0:
+            del self.nick_ids[self.nicks[nick_id]]
+            self.nicks[nick_id] = None
+            self.free_nick_ids.append(nick_id)
+
+    def append(self, text, color=0, nick=None, timestamp=None):
+        if timestamp is None:
+            timestamp = time.time()
+        nick_id = -1 if nick is None else self.intern_nick(nick)
+        self.entries.append((timestamp, nick_id, color, text))
+        self.size += len(text) + ENTRY_OVERHEAD
+        while self.entries and (
+            len(self.entries) > self.max_lines or self.size > self.max_bytes
+        ):
+            self.evict()
+        return self.first_seq + len(self.entries) - 1
+
+    def evict(self):
+        timestamp, nick_id, color, text = self.entries.popleft()
+        self.size -= len(text) + ENTRY_OVERHEAD
+        if nick_id >= 0:
+            self.release_nick(nick_id)
+        self.wrap_cache.pop(self.first_seq, None)
+        self.first_seq += 1
+
+    def clear(self):
+        while self.entries:
+            self.evict()
+
+    def get_nick(self, entry):
+        nick_id = entry[1]
+        return None if nick_id < 0 else self.nicks[nick_id]
+
+    def format(self, entry):
+        timestamp, nick_id, color, text = entry
+        stamp = time.strftime("[%H:%M]", time.localtime(timestamp))
+        if nick_id >= 0:
+            return f"{stamp} <{self.nicks[nick_id]}> {text}"
+        return f"{stamp} {text}"
+
+    def wrap_entry(self, entry, width):
+        line = self.format(entry)
+        return [line[i:i + width] for i in range(0, len(line), width)] or [""]
+
+    def wrap(self, seq, entry, width):
+        if width != self.wrap_width:
+            self.wrap_width = width
+            self.wrap_cache = {}
+        rows = self.wrap_cache.get(seq)
+        if rows is None:
+            rows = self.wrap_cache[seq] = self.wrap_entry(entry, width)
+        return rows
+
+    def wrap_last(self, width):
+        return self.wrap_entry(self.entries[-1], width)
+
+    def page(self, offset, height, width):
+        wanted = offset + height
+        rows = []
+        seq = self.first_seq + len(self.entries)
+        for entry in reversed(self.entries):
+            seq -= 1
+            color = entry[2]
+            for row in reversed(self.wrap(seq, entry, width)):
+                rows.append((color, row))
+            if len(rows) >= wanted:
+                break
+        offset = max(0, min(offset, len(rows) - height))
+        visible = rows[offset:offset + height]
+        visible.reverse()
+        return visible, offset
@@ -0,0 +1,180 @@
+import mmap
+import os
+import struct
+import time
+
+MAGIC = b"ZIRCSNAP"
+VERSION = 1
+HEADER = struct.Struct("!8sHd")
+LENGTH = struct.Struct("!I")
+CONNECTION = struct.Struct("!HB")
+FLAGS = struct.Struct("!B")
+# Timestamp, color and the byte lengths of the nick and the text.
+LINE = struct.Struct("!dhII")
+CHANNEL = 1
+JOINED = 2
+
+
+class SnapshotError(Exception):
+    pass
+
+
+class BufferState:
+    def __init__(self, name, is_channel, joined, topic, nicknames, lines):
+        self.name = name
+        self.is_channel = is_channel
+        self.joined = joined
+        self.topic = topic
+        self.nicknames = nicknames
+        # (timestamp, color, nick or None, text) tuples, oldest first.
+        self.lines = lines
+
+
+class Snapshot:
+    def __init__(
+        self,
+        server="",
+        port=0,
+        tls=False,
+        nick="",
+        active="",
+        buffers=None,
+        saved_at=None,
+    ):
+        self.server = server
+        self.port = port
+        self.tls = tls
+        self.nick = nick
+        self.active = active
+        self.buffers = [] if buffers is None else buffers
+        self.saved_at = time.time() if saved_at is None else saved_at
+
+
+class Writer:
+    def __init__(self):
+        self.data = bytearray()
+
+    def pack(self, fmt, *values):
+        self.data += fmt.pack(*values)
+
+    def string(self, text):
+        encoded = encode(text)
+        self.data += LENGTH.pack(len(encoded))
+        self.data += encoded
+
+    def line(self, timestamp, color, nick, text):
+        nick = encode(nick or "")
+        text = encode(text)
+        self.data += LINE.pack(timestamp, color, len(nick), len(text))
+        self.data += nick
+        self.data += text
+
+
+class Reader:
+    def __init__(self, data):
+        self.data = data
+        self.offset = 0
+
+    def unpack(self, fmt):
+        values = fmt.unpack_from(self.data, self.offset)
+        self.offset += fmt.size
+        return values
+
+    def take(self, length):
+        end = self.offset + length
+        if end > len(self.data):
+            raise SnapshotError("Snapshot is truncated")
+        text = decode(self.data[self.offset:end])
+        self.offset = end
+        return text
+
+    def string(self):
+        return self.take(self.unpack(LENGTH)[0])
+
+    def line(self):
+        timestamp, color, nick_length, text_length = self.unpack(LINE)
+        nick = self.take(nick_length) or None
+        return timestamp, color, nick, self.take(text_length)
+
+
+def encode(text):
+    return text.encode("utf-8", "surrogatepass")
+
+
+def decode(data):
+    return data.decode("utf-8", "surrogatepass")
+
+
+def encode_snapshot(snapshot):
+    writer = Writer()
+    writer.pack(HEADER, MAGIC, VERSION, snapshot.saved_at)
+    writer.string(snapshot.server)
+    writer.pack(CONNECTION, snapshot.port, snapshot.tls)
+    writer.string(snapshot.nick)
+    writer.string(snapshot.active)
+    writer.pack(LENGTH, len(snapshot.buffers))
+    for buffer in snapshot.buffers:
+        writer.string(buffer.name)
+        flags = (CHANNEL if buffer.is_channel else 0) | (
+            JOINED if buffer.joined else 0
+        )
+        writer.pack(FLAGS, flags)
+        writer.string(buffer.topic)
+        # Nicks never contain spaces, so a whole list is one string.
+        writer.string(" ".join(buffer.nicknames))
+        writer.pack(LENGTH, len(buffer.lines))
+        for line in buffer.lines:
+            writer.line(*line)
+    return bytes(writer.data)
+
+
+def decode_snapshot(data):
+    reader = Reader(data)
+    try:
+        magic, version, saved_at = reader.unpack(HEADER)
+        if magic != MAGIC:
+            raise SnapshotError("Not a snapshot file")
+        if version != VERSION:
+            raise SnapshotError(f"Unsupported snapshot version {version}")
+        server = reader.string()
+        port, tls = reader.unpack(CONNECTION)
+        nick = reader.string()
+        active = reader.string()
+        buffers = []
+        for _ in range(reader.unpack(LENGTH)[0]):
+            name = reader.string()
+            (flags,) = reader.unpack(FLAGS)
+            topic = reader.string()
+            nicknames = reader.string().split()
+            lines = [reader.line() for _ in range(reader.unpack(LENGTH)[0])]
+            buffers.append(
+                BufferState(
+                    name,
+                    bool(flags & CHANNEL),
+                    bool(flags & JOINED),
+                    topic,
+                    nicknames,
+                    lines,
+                )
+            )
+    except (struct.error, UnicodeDecodeError) as error:
+        raise SnapshotError(f"Corrupt snapshot: {error}")
+    return Snapshot(server, port, bool(tls), nick, active, buffers, saved_at)
+
+
+def save_snapshot(path, snapshot):
+    # Written aside and renamed, so a crash never leaves half a file.
+    data = encode_snapshot(snapshot)
+    temporary = f"{path}.tmp"
+    with open(temporary, "wb") as output:
+        output.write(data)
+    os.replace(temporary, path)
+    return len(data)
+
+
+def load_snapshot(path):
+    with open(path, "rb") as source:
+        if os.fstat(source.fileno()).st_size == 0:
+            raise SnapshotError("Snapshot is empty")
+        with mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return decode_snapshot(data)
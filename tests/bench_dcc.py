@@ -0,0 +1,147 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), os.path.pardir)
+)
+
+from dcc import DccManager, encode_address
+
+BLOCK_SIZE = 1024 * 1024
+ADDRESS = "127.0.0.1"
+
+
+def make_file(path, size):
+    # Distinct blocks, so a chunk written at the wrong offset shows up
+    # in the digest.
+    seed = os.urandom(BLOCK_SIZE)
+    with open(path, "wb") as output:
+        written = 0
+        number = 0
+        while written < size:
+            block = number.to_bytes(8, "big") + seed[8:]
+            block = block[:size - written]
+            output.write(block)
+            written += len(block)
+            number += 1
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as source:
+        while True:
+            data = source.read(8 * BLOCK_SIZE)
+            if not data:
+                return digest.hexdigest()
+            digest.update(data)
+
+
+def offer(sender, receiver, path):
+    outgoing = sender.send("bob", path, ADDRESS)
+    incoming = receiver.offer(
+        "alice",
+        f"SEND {outgoing.filename} {encode_address(ADDRESS)} "
+        f"{outgoing.port} {outgoing.size}",
+    )
+    return outgoing, incoming
+
+
+def wait(transfer, timeout, stop_at=None):
+    deadline = time.monotonic() + timeout
+    while transfer.finished is None:
+        if stop_at is not None and transfer.position >= stop_at:
+            transfer.cancel()
+            stop_at = None
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"{transfer.describe()} timed out")
+        time.sleep(0.001)
+
+
+def run_transfer(
+    path, directory, resume_at=None, rate=0, transfer_rate=0, timeout=600
+):
+    size = os.path.getsize(path)
+    sender = DccManager(rate=rate, transfer_rate=transfer_rate)
+    receiver = DccManager(directory, rate, transfer_rate)
+    resumed_from = 0
+    if resume_at is not None:
+        # Interrupt a first transfer, then resume it the way clients do:
+        # a new offer, RESUME from the receiver and ACCEPT back.
+        outgoing, incoming = offer(sender, receiver, path)
+        receiver.get(incoming.number)
+        wait(incoming, timeout, int(size * resume_at))
+        wait(outgoing, timeout)
+        outgoing, incoming = offer(sender, receiver, path)
+        resumed_from = receiver.get(incoming.number)
+        port = outgoing.port
+        sender.resume_requested(
+            "bob", f"RESUME {outgoing.filename} {port} {resumed_from}"
+        )
+        start = time.perf_counter()
+        receiver.resume_accepted(
+            "alice", f"ACCEPT {outgoing.filename} {port} {resumed_from}"
+        )
+    else:
+        outgoing, incoming = offer(sender, receiver, path)
+        start = time.perf_counter()
+        receiver.get(incoming.number)
+    wait(incoming, timeout)
+    wait(outgoing, timeout)
+    elapsed = time.perf_counter() - start
+    moved = size - (resumed_from or 0)
+    return {
+        "size": size,
+        "resumed_from": resumed_from or 0,
+        "seconds": elapsed,
+        "mib_per_second": moved / elapsed / BLOCK_SIZE,
+        "sender": outgoing.state,
+        "receiver": incoming.state,
+        "path": incoming.path,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DCC loopback benchmark")
+    parser.add_argument("--size-mib", type=int, default=5 * 1024)
+    parser.add_argument(
+        "--resume-at",
+        type=float,
+        metavar="fraction",
+        help="Interrupt the transfer this far in and resume it",
+    )
+    parser.add_argument("--rate", type=int, default=0, metavar="bytes/s")
+    parser.add_argument(
+        "--transfer-rate", type=int, default=0, metavar="bytes/s"
+    )
+    parser.add_argument("--directory", help="Scratch directory")
+    parser.add_argument("--output", help="Write JSON results to this file")
+    args = parser.parse_args()
+    directory = tempfile.mkdtemp(dir=args.directory)
+    try:
+        source = os.path.join(directory, "source.bin")
+        make_file(source, args.size_mib * BLOCK_SIZE)
+        received = os.path.join(directory, "received")
+        result = run_transfer(
+            source, received, args.resume_at, args.rate, args.transfer_rate
+        )
+        result["identical"] = file_digest(source) == file_digest(
+            result.pop("path")
+        )
+    finally:
+        shutil.rmtree(directory)
+    text = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w") as output:
+            output.write(text + "\n")
+    print(text)
+    return 0 if result["identical"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,282 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), os.path.pardir)
+)
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from fake_ircd import FakeIRCServer
+from irc_client import IRC
+
+NICK = "bench"
+CHANNEL = "#bench"
+NAMES_PER_LINE = 40
+PING_EVERY = 200
+
+
+def names_lines(nicks):
+    lines = []
+    for start in range(0, len(nicks), NAMES_PER_LINE):
+        names = " ".join(nicks[start:start + NAMES_PER_LINE])
+        lines.append(f":fake.server 353 {NICK} = {CHANNEL} :{names}")
+    lines.append(f":fake.server 366 {NICK} {CHANNEL} :End of /NAMES list.")
+    return lines
+
+
+def join_lines(nicks=()):
+    return [f":{NICK}!b@bench.host JOIN {CHANNEL}"] + names_lines(
+        [NICK] + list(nicks)
+    )
+
+
+def make_nicks(count):
+    prefixes = ["", "", "", "+", "@"]
+    return [f"{prefixes[i % len(prefixes)]}user{i}" for i in range(count)]
+
+
+def privmsg_flood(scale):
+    senders = [f"user{i}" for i in range(50)]
+    lines = [
+        f":{senders[i % 50]}!u@host PRIVMSG {CHANNEL} "
+        f":flood message number {i} with some typical chat text"
+        for i in range(int(50000 * scale))
+    ]
+    return join_lines(senders), lines
+
+
+def netsplit_storm(scale):
+    nicks = [f"user{i}" for i in range(int(5000 * scale))]
+    quits = [f":{nick}!u@host QUIT :hub.net leaf.net" for nick in nicks]
+    joins = [f":{nick}!u@host JOIN {CHANNEL}" for nick in nicks]
+    return join_lines(nicks), quits + joins
+
+
+def names_burst(scale):
+    return join_lines(), names_lines(make_nicks(int(10000 * scale)))
+
+
+def ping_under_load(scale):
+    lines = []
+    for i in range(int(20000 * scale)):
+        if i % PING_EVERY == 0:
+            lines.append(f"PING :bench-{i}")
+        lines.append(f":user{i % 50}!u@host PRIVMSG {CHANNEL} :load {i}")
+    return join_lines(), lines
+
+
+SCENARIOS = {
+    "privmsg_flood": privmsg_flood,
+    "netsplit_storm": netsplit_storm,
+    "names_burst": names_burst,
+    "ping_under_load": ping_under_load,
+}
+
+
+class HandleRecorder:
+    def __init__(self, irc):
+        self.times = []
+        handle_message = irc.handle_message
+        clock = time.perf_counter
+        append = self.times.append
+
+        def record(message):
+            handle_message(message)
+            append(clock())
+
+        irc.handle_message = record
+
+    def reset(self):
+        del self.times[:]
+
+
+def percentile(values, percent):
+    if not values:
+        return 0
+    ordered = sorted(values)
+    index = round(percent / 100 * (len(ordered) - 1))
+    return ordered[index]
+
+
+def drive(irc, recorder, count, timeout):
+    deadline = time.monotonic() + timeout
+    while len(recorder.times) < count:
+        if time.monotonic() > deadline:
+            raise TimeoutError(
+                f"handled {len(recorder.times)} of {count} lines"
+            )
+        if irc.threaded:
+            irc.poll(0.01)
+        else:
+            irc.loop.run_once(0.01)
+
+
+def pong_latencies(server, lines):
+    sent = {}
+    for index, line in enumerate(lines):
+        if line.startswith("PING :"):
+            sent[line[6:]] = server.write_times[index]
+    latencies = []
+    with server.received_lock:
+        received = list(zip(server.received, server.received_times))
+    for line, when in received:
+        if line.startswith("PONG "):
+            token = line[5:].lstrip(":")
+            if token in sent:
+                latencies.append(when - sent.pop(token))
+    return latencies
+
+
+def run_scenario(name, scale, threaded, timeout):
+    setup, lines = SCENARIOS[name](scale)
+    server = FakeIRCServer()
+    irc = IRC(
+        nick=NICK,
+        threaded=threaded,
+        ui_backend="null",
+        connect_info=("127.0.0.1", server.port),
+    )
+    recorder = HandleRecorder(irc)
+    server.wait_connected()
+    drive(irc, recorder, 2, timeout)
+    server.send(setup)
+    drive(irc, recorder, 2 + len(setup), timeout)
+    recorder.reset()
+    del server.write_times[:]
+
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    cpu_start = usage.ru_utime + usage.ru_stime
+    thread_start = time.thread_time()
+    start = time.perf_counter()
+    sender = server.send_async(lines)
+    drive(irc, recorder, len(lines), timeout)
+    elapsed = time.perf_counter() - start
+    thread_cpu = time.thread_time() - thread_start
+    sender.join()
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+
+    latencies = [
+        handled - written
+        for handled, written in zip(recorder.times, server.write_times)
+    ]
+    result = {
+        "lines": len(lines),
+        "seconds": elapsed,
+        "lines_per_second": len(lines) / elapsed,
+        "latency_ms": {
+            "p50": percentile(latencies, 50) * 1000,
+            "p99": percentile(latencies, 99) * 1000,
+        },
+        "peak_rss_kb": usage.ru_maxrss,
+        "cpu_seconds": usage.ru_utime + usage.ru_stime - cpu_start,
+        "client_thread_cpu_seconds": thread_cpu,
+    }
+    if name == "ping_under_load":
+        pings = [line for line in lines if line.startswith("PING :")]
+        last_pong = "PONG " + pings[-1][6:]
+        server.wait_for(lambda line: line == last_pong, timeout)
+        pongs = pong_latencies(server, lines)
+        result["pong_rtt_ms"] = {
+            "count": len(pongs),
+            "p50": percentile(pongs, 50) * 1000,
+            "p99": percentile(pongs, 99) * 1000,
+        }
+    irc.ui.quit()
+    server.close()
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL,
+            text=True,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_isolated(name, args):
+    # Each scenario runs in its own interpreter so peak RSS and CPU time
+    # are not inherited from the previous one.
+    command = [
+        sys.executable,
+        os.path.abspath(__file__),
+        "--child",
+        name,
+        "--scale",
+        str(args.scale),
+        "--timeout",
+        str(args.timeout),
+    ]
+    if args.threaded:
+        command.append("--threaded")
+    output = subprocess.check_output(command, text=True)
+    return json.loads(output.splitlines()[-1])
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as baseline_file:
+        baseline = json.load(baseline_file)
+    print(f"compared with {baseline.get('commit')}:", file=sys.stderr)
+    for name, result in results["scenarios"].items():
+        old = baseline["scenarios"].get(name)
+        if old is None:
+            continue
+        speed = result["lines_per_second"] / old["lines_per_second"]
+        p99 = result["latency_ms"]["p99"] / old["latency_ms"]["p99"]
+        print(
+            f"{name:16} lines/s {speed:6.2f}x  p99 latency {p99:6.2f}x",
+            file=sys.stderr,
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end benchmark")
+    parser.add_argument(
+        "--scenario", action="append", choices=sorted(SCENARIOS)
+    )
+    parser.add_argument("--scale", type=float, default=1.0)
+    parser.add_argument("--threaded", action="store_true")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--output", help="Write JSON results to this file")
+    parser.add_argument("--compare", help="Baseline JSON to compare with")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        result = run_scenario(
+            args.child, args.scale, args.threaded, args.timeout
+        )
+        print(json.dumps(result))
+        return
+
+    results = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "mode": "threaded" if args.threaded else "loop",
+        "scale": args.scale,
+        "scenarios": {},
+    }
+    for name in args.scenario or SCENARIOS:
+        results["scenarios"][name] = run_isolated(name, args)
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as output:
+            output.write(text + "\n")
+    else:
+        print(text)
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
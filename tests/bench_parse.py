@@ -0,0 +1,104 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), os.path.pardir)
+)
+
+from irc_message import parse_line
+
+CORPUS = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "data", "corpus.txt"
+)
+
+
+def legacy_parse_message(message):
+    prefix = ""
+    if message[0] == ":":
+        prefix, message = message[1:].split(" ", 1)
+    if message.find(" :") != -1:
+        message, trail = message.split(" :", 1)
+        args = message.split()
+        args.append(trail)
+    else:
+        args = message.split()
+    command = args.pop(0)
+    return prefix, command, args
+
+
+def legacy_parse_with_nick(line):
+    prefix, command, args = legacy_parse_message(line)
+    return command, prefix[: prefix.find("!")], args
+
+
+def parse_with_nick(line):
+    message = parse_line(line)
+    return message.command, message.nick, message.params
+
+
+def load_corpus(path, include_tags):
+    with open(path, encoding="utf-8") as corpus:
+        lines = [line.rstrip("\r\n") for line in corpus if line.strip()]
+    if not include_tags:
+        lines = [line for line in lines if not line.startswith("@")]
+    return lines
+
+
+def lines_per_second(parse, lines, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for line in lines:
+            parse(line)
+    elapsed = time.perf_counter() - start
+    return len(lines) * rounds / elapsed
+
+
+def best_rates(runs, rounds, repeat):
+    # Interleaved and best-of, so a noisy neighbour slows one sample
+    # rather than one parser.
+    rates = [0] * len(runs)
+    for _ in range(repeat):
+        for index, (parse, lines) in enumerate(runs):
+            rate = lines_per_second(parse, lines, rounds)
+            rates[index] = max(rates[index], rate)
+    return rates
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Message parser benchmark")
+    parser.add_argument("--corpus", default=CORPUS)
+    parser.add_argument("--rounds", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    # The legacy parser cannot handle IRCv3 tags, so compare on the
+    # untagged part of the corpus. With server-time every line carries a
+    # tag, so the same lines are also parsed with one in front.
+    plain = load_corpus(args.corpus, include_tags=False)
+    tagged = [f"@time=2020-01-05T21:41:03.123Z {line}" for line in plain]
+    legacy, current, legacy_nick, current_nick, with_tags = best_rates(
+        [
+            (legacy_parse_message, plain),
+            (parse_line, plain),
+            (legacy_parse_with_nick, plain),
+            (parse_with_nick, plain),
+            (parse_line, tagged),
+        ],
+        args.rounds,
+        args.repeat,
+    )
+    print(f"corpus: {args.corpus} ({len(plain)} untagged lines)")
+    print(f"legacy parse_message: {legacy:12.0f} lines/s")
+    print(f"parse_line:           {current:12.0f} lines/s")
+    print(f"speedup:              {current / legacy:12.2f}x")
+    print(f"legacy parse + nick:  {legacy_nick:12.0f} lines/s")
+    print(f"parse_line + nick:    {current_nick:12.0f} lines/s")
+    print(f"speedup:              {current_nick / legacy_nick:12.2f}x")
+    print(f"parse_line (@time):   {with_tags:12.0f} lines/s")
+    print(f"tagged / untagged:    {with_tags / current:12.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), os.path.pardir)
+)
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from bench_e2e import percentile
+from fake_ircd import FakeIRCServer
+from irc_client import IRC
+from snapshot import BufferState, Snapshot, load_snapshot, save_snapshot
+
+
+def channel_names(channels):
+    return [f"#chan{i}" for i in range(channels)]
+
+
+def nick_names(nicks):
+    return [f"user{i}" for i in range(nicks)]
+
+
+def make_state(path, channels, nicks, lines):
+    now = time.time()
+    buffers = [
+        BufferState(
+            name,
+            True,
+            True,
+            f"Topic of {name}",
+            nick_names(nicks),
+            [
+                (now - lines + i, i % 8, f"user{i % nicks}", f"line {i}")
+                for i in range(lines)
+            ],
+        )
+        for name in channel_names(channels)
+    ]
+    snapshot = Snapshot("127.0.0.1", 6667, False, "bench", "#chan0", buffers)
+    return save_snapshot(path, snapshot)
+
+
+def serve(server, nicks, latency, motd_lines, channels):
+    # Answers registration and JOINs the way a server a round trip away
+    # would; everything the client sees arrives through this.
+    if server.wait_for(lambda line: line.startswith("NICK")) is None:
+        return
+    time.sleep(latency)
+    server.send(
+        [":fake.server 001 bench :Welcome"]
+        + [f":fake.server 372 bench :- motd {i}" for i in range(motd_lines)]
+        + [":fake.server 376 bench :End of /MOTD command."]
+    )
+    pending = set(channels)
+    seen = 0
+    while pending and not server.closed:
+        with server.received_lock:
+            while seen >= len(server.received) and not server.closed:
+                server.received_lock.wait(0.1)
+            lines = server.received[seen:]
+            seen += len(lines)
+        for line in lines:
+            if not line.startswith("JOIN "):
+                continue
+            time.sleep(latency)
+            replies = []
+            for name in line[5:].split(","):
+                pending.discard(name)
+                replies.append(f":bench!u@h JOIN {name}")
+                replies.append(f":fake.server 332 bench {name} :Live topic")
+                names = nick_names(nicks)
+                for start in range(0, len(names), 50):
+                    chunk = " ".join(names[start:start + 50])
+                    replies.append(
+                        f":fake.server 353 bench = {name} :{chunk}"
+                    )
+                replies.append(f":fake.server 366 bench {name} :End")
+            server.send(replies)
+
+
+def useful(irc):
+    buffer = irc.ui.buffers.active
+    return buffer.is_channel and len(buffer.nicknames) > 0
+
+
+def reconciled(irc, channels):
+    for name in channels:
+        buffer = irc.get_channel_buffer(name)
+        if buffer is None or not buffer.joined or buffer.pending_names:
+            return False
+    return True
+
+
+def drive(irc, predicate, timeout):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise TimeoutError("Client did not reach the expected state")
+        irc.loop.run_once(0.001)
+
+
+def measure_start(
+    state_file, channels, nicks, latency, motd_lines, timeout=10
+):
+    server = FakeIRCServer(welcome=False)
+    names = channel_names(channels)
+    script = threading.Thread(
+        target=serve,
+        args=(server, nicks, latency, motd_lines, names),
+        daemon=True,
+    )
+    script.start()
+    start = time.perf_counter()
+    irc = IRC(
+        nick="bench",
+        ui_backend="null",
+        reconnect=False,
+        connect_info=("127.0.0.1", server.port),
+        state_file=state_file,
+    )
+    try:
+        if state_file is None:
+            # A cold client has nothing to show until it has registered
+            # and joined its channels, in one JOIN as an autojoin would.
+            drive(irc, lambda: irc.lines_processed >= motd_lines + 2, timeout)
+            irc.send("JOIN " + ",".join(names))
+        drive(irc, lambda: useful(irc), timeout)
+        first_screen = time.perf_counter() - start
+        lines = len(irc.ui.buffers.active.scrollback)
+        drive(irc, lambda: reconciled(irc, names), timeout)
+        ready = time.perf_counter() - start
+    finally:
+        irc.state_file = None
+        irc.ui.quit()
+        server.close()
+        script.join(1)
+    return first_screen, ready, lines
+
+
+def summarize(times):
+    return {
+        "mean": sum(times) / len(times) * 1000,
+        "p50": percentile(times, 50) * 1000,
+        "p99": percentile(times, 99) * 1000,
+    }
+
+
+def run_bench(
+    runs, channels, nicks, lines, latency, motd_lines=20, directory=None
+):
+    directory = tempfile.mkdtemp(dir=directory)
+    try:
+        path = os.path.join(directory, "state")
+        size = make_state(path, channels, nicks, lines)
+        start = time.perf_counter()
+        load_snapshot(path)
+        load_time = time.perf_counter() - start
+        results = {}
+        for mode, state_file in (("cold", None), ("warm", path)):
+            first, ready, shown = [], [], 0
+            for _ in range(runs):
+                result = measure_start(
+                    state_file, channels, nicks, latency, motd_lines
+                )
+                first.append(result[0])
+                ready.append(result[1])
+                shown = result[2]
+            results[mode] = {
+                "first_screen_ms": summarize(first),
+                "reconciled_ms": summarize(ready),
+                "lines_on_first_screen": shown,
+            }
+    finally:
+        shutil.rmtree(directory)
+    results["snapshot_bytes"] = size
+    results["snapshot_load_ms"] = load_time * 1000
+    results["speedup"] = (
+        results["cold"]["first_screen_ms"]["mean"]
+        / results["warm"]["first_screen_ms"]["mean"]
+    )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Time to first useful screen, cold versus warm start"
+    )
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--channels", type=int, default=20)
+    parser.add_argument("--nicks", type=int, default=500)
+    parser.add_argument("--lines", type=int, default=200)
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0.05,
+        metavar="seconds",
+        help="Simulated server round trip",
+    )
+    parser.add_argument("--directory", help="Scratch directory")
+    parser.add_argument("--output", help="Write JSON results to this file")
+    args = parser.parse_args()
+    result = run_bench(
+        args.runs,
+        args.channels,
+        args.nicks,
+        args.lines,
+        args.latency,
+        directory=args.directory,
+    )
+    text = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w") as output:
+            output.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), os.path.pardir)
+)
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from bench_e2e import percentile
+from fake_ircd import TLS_CERT, FakeIRCServer, make_tls_context
+from irc_client import IRC
+
+
+def drive(irc, predicate, timeout):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise TimeoutError("TLS connection did not come up")
+        if irc.threaded:
+            irc.poll(0.01)
+        else:
+            irc.loop.run_once(0.01)
+
+
+def measure_reconnects(reconnects, resume, threaded=False, timeout=10):
+    server = FakeIRCServer(tls=make_tls_context())
+    irc = IRC(
+        nick="bench",
+        ui_backend="null",
+        threaded=threaded,
+        reconnect=False,
+        tls=True,
+        tls_cafile=TLS_CERT,
+    )
+    times = []
+    resumed = 0
+    # The first connection always needs a full handshake and is only
+    # there to fill the session cache.
+    for attempt in range(reconnects + 1):
+        if not resume:
+            irc.tls_sessions.forget("127.0.0.1", server.port)
+        irc.connect("127.0.0.1", server.port)
+        drive(irc, lambda: irc.lines_processed >= 2 * (attempt + 1), timeout)
+        if attempt:
+            times.append(irc.last_handshake.elapsed)
+            resumed += irc.last_handshake.resumed
+        irc.disconnect()
+    irc.ui.quit()
+    server.close()
+    return {
+        "reconnects": reconnects,
+        "resumed": resumed,
+        "handshake_ms": {
+            "mean": sum(times) / len(times) * 1000,
+            "p50": percentile(times, 50) * 1000,
+            "p99": percentile(times, 99) * 1000,
+        },
+    }
+
+
+def run_bench(reconnects, threaded=False):
+    full = measure_reconnects(reconnects, False, threaded)
+    resumed = measure_reconnects(reconnects, True, threaded)
+    return {
+        "full": full,
+        "resumed": resumed,
+        "speedup": full["handshake_ms"]["mean"]
+        / resumed["handshake_ms"]["mean"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="TLS reconnect handshake benchmark"
+    )
+    parser.add_argument("--reconnects", type=int, default=50)
+    parser.add_argument("--threaded", action="store_true")
+    parser.add_argument("--output", help="Write JSON results to this file")
+    args = parser.parse_args()
+    results = run_bench(args.reconnects, args.threaded)
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as output:
+            output.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+import os
+import selectors
+import socket
+import ssl
+import threading
+import time
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+TLS_CERT = os.path.join(DATA_DIR, "tls_test.crt")
+TLS_KEY = os.path.join(DATA_DIR, "tls_test.key")
+
+
+def make_tls_context():
+    # Self-signed for localhost and 127.0.0.1; clients verify it with
+    # TLS_CERT as their CA file.
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(TLS_CERT, TLS_KEY)
+    return context
+
+
+class FakeIRCServer:
+    def __init__(self, host="127.0.0.1", port=0, welcome=True, tls=None):
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.listener.bind((host, port))
+        self.listener.listen(8)
+        self.address = self.listener.getsockname()
+        self.welcome = welcome
+        self.tls = tls
+        self.client = None
+        self.connections = 0
+        self.connected = threading.Event()
+        self.received = []
+        self.received_times = []
+        self.received_lock = threading.Condition()
+        self.write_times = []
+        self.closed = False
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    @property
+    def port(self):
+        return self.address[1]
+
+    def run(self):
+        while not self.closed:
+            try:
+                client, _ = self.listener.accept()
+            except OSError:
+                return
+            if self.tls is not None:
+                try:
+                    client = self.tls.wrap_socket(client, server_side=True)
+                except OSError:
+                    client.close()
+                    continue
+            self.serve(client)
+
+    def serve(self, client):
+        self.client = client
+        self.connections += 1
+        client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if self.welcome:
+            client.sendall(
+                b":fake.server 001 bench :Welcome\r\n"
+                b":fake.server 376 bench :End of /MOTD command.\r\n"
+            )
+        self.connected.set()
+        pending = b""
+        while not self.closed:
+            try:
+                data = client.recv(65536)
+            except OSError:
+                break
+            if not data:
+                break
+            now = time.perf_counter()
+            *lines, pending = (pending + data).split(b"\n")
+            with self.received_lock:
+                for line in lines:
+                    self.received.append(line.rstrip(b"\r").decode())
+                    self.received_times.append(now)
+                self.received_lock.notify_all()
+
+    def wait_connected(self, timeout=5):
+        return self.connected.wait(timeout)
+
+    def send(self, lines, chunk=64):
+        for start in range(0, len(lines), chunk):
+            batch = lines[start:start + chunk]
+            data = "".join(line + "\r\n" for line in batch).encode()
+            now = time.perf_counter()
+            self.write_times.extend([now] * len(batch))
+            self.client.sendall(data)
+
+    def send_async(self, lines, chunk=64):
+        thread = threading.Thread(target=self.send, args=(lines, chunk))
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def wait_for(self, predicate, timeout=5):
+        deadline = time.monotonic() + timeout
+        with self.received_lock:
+            while True:
+                for line in self.received:
+                    if predicate(line):
+                        return line
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self.received_lock.wait(remaining)
+
+    def drop_client(self):
+        if self.client is not None:
+            try:
+                self.client.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self.client.close()
+
+    def close(self):
+        self.closed = True
+        self.listener.close()
+        self.drop_client()
+
+
+class RelayIRCServer:
+    # Just enough of an ircd to relay channel chat between many clients.
+
+    def __init__(self, host="127.0.0.1", port=0):
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.listener.bind((host, port))
+        self.listener.listen(128)
+        self.listener.setblocking(False)
+        self.address = self.listener.getsockname()
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.listener, selectors.EVENT_READ)
+        self.clients = {}
+        self.channels = {}
+        self.relayed = 0
+        self.closed = False
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    @property
+    def port(self):
+        return self.address[1]
+
+    def run(self):
+        while not self.closed:
+            for key, _ in self.selector.select(0.05):
+                if key.fileobj is self.listener:
+                    self.accept()
+                else:
+                    self.read(key.fileobj)
+
+    def accept(self):
+        try:
+            client, _ = self.listener.accept()
+        except OSError:
+            return
+        self.clients[client] = {"nick": "*", "pending": b""}
+        self.selector.register(client, selectors.EVENT_READ)
+
+    def read(self, client):
+        try:
+            data = client.recv(65536)
+        except OSError:
+            data = b""
+        if not data:
+            self.drop(client)
+            return
+        state = self.clients[client]
+        *lines, state["pending"] = (state["pending"] + data).split(b"\n")
+        for line in lines:
+            self.handle(client, state, line.rstrip(b"\r").decode())
+
+    def handle(self, client, state, line):
+        if line.startswith(":"):
+            line = line.split(" ", 1)[1]
+        command, _, rest = line.partition(" ")
+        source = f":{state['nick']}!u@relay"
+        if command == "NICK":
+            new_nick = rest.lstrip(":")
+            if state["nick"] == "*":
+                state["nick"] = new_nick
+                self.write(client, f":relay 001 {new_nick} :Welcome")
+                return
+            for member in self.peers(client, include_self=True):
+                self.write(member, f"{source} NICK :{new_nick}")
+            state["nick"] = new_nick
+        elif command == "JOIN":
+            for channel in rest.split(","):
+                members = self.channels.setdefault(channel, set())
+                members.add(client)
+                for member in members:
+                    self.write(member, f"{source} JOIN {channel}")
+        elif command == "PRIVMSG":
+            channel = rest.split(" ", 1)[0]
+            for member in self.channels.get(channel, ()):
+                if member is not client:
+                    self.write(member, f"{source} PRIVMSG {rest}")
+                    self.relayed += 1
+        elif command == "PING":
+            self.write(client, f":relay PONG relay {rest}")
+        elif command == "QUIT":
+            self.drop(client)
+
+    def peers(self, client, include_self=False):
+        peers = {client} if include_self else set()
+        for members in self.channels.values():
+            if client in members:
+                peers.update(members)
+        return peers
+
+    def write(self, client, line):
+        try:
+            client.sendall((line + "\r\n").encode())
+        except OSError:
+            pass
+
+    def drop(self, client):
+        if client not in self.clients:
+            return
+        del self.clients[client]
+        for members in self.channels.values():
+            members.discard(client)
+        self.selector.unregister(client)
+        client.close()
+
+    def close(self):
+        self.closed = True
+        self.thread.join()
+        for client in list(self.clients):
+            self.drop(client)
+        self.selector.unregister(self.listener)
+        self.listener.close()
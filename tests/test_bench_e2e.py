@@ -0,0 +1,32 @@
+import unittest
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from bench_e2e import SCENARIOS, percentile, run_scenario
+
+
+class BenchScenarioTests(unittest.TestCase):
+    def test_percentile(self):
+        values = list(range(101))
+        self.assertEqual(50, percentile(values, 50))
+        self.assertEqual(99, percentile(values, 99))
+        self.assertEqual(0, percentile([], 50))
+
+    def test_scenarios_run_against_fake_server(self):
+        for name in SCENARIOS:
+            for threaded in (False, True):
+                with self.subTest(name=name, threaded=threaded):
+                    result = run_scenario(name, 0.005, threaded, 10)
+                    self.assertGreater(result["lines"], 0)
+                    self.assertGreater(result["lines_per_second"], 0)
+                    self.assertIn("p99", result["latency_ms"])
+
+    def test_pong_latency_is_reported(self):
+        result = run_scenario("ping_under_load", 0.02, False, 10)
+        self.assertEqual(2, result["pong_rtt_ms"]["count"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+import unittest
+import sys
+import os
+import socket
+import tempfile
+import time
+
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), os.path.pardir)
+)
+
+from fake_ircd import FakeIRCServer
+from irc_client import IRC
+
+
+class BouncerTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "bouncer.sock")
+        self.server = FakeIRCServer()
+        self.daemon = IRC(
+            nick="bench",
+            ui_backend="null",
+            connect_info=("127.0.0.1", self.server.port),
+        )
+        self.loop = self.daemon.loop
+        self.run_until(lambda: self.daemon.connected)
+        self.server.wait_connected()
+        self.server.send(
+            [
+                ":bench!u@h JOIN #a",
+                ":fake.server 332 bench #a :the topic",
+                ":fake.server 353 bench = #a :bench @op bob",
+                ":fake.server 366 bench #a :End",
+                ":bob!b@h PRIVMSG #a :before attach",
+            ]
+        )
+        self.run_until(lambda: self.daemon.ui.find_buffer(self.daemon, "#a"))
+        self.assertTrue(self.daemon.serve(self.path))
+
+    def tearDown(self):
+        self.daemon.ui.quit()
+        self.server.close()
+        os.rmdir(self.directory)
+
+    def run_until(self, predicate, timeout=5):
+        deadline = time.monotonic() + timeout
+        while not predicate():
+            self.assertLess(time.monotonic(), deadline)
+            self.loop.run_once(0.01)
+
+    def attach(self):
+        irc = IRC(ui_backend="null", loop=self.loop)
+        self.assertTrue(irc.attach(self.path))
+        return irc
+
+    def last_line(self, irc, name="#a"):
+        buffer = irc.ui.find_buffer(irc, name)
+        if buffer is None or not buffer.scrollback.entries:
+            return None
+        return buffer.scrollback.entries[-1][3]
+
+    def test_snapshot_then_live_events(self):
+        ui = self.attach()
+        self.run_until(lambda: self.last_line(ui) == "before attach")
+        buffer = ui.ui.find_buffer(ui, "#a")
+        self.assertEqual("bench", ui.nick)
+        self.assertTrue(buffer.joined)
+        self.assertEqual("the topic", buffer.topic)
+        self.assertEqual(["@op", "bench", "bob"], list(buffer.nicknames))
+        self.server.send([":carol!c@h JOIN #a", ":carol!c@h PRIVMSG #a :hi"])
+        self.run_until(lambda: self.last_line(ui) == "hi")
+        self.assertIn("carol", buffer.nicknames)
+
+    def test_input_goes_upstream_and_to_other_uis(self):
+        first = self.attach()
+        second = self.attach()
+        self.run_until(lambda: self.last_line(second) == "before attach")
+        first.ui.show_buffer(first.ui.find_buffer(first, "#a"))
+        first.keyboard.parse_input("hello from one")
+        self.run_until(lambda: self.last_line(second) == "hello from one")
+        self.assertIsNotNone(
+            self.server.wait_for(lambda l: l == "PRIVMSG #a :hello from one")
+        )
+        self.assertEqual("hello from one", self.last_line(self.daemon))
+        first.ui.quit()
+        self.run_until(lambda: len(self.daemon.bouncer.attachers) == 1)
+        self.assertTrue(self.daemon.connected)
+
+    def test_slow_attacher_is_dropped(self):
+        self.daemon.bouncer.max_pending = 64 * 1024
+        stuck = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stuck.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+        stuck.connect(self.path)
+        ui = self.attach()
+        self.run_until(lambda: len(self.daemon.bouncer.attachers) == 2)
+        lines = [f":bob!b@h PRIVMSG #a :flood {i:05} " + "x" * 80
+                 for i in range(5000)]
+        self.server.send_async(lines)
+        self.run_until(lambda: self.last_line(ui) == lines[-1].split(":")[2])
+        self.assertEqual(1, self.daemon.bouncer.dropped)
+        self.assertEqual(1, len(self.daemon.bouncer.attachers))
+        stuck.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
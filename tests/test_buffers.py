@@ -0,0 +1,82 @@
+import unittest
+import sys
+import os
+
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), os.path.pardir)
+)
+
+from buffers import BufferList, is_channel_name
+from irc_client import IRC
+from rules import RuleSet, parse_rule
+
+
+class BufferListTests(unittest.TestCase):
+    def setUp(self):
+        self.buffers = BufferList()
+        self.first = object()
+        self.second = object()
+
+    def test_status_buffer_is_first_and_active(self):
+        self.assertEqual(1, len(self.buffers))
+        self.assertIs(self.buffers.status, self.buffers.active)
+        self.assertEqual(1, self.buffers.number(self.buffers.status))
+
+    def test_get_is_case_insensitive_per_connection(self):
+        channel = self.buffers.get(self.first, "#Test")
+        self.assertIs(channel, self.buffers.get(self.first, "#test"))
+        self.assertIsNot(channel, self.buffers.get(self.second, "#test"))
+        self.assertTrue(channel.is_channel)
+        self.assertFalse(self.buffers.get(self.first, "bob").is_channel)
+        self.assertEqual(4, len(self.buffers))
+
+    def test_select_marks_read(self):
+        channel = self.buffers.get(self.first, "#test")
+        channel.unread = 3
+        channel.highlights = 1
+        self.assertEqual([(2, channel)], self.buffers.activity())
+        self.assertIs(channel, self.buffers.select(2))
+        self.assertEqual(0, channel.unread)
+        self.assertEqual(0, channel.highlights)
+        self.assertEqual([], self.buffers.activity())
+        self.assertIsNone(self.buffers.select(5))
+
+    def test_remove_active_selects_previous(self):
+        first = self.buffers.get(self.first, "#one")
+        second = self.buffers.get(self.first, "#two")
+        self.buffers.select(3)
+        self.buffers.remove(second)
+        self.assertIs(first, self.buffers.active)
+        self.buffers.remove(self.buffers.status)
+        self.assertEqual(2, len(self.buffers))
+
+    def test_is_channel_name(self):
+        self.assertTrue(is_channel_name("#python"))
+        self.assertTrue(is_channel_name("&local"))
+        self.assertFalse(is_channel_name("nick"))
+        self.assertFalse(is_channel_name(""))
+
+
+class QueryBufferTests(unittest.TestCase):
+    def setUp(self):
+        self.irc = IRC(nick="me", ui_backend="null")
+        self.irc.ui.rules = RuleSet([parse_rule("drop text spam")])
+
+    def tearDown(self):
+        self.irc.ui.quit()
+
+    def test_only_shown_lines_open_query_buffers(self):
+        for i in range(50):
+            self.irc.process_line(f":n{i}!u@h PRIVMSG me :\x01VERSION\x01")
+            self.irc.process_line(f":s{i}!u@h PRIVMSG me :buy spam")
+        self.assertEqual(1, len(self.irc.ui.buffers))
+        self.irc.process_line(":bob!u@h PRIVMSG me :hi")
+        self.irc.process_line(":eve!u@h PRIVMSG me :\x01ACTION waves\x01")
+        buffer = self.irc.ui.find_buffer(self.irc, "bob")
+        self.assertEqual("hi", buffer.scrollback.entries[-1][3])
+        self.assertIsNotNone(self.irc.ui.find_buffer(self.irc, "eve"))
+        self.assertEqual(3, len(self.irc.ui.buffers))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,160 @@
+import unittest
+from unittest import mock
+import sys
+import os
+import shutil
+import tempfile
+import re
+import threading
+import time
+
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), os.path.pardir)
+)
+
+from chat_log import ChatLogger, parse_log_name, safe_name, search_file
+from irc_client import IRC, KeyboardHandler
+
+
+class ChatLoggerTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.logger = ChatLogger(
+            self.directory, flush_interval=60, max_file_bytes=200, fsync=False
+        )
+
+    def tearDown(self):
+        self.logger.close()
+        shutil.rmtree(self.directory)
+
+    def read_logs(self, *path):
+        directory = os.path.join(self.directory, *path)
+        return sorted(os.listdir(directory))
+
+    def test_batches_until_flush(self):
+        self.logger.log("irc.example", "#Test", "hello", "bob")
+        time.sleep(0.05)
+        self.assertEqual(0, self.logger.lines_written)
+        self.logger.flush()
+        self.assertEqual(1, self.logger.lines_written)
+        self.assertEqual(1, self.logger.flushes)
+        (name,) = self.read_logs("irc.example", "#test")
+        path = os.path.join(self.directory, "irc.example", "#test", name)
+        with open(path) as log:
+            self.assertTrue(log.read().endswith(" <bob> hello\n"))
+
+    def test_flushes_on_size(self):
+        logger = ChatLogger(
+            self.directory, flush_bytes=100, flush_interval=60, fsync=False
+        )
+        for i in range(10):
+            logger.log("srv", "#size", f"message {i}", "bob")
+        deadline = time.time() + 2
+        while logger.flushes == 0 and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertGreater(logger.flushes, 0)
+        logger.close()
+        self.assertEqual(10, logger.lines_written)
+
+    def test_rotates_by_size_and_day(self):
+        day = time.mktime((2024, 5, 1, 12, 0, 0, 0, 0, -1))
+        for i in range(4):
+            self.logger.log("srv", "#chan", "x" * 40, "bob", day)
+            self.logger.flush()
+        self.logger.log("srv", "#chan", "next day", "bob", day + 86400)
+        self.logger.flush()
+        self.assertEqual(
+            ["2024-05-01.1.log", "2024-05-01.log", "2024-05-02.log"],
+            self.read_logs("srv", "#chan"),
+        )
+        self.assertEqual(1, self.logger.rotations)
+
+    def test_search_is_newest_first(self):
+        day = time.mktime((2024, 5, 1, 12, 0, 0, 0, 0, -1))
+        self.logger.log("srv", "#a", "old match", "bob", day)
+        self.logger.log("srv", "#b", "other", "bob", day)
+        self.logger.log("srv", "#a", "new MATCH", "bob", day + 86400)
+        self.logger.log("srv", "#a", "newest match", "bob", day + 86401)
+        results = list(self.logger.search("match"))
+        self.assertEqual(["#a"] * 3, [channel for channel, line in results])
+        self.assertEqual(
+            ["newest match", "new MATCH", "old match"],
+            [line.split("> ", 1)[1] for channel, line in results],
+        )
+        self.assertEqual([], list(self.logger.search("other", None, "#a")))
+        self.assertEqual(1, len(list(self.logger.search("other", "srv"))))
+
+    def test_search_file_without_trailing_newline(self):
+        path = os.path.join(self.directory, "2024-05-01.log")
+        with open(path, "wb") as log:
+            log.write(b"first\nsecond\nthird")
+        pattern = re.compile(b"^(first|third)$", re.MULTILINE)
+        self.assertEqual(
+            [b"third", b"first"], list(search_file(pattern, path))
+        )
+
+    def test_search_flushes_without_fsync(self):
+        logger = ChatLogger(self.directory, flush_interval=60, fsync=True)
+        self.addCleanup(logger.close)
+        with mock.patch("os.fsync") as fsync:
+            logger.log("irc.example", "#test", "hello", "bob")
+            self.assertEqual(1, len(list(logger.search("hello"))))
+            fsync.assert_not_called()
+            logger.log("irc.example", "#test", "again", "bob")
+            logger.flush()
+            self.assertEqual(1, fsync.call_count)
+
+    def test_write_errors_keep_the_writer_alive(self):
+        blocker = os.path.join(self.directory, "file")
+        open(blocker, "w").close()
+        logger = ChatLogger(os.path.join(blocker, "logs"), fsync=False)
+        self.addCleanup(logger.close)
+        for text in ("one", "two"):
+            logger.log("irc.example", "#test", text, "bob")
+            self.assertTrue(logger.flush(timeout=5))
+        self.assertTrue(logger.thread.is_alive())
+        self.assertEqual(2, logger.write_errors)
+        self.assertIsInstance(logger.last_error, OSError)
+        self.assertEqual([], list(logger.search("one")))
+        logger.close()
+        self.assertFalse(logger.flush())
+
+    def test_search_command_with_bad_log_dir(self):
+        blocker = os.path.join(self.directory, "file")
+        open(blocker, "w").close()
+        irc = IRC(nick="bot", ui_backend="null", log_dir=blocker)
+        self.addCleanup(irc.ui.quit)
+        irc.process_line(":bot!u@h JOIN #test")
+        irc.process_line(":bob!b@h PRIVMSG #test :hello")
+        keyboard = KeyboardHandler(irc)
+        search = threading.Thread(
+            target=keyboard.parse_input, args=("/search hello",), daemon=True
+        )
+        search.start()
+        search.join(5)
+        self.assertFalse(search.is_alive())
+        self.assertTrue(irc.ui.logger.thread.is_alive())
+        keyboard.parse_input("/search hello")
+        entries = irc.ui.buffers.active.scrollback.entries
+        status = [entry[3] for entry in entries]
+        self.assertTrue(
+            any("Chat log cannot be written" in line for line in status)
+        )
+
+    def test_safe_name(self):
+        self.assertEqual("#test", safe_name("#Test"))
+        self.assertEqual("a_b", safe_name("a/b"))
+        self.assertEqual("_", safe_name("."))
+        self.assertEqual("_", safe_name(".."))
+        self.assertEqual("_hidden", safe_name("...hidden"))
+        self.assertEqual("_", safe_name(""))
+
+    def test_parse_log_name(self):
+        self.assertEqual(("2024-05-01", 0), parse_log_name("2024-05-01.log"))
+        self.assertEqual(("2024-05-01", 3), parse_log_name("2024-05-01.3.log"))
+        self.assertIsNone(parse_log_name("notes.txt"))
+        self.assertIsNone(parse_log_name("2024-05-01.x.log"))
+
+
+if __name__ == "__main__":
+    unittest.main()
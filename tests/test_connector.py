@@ -0,0 +1,129 @@
+import unittest
+import sys
+import os
+import socket
+import time
+
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), os.path.pardir)
+)
+
+from connector import Connector, backoff_delay, interleave_families
+from event_loop import EventLoop
+from fake_ircd import FakeIRCServer
+from irc_client import IRC
+
+
+def address(family, host, port):
+    return (family, socket.SOCK_STREAM, 0, "", (host, port))
+
+
+def closed_port():
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+class ConnectorTests(unittest.TestCase):
+    def setUp(self):
+        self.loop = EventLoop()
+        self.connected = []
+        self.failed = []
+
+    def run_until_done(self, timeout=5):
+        deadline = time.monotonic() + timeout
+        while not (self.connected or self.failed):
+            self.assertLess(time.monotonic(), deadline)
+            self.loop.run_once(0.01)
+
+    def make_connector(self, port, **kwargs):
+        return Connector(
+            self.loop,
+            "127.0.0.1",
+            port,
+            self.connected.append,
+            self.failed.append,
+            **kwargs,
+        )
+
+    def test_interleave_families(self):
+        v4 = [address(socket.AF_INET, f"10.0.0.{i}", 1) for i in range(3)]
+        v6 = [address(socket.AF_INET6, f"::{i}", 1) for i in range(2)]
+        self.assertEqual(
+            [v6[0], v4[0], v6[1], v4[1], v4[2]],
+            interleave_families(v6 + v4),
+        )
+
+    def test_backoff_is_capped_and_jittered(self):
+        for attempt in range(10):
+            delay = backoff_delay(attempt, 1, 8)
+            expected = min(8, 2 ** attempt)
+            self.assertTrue(expected / 2 <= delay <= expected)
+
+    def test_falls_through_to_next_address(self):
+        listener = socket.socket()
+        listener.bind(("127.0.0.1", 0))
+        listener.listen(1)
+        port = listener.getsockname()[1]
+        connector = self.make_connector(port, stagger=5)
+        connector.start(
+            [
+                address(socket.AF_INET, "127.0.0.1", closed_port()),
+                address(socket.AF_INET, "127.0.0.1", port),
+            ]
+        )
+        self.run_until_done()
+        self.assertEqual([], self.failed)
+        self.assertEqual(port, self.connected[0].getpeername()[1])
+        self.connected[0].close()
+        listener.close()
+
+    def test_refused(self):
+        self.make_connector(closed_port()).start()
+        self.run_until_done()
+        self.assertEqual([], self.connected)
+        self.assertIsInstance(self.failed[0], ConnectionRefusedError)
+
+
+class ReconnectTests(unittest.TestCase):
+    def check_reconnect(self, threaded):
+        server = FakeIRCServer()
+        irc = IRC(
+            nick="bench",
+            threaded=threaded,
+            ui_backend="null",
+            connect_info=("127.0.0.1", server.port),
+        )
+        irc.reconnect_delay = 0.01
+
+        def drive_until(predicate, timeout=5):
+            deadline = time.monotonic() + timeout
+            while not predicate():
+                self.assertLess(time.monotonic(), deadline)
+                if threaded:
+                    irc.poll(0.01)
+                else:
+                    irc.loop.run_once(0.01)
+
+        drive_until(lambda: irc.connected)
+        server.wait_connected()
+        for line in [":bench!u@h JOIN #a", ":bench!u@h JOIN #b"]:
+            irc.process_line(line)
+        server.drop_client()
+        drive_until(lambda: "JOIN #a,#b" in server.received)
+        self.assertEqual(2, server.connections)
+        self.assertEqual("127.0.0.1", irc.server)
+        irc.disconnect()
+        server.close()
+
+    def test_reconnects_and_rejoins(self):
+        self.check_reconnect(threaded=False)
+
+    def test_reconnects_and_rejoins_threaded(self):
+        self.check_reconnect(threaded=True)
+
+
+if __name__ == "__main__":
+    unittest.main()
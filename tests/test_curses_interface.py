@@ -0,0 +1,88 @@
+import unittest
+from unittest import mock
+import curses
+import time
+import sys
+import os
+
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), os.path.pardir)
+)
+
+from curses_interface import CursesInterface
+from event_loop import EventLoop
+from metrics import Histogram
+
+
+def make_interface(max_fps):
+    # Everything render() touches, without a terminal behind it.
+    ui = CursesInterface.__new__(CursesInterface)
+    ui.irc = mock.Mock()
+    ui.irc.loop = EventLoop()
+    ui.debug_enabled = False
+    ui.batch_depth = 0
+    ui.update_pending = False
+    ui.max_fps = max_fps
+    ui.last_frame = 0
+    ui.frame_timer = None
+    ui.dirty = {"chat"}
+    ui.resize_pending = False
+    ui.frames_rendered = 0
+    ui.frames_skipped = 0
+    ui.curses_time = 0
+    ui.render_time = Histogram()
+    ui.rendering = False
+    ui.screen = mock.Mock()
+    ui.chat_window = mock.Mock()
+    ui.nick_window = mock.Mock()
+    ui.input_window = mock.Mock()
+    return ui
+
+
+class RenderSchedulerTests(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(curses, "doupdate")
+        self.doupdate = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_frames_are_capped(self):
+        ui = make_interface(max_fps=20)
+        ui.update()
+        self.assertEqual(1, self.doupdate.call_count)
+        ui.update()
+        ui.update()
+        self.assertIsNotNone(ui.frame_timer)
+        self.assertEqual(1, self.doupdate.call_count)
+        deadline = time.monotonic() + 1
+        while ui.frame_timer is not None and time.monotonic() < deadline:
+            ui.irc.loop.run_once(0.1)
+        self.assertEqual(2, self.doupdate.call_count)
+        stats = ui.get_render_stats()
+        self.assertEqual(2, stats["frames_rendered"])
+        self.assertEqual(2, stats["frames_skipped"])
+        self.assertEqual(2, stats["render"]["count"])
+        self.assertGreater(stats["curses_time"], 0)
+
+    def test_batch_renders_once(self):
+        ui = make_interface(max_fps=0)
+        with ui.batch():
+            for _ in range(10):
+                ui.update()
+            self.assertEqual(0, self.doupdate.call_count)
+        self.assertEqual(1, self.doupdate.call_count)
+        self.assertFalse(ui.update_pending)
+
+    def test_failed_render_does_not_block_updates(self):
+        ui = make_interface(max_fps=0)
+        self.doupdate.side_effect = curses.error("doupdate() failed")
+        with self.assertRaises(curses.error):
+            ui.update()
+        self.assertFalse(ui.rendering)
+        self.doupdate.side_effect = None
+        ui.update()
+        self.assertEqual(2, self.doupdate.call_count)
+        self.assertEqual(1, ui.get_render_stats()["frames_rendered"])
+
+
+if __name__ == "__main__":
+    unittest.main()
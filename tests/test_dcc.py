@@ -0,0 +1,252 @@
+import unittest
+import sys
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), os.path.pardir)
+)
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from bench_dcc import file_digest, make_file, offer, run_transfer, wait
+from dcc import (
+    DccError,
+    DccManager,
+    RateLimiter,
+    decode_address,
+    encode_address,
+    safe_filename,
+    split_dcc,
+)
+from irc_client import IRC
+
+
+class ParserTests(unittest.TestCase):
+    def test_split_dcc(self):
+        self.assertEqual(
+            ("SEND", "build.log", ["2130706433", "5000", "12"]),
+            split_dcc("SEND build.log 2130706433 5000 12"),
+        )
+        self.assertEqual(
+            ("RESUME", "core dump", ["5000", "6"]),
+            split_dcc('resume "core dump" 5000 6'),
+        )
+        with self.assertRaises(DccError):
+            split_dcc('SEND "open 1 2 3')
+
+    def test_addresses(self):
+        self.assertEqual("2130706433", encode_address("127.0.0.1"))
+        self.assertEqual("127.0.0.1", decode_address("2130706433"))
+        self.assertEqual("::1", decode_address("::1"))
+
+    def test_safe_filename(self):
+        self.assertEqual("passwd", safe_filename("../../etc/passwd"))
+        self.assertEqual("evil.txt", safe_filename("..\\evil.txt"))
+        self.assertEqual("dcc-file", safe_filename(".."))
+
+
+class TransferTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.source = os.path.join(self.directory, "source.bin")
+        self.received = os.path.join(self.directory, "received")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def check(self, result):
+        self.assertEqual("done", result["sender"])
+        self.assertEqual("done", result["receiver"])
+        self.assertEqual(file_digest(self.source), file_digest(result["path"]))
+
+    def test_transfer(self):
+        make_file(self.source, 3 * 1024 * 1024 + 17)
+        self.check(run_transfer(self.source, self.received, timeout=10))
+
+    def test_resume(self):
+        make_file(self.source, 8 * 1024 * 1024)
+        result = run_transfer(self.source, self.received, 0.5, timeout=10)
+        self.check(result)
+        self.assertGreater(result["resumed_from"], 0)
+
+    def test_empty_file(self):
+        make_file(self.source, 0)
+        self.check(run_transfer(self.source, self.received, timeout=10))
+
+    def test_existing_file_is_not_overwritten(self):
+        make_file(self.source, 1000)
+        os.makedirs(self.received)
+        existing = os.path.join(self.received, "source.bin")
+        make_file(existing, 2000)
+        result = run_transfer(self.source, self.received, timeout=10)
+        self.check(result)
+        self.assertEqual(existing + ".1", result["path"])
+        self.assertEqual(2000, os.path.getsize(existing))
+
+    def test_smaller_existing_file_is_not_resumed(self):
+        make_file(self.source, 1000)
+        os.makedirs(self.received)
+        existing = os.path.join(self.received, "source.bin")
+        with open(existing, "wb") as output:
+            output.write(b"notes")
+        result = run_transfer(self.source, self.received, timeout=10)
+        self.check(result)
+        self.assertEqual(existing + ".1", result["path"])
+        with open(existing, "rb") as source:
+            self.assertEqual(b"notes", source.read())
+        self.assertFalse(os.path.exists(result["path"] + ".part"))
+
+    def test_transfer_rate_cap(self):
+        make_file(self.source, 400 * 1024)
+        result = run_transfer(
+            self.source, self.received, transfer_rate=1024 * 1024, timeout=10
+        )
+        self.check(result)
+        self.assertGreater(result["seconds"], 0.2)
+
+    def test_global_cap_is_shared(self):
+        make_file(self.source, 200 * 1024)
+        sender = DccManager(rate=1024 * 1024)
+        receiver = DccManager(self.received)
+        pairs = [offer(sender, receiver, self.source) for _ in range(2)]
+        start = time.monotonic()
+        for _, incoming in pairs:
+            receiver.get(incoming.number)
+        for outgoing, incoming in pairs:
+            wait(incoming, 10)
+            wait(outgoing, 10)
+            self.assertEqual("done", incoming.state)
+        self.assertGreater(time.monotonic() - start, 0.2)
+
+    def test_cancel(self):
+        make_file(self.source, 1024 * 1024)
+        sender = DccManager(transfer_rate=256 * 1024)
+        receiver = DccManager(self.received)
+        outgoing, incoming = offer(sender, receiver, self.source)
+        receiver.get(incoming.number)
+        wait(incoming, 10, stop_at=1)
+        wait(outgoing, 10)
+        self.assertEqual("cancelled", incoming.state)
+        self.assertEqual("failed", outgoing.state)
+        self.assertEqual(incoming.position, os.path.getsize(incoming.path))
+
+    def test_rate_limiter(self):
+        now = [0.0]
+        limiter = RateLimiter(100000, clock=lambda: now[0])
+        cancelled = threading.Event()
+        self.assertEqual(10000, limiter.capacity())
+        self.assertEqual(10000, limiter.acquire(10000, cancelled))
+        cancelled.set()
+        self.assertEqual(0, limiter.acquire(10000, cancelled))
+
+
+class CtcpTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.source = os.path.join(self.directory, "build log.txt")
+        make_file(self.source, 200 * 1024)
+        self.alice = self.client("alice")
+        self.bob = self.client("bob")
+        self.bob.ui.dcc.directory = os.path.join(self.directory, "bob")
+
+    def tearDown(self):
+        for irc in (self.alice, self.bob):
+            irc.connected = False
+            irc.ui.quit()
+        shutil.rmtree(self.directory)
+
+    def client(self, nick):
+        irc = IRC(nick=nick, ui_backend="null", dcc_address="127.0.0.1")
+        irc.connected = True
+        irc.sent = []
+        irc.send = lambda line, urgent=False: irc.sent.append(line)
+        return irc
+
+    def deliver(self, sender, receiver):
+        for line in sender.sent:
+            prefix = f":{sender.nick}!u@h "
+            receiver.process_line(prefix + line)
+        sender.sent.clear()
+
+    def status(self, irc):
+        entries = irc.ui.buffers.status.scrollback.entries
+        return [entry[3] for entry in entries]
+
+    def test_offer_accept_and_progress(self):
+        self.alice.keyboard.parse_input(f"/dcc send bob {self.source}")
+        self.assertTrue(self.alice.sent[0].startswith("PRIVMSG bob :\x01DCC"))
+        self.assertIn('"build log.txt"', self.alice.sent[0])
+        self.deliver(self.alice, self.bob)
+        self.assertIn(
+            "== alice offers build log.txt (200.0 KiB), "
+            "/dcc get 1 to accept",
+            self.status(self.bob),
+        )
+        self.bob.keyboard.parse_input("/dcc get 1")
+        transfer = self.bob.ui.dcc.transfers[1]
+        wait(transfer, 10)
+        wait(self.alice.ui.dcc.transfers[1], 10)
+        self.bob.ui.poll_dcc()
+        self.assertTrue(self.status(self.bob)[-1].startswith("== DCC 1: get"))
+        self.assertIn("done 100%", self.status(self.bob)[-1])
+        self.assertEqual(file_digest(self.source), file_digest(transfer.path))
+        self.bob.keyboard.parse_input("/dcc")
+        self.assertIn("done 100%", self.status(self.bob)[-1])
+
+    def test_resume_over_ctcp(self):
+        os.makedirs(self.bob.ui.dcc.directory)
+        final = os.path.join(self.bob.ui.dcc.directory, "build log.txt")
+        partial = final + ".part"
+        with open(self.source, "rb") as source:
+            data = source.read(50000)
+        with open(partial, "wb") as output:
+            output.write(data)
+        self.alice.dcc_send("bob", self.source)
+        self.deliver(self.alice, self.bob)
+        self.bob.keyboard.parse_input("/dcc get 1")
+        self.assertIn("DCC RESUME", self.bob.sent[0])
+        self.deliver(self.bob, self.alice)
+        self.assertIn("DCC ACCEPT", self.alice.sent[0])
+        self.deliver(self.alice, self.bob)
+        transfer = self.bob.ui.dcc.transfers[1]
+        wait(transfer, 10)
+        self.assertEqual(50000, transfer.offset)
+        self.assertEqual(final, transfer.path)
+        self.assertEqual(file_digest(self.source), file_digest(final))
+        self.assertFalse(os.path.exists(partial))
+
+    def test_accept_must_match_requested_position(self):
+        os.makedirs(self.bob.ui.dcc.directory)
+        partial = os.path.join(self.bob.ui.dcc.directory, "build log.txt")
+        partial += ".part"
+        with open(partial, "wb") as output:
+            output.write(b"x" * 18)
+        self.alice.dcc_send("bob", self.source)
+        self.deliver(self.alice, self.bob)
+        self.bob.keyboard.parse_input("/dcc get 1")
+        self.assertIn("DCC RESUME", self.bob.sent[0])
+        port = self.alice.ui.dcc.transfers[1].port
+        self.bob.process_line(
+            f':alice!u@h PRIVMSG bob :\x01DCC ACCEPT "build log.txt" '
+            f"{port} 0\x01"
+        )
+        self.assertIn("Bad resume position 0", self.status(self.bob)[-1])
+        self.assertFalse(self.bob.ui.dcc.transfers[1].is_alive())
+        with open(partial, "rb") as source:
+            self.assertEqual(b"x" * 18, source.read())
+
+    def test_bad_offer(self):
+        self.bob.process_line(
+            ":alice!u@h PRIVMSG bob :\x01DCC SEND x 2130706433 0 5 7\x01"
+        )
+        self.assertEqual(
+            "== DCC from alice: Passive DCC is not supported",
+            self.status(self.bob)[-1],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
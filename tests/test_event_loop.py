@@ -0,0 +1,95 @@
+import unittest
+import os
+import signal
+import socket
+import sys
+import time
+
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), os.path.pardir)
+)
+
+from event_loop import EventLoop
+
+
+class EventLoopTests(unittest.TestCase):
+    def setUp(self):
+        self.loop = EventLoop()
+        self.addCleanup(self.loop.selector.close)
+        self.calls = []
+
+    def run_until(self, predicate, timeout=1):
+        deadline = time.monotonic() + timeout
+        while not predicate() and time.monotonic() < deadline:
+            self.loop.run_once(0.05)
+
+    def test_timers_run_in_deadline_order(self):
+        self.loop.call_later(0.02, self.calls.append, "late")
+        self.loop.call_later(0, self.calls.append, "first")
+        self.loop.call_later(0, self.calls.append, "second")
+        self.loop.run_once(0)
+        self.assertEqual(["first", "second"], self.calls)
+        self.run_until(lambda: len(self.calls) == 3)
+        self.assertEqual(["first", "second", "late"], self.calls)
+        self.assertIsNone(self.loop.next_timeout())
+
+    def test_cancelled_timer_does_not_run(self):
+        timer = self.loop.call_later(0, self.calls.append, "cancelled")
+        self.loop.call_later(0.01, self.calls.append, "kept")
+        timer.cancel()
+        self.run_until(lambda: self.calls)
+        self.assertEqual(["kept"], self.calls)
+        later = self.loop.call_later(60, self.calls.append, "never")
+        self.assertGreater(self.loop.next_timeout(), 1)
+        later.cancel()
+        self.assertIsNone(self.loop.next_timeout())
+
+    def test_reader_and_writer_callbacks(self):
+        local, remote = socket.socketpair()
+        self.addCleanup(local.close)
+        self.addCleanup(remote.close)
+        self.loop.add_writer(local, lambda sock: self.calls.append("write"))
+        self.assertTrue(self.loop.has_writer(local))
+        self.loop.run_once(0)
+        self.assertEqual(["write"], self.calls)
+        self.loop.remove_writer(local)
+        self.assertFalse(self.loop.has_writer(local))
+
+        self.loop.add_reader(
+            local, lambda sock: self.calls.append(sock.recv(16))
+        )
+        self.loop.run_once(0)
+        self.assertEqual(["write"], self.calls)
+        remote.send(b"ping")
+        self.loop.run_once(1)
+        self.assertEqual(["write", b"ping"], self.calls)
+        self.loop.remove_reader(local)
+        self.assertFalse(self.loop.has_reader(local))
+        self.assertEqual({}, dict(self.loop.selector.get_map()))
+
+    def test_run_forever_stops(self):
+        self.loop.call_later(0, self.loop.stop)
+        self.loop.call_later(0.01, self.calls.append, "after")
+        self.loop.run_forever()
+        self.assertFalse(self.loop.running)
+        self.assertEqual([], self.calls)
+
+    @unittest.skipUnless(hasattr(signal, "SIGUSR1"), "needs SIGUSR1")
+    def test_signal_wakes_the_loop(self):
+        previous = signal.getsignal(signal.SIGUSR1)
+        self.addCleanup(signal.signal, signal.SIGUSR1, previous)
+        self.addCleanup(signal.set_wakeup_fd, -1)
+        self.loop.add_signal_handler(
+            signal.SIGUSR1, lambda: self.calls.append("signal")
+        )
+        self.addCleanup(self.loop.wakeup_reader.close)
+        self.addCleanup(self.loop.wakeup_writer.close)
+        os.kill(os.getpid(), signal.SIGUSR1)
+        start = time.monotonic()
+        self.loop.run_once(5)
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertEqual(["signal"], self.calls)
+
+
+if __name__ == "__main__":
+    unittest.main()
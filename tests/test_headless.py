@@ -0,0 +1,207 @@
+import unittest
+import io
+import sys
+import os
+from contextlib import contextmanager
+
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), os.path.pardir)
+)
+
+from irc_client import IRC
+from ui_backend import NullInterface, StdoutInterface
+
+
+class RedrawCounter(NullInterface):
+    def __init__(self, irc, max_fps=30, buffer=None):
+        super().__init__(irc, max_fps, buffer)
+        self.redraws = 0
+        self.depth = 0
+        self.pending = False
+
+    @contextmanager
+    def batch(self):
+        self.depth += 1
+        try:
+            yield
+        finally:
+            self.depth -= 1
+            if self.depth == 0 and self.pending:
+                self.pending = False
+                self.redraws += 1
+
+    def update(self):
+        if self.depth:
+            self.pending = True
+        else:
+            self.redraws += 1
+
+    def add_message(self, buffer):
+        super().add_message(buffer)
+        self.update()
+
+
+class HeadlessTests(unittest.TestCase):
+    def setUp(self):
+        self.irc = IRC(nick="bot", ui_backend="null")
+        self.ui = self.irc.ui
+
+    def feed(self, *lines):
+        for line in lines:
+            self.irc.process_line(line)
+
+    def status_lines(self):
+        entries = self.ui.buffers.status.scrollback.entries
+        return [entry[3] for entry in entries]
+
+    def test_uses_null_backend(self):
+        self.assertIsInstance(self.ui.backend, NullInterface)
+        self.assertEqual(1, len(self.ui.buffers))
+
+    def test_join_and_names(self):
+        self.feed(
+            ":bot!u@h JOIN #test",
+            ":srv 353 bot = #test :bot @op bob",
+            ":srv 366 bot #test :End of /NAMES list",
+        )
+        buffer = self.ui.find_buffer(self.irc, "#test")
+        self.assertIs(buffer, self.ui.get_active_buffer())
+        self.assertTrue(buffer.joined)
+        self.assertEqual(["@op", "bob", "bot"], list(buffer.nicknames))
+
+    def test_inactive_buffer_counts_unread(self):
+        self.feed(":bot!u@h JOIN #one", ":bot!u@h JOIN #two")
+        one = self.ui.find_buffer(self.irc, "#one")
+        self.feed(
+            ":bob!b@h PRIVMSG #one :hello",
+            ":bob!b@h PRIVMSG #one :bot: ping",
+        )
+        self.assertEqual(2, one.unread)
+        self.assertEqual(1, one.highlights)
+        self.assertEqual(3, len(one.scrollback))
+        self.ui.switch_buffer(2)
+        self.assertIs(one, self.ui.get_active_buffer())
+        self.assertEqual(0, one.unread)
+
+    def test_nick_change_renames_everywhere(self):
+        self.feed(
+            ":bot!u@h JOIN #test",
+            ":srv 353 bot = #test :bot bob",
+            ":srv 366 bot #test :End of /NAMES list",
+            ":bob!b@h PRIVMSG bot :hi",
+            ":bob!b@h NICK robert",
+        )
+        channel = self.ui.find_buffer(self.irc, "#test")
+        self.assertIn("robert", channel.nicknames)
+        self.assertNotIn("bob", channel.nicknames)
+        self.assertIsNotNone(self.ui.find_buffer(self.irc, "robert"))
+
+    def test_register_and_unregister_handler(self):
+        seen = []
+
+        def on_wallops(message):
+            seen.append(message.params[-1])
+
+        self.irc.register_handler("wallops", on_wallops)
+        self.feed(":srv WALLOPS :first")
+        self.irc.unregister_handler("WALLOPS", on_wallops)
+        self.feed(":srv WALLOPS :second")
+        self.assertEqual(["first"], seen)
+        self.assertNotIn("WALLOPS", self.irc.handlers)
+        self.irc.unregister_handler("WALLOPS", on_wallops)
+
+    def test_handler_timing(self):
+        self.irc.set_handler_timing(True)
+        self.feed(":srv PING :a", ":srv PING :b")
+        self.irc.set_handler_timing(False)
+        self.feed(":srv PING :c")
+        ((name, calls, total),) = self.irc.get_handler_stats()
+        self.assertEqual(("PING on_ping", 2), (name, calls))
+        self.assertGreaterEqual(total, 0)
+        self.irc.reset_handler_stats()
+        self.assertEqual([], self.irc.get_handler_stats())
+
+    def test_handler_errors_are_contained(self):
+        seen = []
+
+        def broken(message):
+            raise ValueError("boom")
+
+        self.irc.register_handler("WALLOPS", broken)
+        self.irc.register_handler("WALLOPS", lambda message: seen.append(1))
+        for timing in (False, True):
+            self.irc.set_handler_timing(timing)
+            self.feed(":srv WALLOPS :hi")
+        self.assertEqual([1, 1], seen)
+        errors = [
+            line
+            for line in self.status_lines()
+            if "Error in WALLOPS handler broken" in line
+        ]
+        self.assertEqual(2, len(errors))
+
+    def test_malformed_privmsg_is_ignored(self):
+        self.feed(
+            ":bob!b@h PRIVMSG bot",
+            ":bob!b@h PRIVMSG bot :\x01\x01",
+            ":bob!b@h PRIVMSG bot :\x01 \x01",
+        )
+        self.assertEqual(1, len(self.ui.buffers))
+        self.assertFalse(
+            any("Error in" in line for line in self.status_lines())
+        )
+
+
+class PollTests(unittest.TestCase):
+    def client(self, **options):
+        irc = IRC(nick="bot", ui_backend="null", **options)
+        irc.process_line(":bot!u@h JOIN #test")
+        irc.ui.backend = RedrawCounter(irc, buffer=irc.ui.buffers.active)
+        self.addCleanup(irc.ui.quit)
+        return irc
+
+    def queue_lines(self, irc, count):
+        for i in range(count):
+            irc.rx_queue.put(f":bob!b@h PRIVMSG #test :line {i}")
+
+    def test_queued_lines_share_one_redraw(self):
+        irc = self.client()
+        self.queue_lines(irc, 5)
+        self.assertEqual(5, irc.poll(0))
+        self.assertEqual(5, irc.ui.backend.lines)
+        self.assertEqual(1, irc.ui.backend.redraws)
+        self.assertEqual((5, 0), irc.get_poll_stats())
+        self.assertEqual(0, irc.poll(0))
+        self.assertEqual((0, 0), irc.get_poll_stats())
+
+    def test_budget_limits_one_poll(self):
+        irc = self.client(poll_budget=3)
+        self.queue_lines(irc, 7)
+        self.assertEqual(3, irc.poll(0))
+        self.assertEqual((3, 4), irc.get_poll_stats())
+        self.assertEqual(1, irc.ui.backend.redraws)
+        self.assertEqual(3, irc.poll(0))
+        self.assertEqual(1, irc.poll(0))
+        self.assertEqual((1, 0), irc.get_poll_stats())
+        self.assertEqual(7, irc.ui.backend.lines)
+        self.assertEqual(3, irc.ui.backend.redraws)
+
+
+class StdoutInterfaceTests(unittest.TestCase):
+    def test_prints_every_buffer(self):
+        output = io.StringIO()
+        irc = IRC(nick="bot", ui_backend="null")
+        irc.ui.backend = StdoutInterface(
+            irc, buffer=irc.ui.buffers.active, stdout=output
+        )
+        irc.process_line(":bot!u@h JOIN #test")
+        irc.process_line(":bob!b@h PRIVMSG bot :private")
+        lines = output.getvalue().splitlines()
+        self.assertEqual(2, len(lines))
+        self.assertTrue(lines[0].startswith("#test "))
+        self.assertTrue(lines[1].startswith("bob "))
+        self.assertTrue(lines[1].endswith("<bob> private"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,139 @@
+import unittest
+import sys
+import os
+from contextlib import contextmanager
+
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), os.path.pardir)
+)
+
+from irc_client import IRC
+from ircv3 import parse_caps, parse_server_time
+
+NOON = 1714564800.0
+
+
+class ParserTests(unittest.TestCase):
+    def test_parse_caps(self):
+        self.assertEqual(
+            {"batch": "", "sasl": "PLAIN,EXTERNAL"},
+            parse_caps("batch sasl=PLAIN,EXTERNAL"),
+        )
+
+    def test_parse_server_time(self):
+        self.assertEqual(NOON, parse_server_time("2024-05-01T12:00:00.000Z"))
+        self.assertEqual(
+            NOON + 0.25, parse_server_time("2024-05-01T12:00:00.250Z")
+        )
+        self.assertIsNone(parse_server_time("yesterday"))
+
+
+class CapabilityTests(unittest.TestCase):
+    def setUp(self):
+        self.irc = IRC(nick="me", ui_backend="null")
+        self.sent = []
+        self.irc.send = lambda line, urgent=False: self.sent.append(line)
+        self.irc.process_line(":me!u@h JOIN #a")
+        self.irc.process_line(":srv 353 me = #a :me @+op!o@h +bob!b@h")
+        self.irc.process_line(":srv 366 me #a :End")
+        self.buffer = self.irc.get_channel_buffer("#a")
+
+    def tearDown(self):
+        self.irc.ui.quit()
+
+    def test_negotiation(self):
+        self.irc.login("me", "u", "n", "h", "s")
+        self.assertEqual("CAP LS 302", self.sent[0])
+        self.irc.process_line(":srv CAP * LS * :sasl server-time away-notify")
+        self.irc.process_line(":srv CAP * LS :batch multi-prefix")
+        self.assertEqual(
+            "CAP REQ :batch server-time multi-prefix away-notify",
+            self.sent[-1],
+        )
+        self.irc.process_line(
+            ":srv CAP me ACK :batch server-time multi-prefix away-notify"
+        )
+        self.assertEqual("CAP END", self.sent[-1])
+        self.assertIn("server-time", self.irc.caps)
+        self.irc.process_line(":srv CAP me DEL :away-notify")
+        self.assertNotIn("away-notify", self.irc.caps)
+        self.assertEqual(1, self.sent.count("CAP END"))
+
+    def test_nak_and_nothing_wanted_end_negotiation(self):
+        self.irc.login("me", "u", "n", "h", "s")
+        self.irc.process_line(":srv CAP * LS :batch")
+        self.irc.process_line(":srv CAP me NAK :batch")
+        self.assertEqual("CAP END", self.sent[-1])
+        self.irc.login("me", "u", "n", "h", "s")
+        self.irc.process_line(":srv CAP * LS :sasl")
+        self.assertEqual("CAP END", self.sent[-1])
+
+    def test_prefixes_and_hosts_in_names(self):
+        self.assertEqual(["@op", "+bob", "me"], list(self.buffer.nicknames))
+
+    def test_server_time(self):
+        self.irc.process_line(
+            "@time=2024-05-01T12:00:00.000Z :bob!b@h PRIVMSG #a :old"
+        )
+        self.irc.process_line(":bob!b@h PRIVMSG #a :new")
+        old, new = list(self.buffer.scrollback.entries)[-2:]
+        self.assertEqual(NOON, old[0])
+        self.assertGreater(new[0], NOON)
+        self.assertIsNone(self.irc.message_time)
+
+    def test_batch_applied_at_once(self):
+        batches = []
+        backend = self.irc.ui.backend
+        original = backend.batch
+
+        @contextmanager
+        def counting_batch():
+            batches.append(len(self.buffer.nicknames))
+            with original():
+                yield
+
+        backend.batch = counting_batch
+        lines = len(self.buffer.scrollback)
+        self.irc.process_line(":srv BATCH +ns netsplit a.net b.net")
+        self.irc.process_line("@batch=ns :op!o@h QUIT :a.net b.net")
+        self.irc.process_line("@batch=ns :bob!b@h QUIT :a.net b.net")
+        self.assertEqual(3, len(self.buffer.nicknames))
+        self.irc.process_line(":srv BATCH -ns")
+        self.assertEqual(["me"], list(self.buffer.nicknames))
+        self.assertEqual([3], batches)
+        self.assertEqual(lines + 1, len(self.buffer.scrollback))
+        self.assertEqual(
+            "== Netsplit a.net b.net: 2 quit",
+            self.buffer.scrollback.entries[-1][3],
+        )
+
+    def test_nested_batch(self):
+        self.irc.process_line(":srv BATCH +outer example")
+        self.irc.process_line("@batch=outer :srv BATCH +inner netjoin a b")
+        self.irc.process_line("@batch=inner :carol!c@h JOIN #a")
+        self.irc.process_line("@batch=outer :srv BATCH -inner")
+        self.irc.process_line("@batch=outer :bob!b@h PRIVMSG #a :after")
+        self.assertNotIn("carol", self.buffer.nicknames)
+        self.irc.process_line(":srv BATCH -outer")
+        self.assertIn("carol", self.buffer.nicknames)
+        self.assertEqual({}, self.irc.batches)
+        entries = list(self.buffer.scrollback.entries)
+        texts = [entry[3] for entry in entries[-2:]]
+        self.assertEqual(["== Netjoin a b: 1 joined", "after"], texts)
+
+    def test_away_notify(self):
+        query = self.irc.ui.open_buffer(self.irc, "bob")
+        self.irc.process_line(":bob!b@h AWAY :lunch")
+        self.assertEqual("lunch", self.irc.away["bob"])
+        self.irc.process_line(":bob!b@h AWAY")
+        self.assertNotIn("bob", self.irc.away)
+        texts = [entry[3] for entry in query.scrollback.entries]
+        self.assertEqual(["== bob is away: lunch", "== bob is back"], texts)
+
+    def test_extended_join(self):
+        self.irc.process_line(":carol!c@h JOIN #a carol_acct :Carol C")
+        self.assertIn("carol", self.buffer.nicknames)
+
+
+if __name__ == "__main__":
+    unittest.main()
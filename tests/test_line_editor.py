@@ -0,0 +1,104 @@
+import unittest
+import sys
+import os
+
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), os.path.pardir)
+)
+
+from irc_client import IRC
+from line_editor import KeyDecoder, LineEditor
+
+
+def feed(decoder, data):
+    if isinstance(data, str):
+        data = data.encode()
+    events = [decoder.feed(byte) for byte in data]
+    return [event for event in events if event is not None]
+
+
+class KeyDecoderTests(unittest.TestCase):
+    def test_utf8_split_across_keycodes(self):
+        self.assertEqual(
+            [("text", "a"), ("text", "é"), ("text", "ж")],
+            feed(KeyDecoder(), "aéж"),
+        )
+
+    def test_bracketed_paste_is_one_event(self):
+        decoder = KeyDecoder()
+        events = feed(decoder, "x\x1b[200~one\rtwö\nthree\x1b[201~")
+        self.assertEqual(
+            [("text", "x"), ("paste", "one\ntwö\nthree")], events
+        )
+
+    def test_alt_digit_and_control_keys(self):
+        self.assertEqual(
+            [("alt", "3"), ("key", 1), ("key", 10)],
+            feed(KeyDecoder(), "\x1b3\x01\n"),
+        )
+
+    def test_unknown_sequences_are_dropped(self):
+        self.assertEqual([("text", "a")], feed(KeyDecoder(), "\x1b[1;5Da"))
+
+
+class LineEditorTests(unittest.TestCase):
+    def test_cursor_editing(self):
+        editor = LineEditor()
+        editor.insert("helo world")
+        for _ in range(7):
+            editor.left()
+        editor.insert("l")
+        editor.end()
+        editor.backspace()
+        self.assertEqual("hello worl", editor.text)
+        editor.home()
+        editor.delete()
+        self.assertEqual("ello worl", editor.text)
+        editor.end()
+        editor.kill_word()
+        self.assertEqual("ello ", editor.text)
+
+    def test_history_keeps_draft(self):
+        editor = LineEditor()
+        for line in ["one", "two", "two"]:
+            editor.insert(line)
+            editor.submit()
+        self.assertEqual(["one", "two"], editor.history)
+        editor.insert("dra")
+        editor.history_previous()
+        editor.history_previous()
+        editor.history_previous()
+        self.assertEqual("one", editor.text)
+        editor.history_next()
+        editor.history_next()
+        self.assertEqual("dra", editor.text)
+
+    def test_take_lines_leaves_partial_line(self):
+        editor = LineEditor()
+        editor.insert("a\n\nb\nc")
+        self.assertEqual(["a", "b"], editor.take_lines())
+        self.assertEqual("c", editor.text)
+
+    def test_view_follows_cursor(self):
+        editor = LineEditor()
+        editor.insert("abcdefgh")
+        self.assertEqual(("fgh", 3), editor.view(4))
+        editor.home()
+        self.assertEqual(("abcd", 0), editor.view(4))
+
+
+class PasteTests(unittest.TestCase):
+    def test_paste_is_sent_as_text(self):
+        irc = IRC(nick="bot", ui_backend="null")
+        irc.connected = True
+        sent = []
+        irc.send = sent.append
+        irc.process_line(":bot!u@h JOIN #test")
+        irc.keyboard.parse_input(["/not a command", "second"])
+        self.assertEqual(
+            ["PRIVMSG #test :/not a command", "PRIVMSG #test :second"], sent
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+import unittest
+import sys
+import os
+
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), os.path.pardir)
+)
+
+from event_loop import EventLoop
+from fake_ircd import RelayIRCServer
+from irc_client import IRC
+from loadgen import parse_args, run_load
+
+
+class InstanceStateTests(unittest.TestCase):
+    def test_instances_share_nothing(self):
+        loop = EventLoop()
+        first = IRC(nick="one", ui_backend="null", loop=loop)
+        second = IRC(nick="two", ui_backend="null", loop=loop)
+        self.assertIsNot(first.rx_queue, second.rx_queue)
+        self.assertIsNot(first.stop_thread_request, second.stop_thread_request)
+        self.assertIsNot(first.handlers, second.handlers)
+        first.process_line(":one!u@h JOIN #a")
+        first.process_line(":srv 353 one = #a :one x y")
+        first.process_line(":srv 366 one #a :End")
+        self.assertEqual({}, second.channels)
+        self.assertEqual(0, len(second.nicknames))
+        first.rx_queue.put("PING :x")
+        self.assertTrue(second.rx_queue.empty())
+
+
+class LoadGeneratorTests(unittest.TestCase):
+    def test_clients_talk_through_relay(self):
+        server = RelayIRCServer()
+        options = parse_args(
+            [
+                "--connect",
+                f"127.0.0.1:{server.port}",
+                "--clients",
+                "30",
+                "--channels",
+                "3",
+                "--rate",
+                "10",
+                "--nick-interval",
+                "0.3",
+                "--ramp",
+                "0.3",
+                "--duration",
+                "1",
+            ]
+        )
+        results = run_load(options)
+        server.close()
+        self.assertEqual(30, results["ready"])
+        self.assertEqual(0, results["failed"])
+        self.assertGreater(results["sent"], 0)
+        self.assertGreater(results["received"], results["sent"])
+        self.assertGreater(results["nick_changes"], 0)
+        self.assertEqual(results["received"], results["latency"]["count"])
+
+
+if __name__ == "__main__":
+    unittest.main()
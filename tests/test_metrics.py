@@ -0,0 +1,97 @@
+import unittest
+import json
+import sys
+import os
+import socket
+import tempfile
+
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), os.path.pardir)
+)
+
+from event_loop import EventLoop
+from irc_client import IRC
+from metrics import Histogram, MetricsExporter, RateMeter
+
+
+class HistogramTests(unittest.TestCase):
+    def test_percentiles_are_bucket_bounds(self):
+        histogram = Histogram()
+        for _ in range(99):
+            histogram.record(0.000010)
+        histogram.record(0.005)
+        summary = histogram.summary()
+        self.assertEqual(100, summary["count"])
+        self.assertEqual(16, summary["p50_us"])
+        self.assertEqual(16, summary["p99_us"])
+        self.assertEqual(5000, summary["max_us"])
+
+    def test_empty(self):
+        self.assertEqual(0, Histogram().summary()["p99_us"])
+
+
+class RateMeterTests(unittest.TestCase):
+    def test_rate_between_samples(self):
+        rates = RateMeter()
+        self.assertEqual(0, rates.rate("rx", 100, 10.0))
+        self.assertEqual(50, rates.rate("rx", 200, 12.0))
+        self.assertEqual(0, rates.rate("rx", 10, 13.0))
+
+
+class MetricsExporterTests(unittest.TestCase):
+    def test_writes_json_lines_to_file(self):
+        handle, path = tempfile.mkstemp()
+        os.close(handle)
+        exporter = MetricsExporter(path, lambda: {"x": 1}, EventLoop())
+        exporter.export()
+        exporter.export()
+        exporter.close()
+        with open(path) as output:
+            self.assertEqual([{"x": 1}] * 2, list(map(json.loads, output)))
+        os.remove(path)
+
+    def test_unix_socket_without_listener_is_not_fatal(self):
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, "metrics.sock")
+        exporter = MetricsExporter(
+            "unix:" + path, lambda: {"x": 1}, EventLoop()
+        )
+        exporter.export()
+        self.assertIsNone(exporter.sock)
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(path)
+        listener.listen(1)
+        exporter.export()
+        client, _ = listener.accept()
+        client.settimeout(1)
+        received = b""
+        while received.count(b"\n") < 2:
+            received += client.recv(4096)
+        self.assertEqual(b'{"x":1}\n' * 2, received)
+        exporter.close()
+        client.close()
+        listener.close()
+        os.remove(path)
+        os.rmdir(directory)
+
+
+class ClientMetricsTests(unittest.TestCase):
+    def test_samples_parse_and_handle(self):
+        irc = IRC(nick="bot", ui_backend="null")
+        irc.process_line(":bot!u@h JOIN #test")
+        irc.process_line(":srv 353 bot = #test :bot a b c")
+        irc.process_line(":srv 366 bot #test :End")
+        for i in range(irc.metrics_sample * 2):
+            irc.process_line(f":a!u@h PRIVMSG #test :line {i}")
+        metrics = irc.ui.get_metrics(RateMeter())
+        connection = metrics["connections"][0]
+        self.assertEqual(2, connection["parse"]["count"])
+        self.assertEqual(2, connection["handle"]["count"])
+        self.assertEqual({"#test": 4}, connection["nicks"]["channels"])
+        self.assertEqual(0, connection["rx"]["bytes"])
+        irc.reset_metrics()
+        self.assertEqual(0, irc.parse_time.count)
+
+
+if __name__ == "__main__":
+    unittest.main()
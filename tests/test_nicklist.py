@@ -0,0 +1,60 @@
+import random
+import unittest
+import sys
+import os
+
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), os.path.pardir)
+)
+
+from nicklist import NickList
+
+
+class NickListTests(unittest.TestCase):
+    def test_prefix_ordering(self):
+        nicks = NickList(["bob", "+carol", "@alice", "Dave", "@+eve"])
+        self.assertEqual(["@alice", "@eve", "+carol", "bob", "Dave"], list(
+            nicks
+        ))
+        self.assertIn("eve", nicks)
+        self.assertIn("@Alice", nicks)
+        self.assertNotIn("mallory", nicks)
+
+    def test_add_remove_return_changed_row(self):
+        nicks = NickList(["alice", "carol"])
+        self.assertEqual(1, nicks.add("bob"))
+        self.assertIsNone(nicks.add("bob"))
+        self.assertEqual(0, nicks.add("@zed"))
+        self.assertEqual(["@zed", "alice", "bob", "carol"], list(nicks))
+        self.assertEqual(2, nicks.remove("bob"))
+        self.assertIsNone(nicks.remove("bob"))
+        self.assertEqual(3, len(nicks))
+
+    def test_rename_keeps_prefix(self):
+        nicks = NickList(["@alice", "bob"])
+        self.assertEqual(0, nicks.rename("alice", "zoe"))
+        self.assertEqual(["@zoe", "bob"], list(nicks))
+        self.assertIsNone(nicks.rename("mallory", "trent"))
+
+    def test_userhost_in_names(self):
+        nicks = NickList(["@alice!a@example.com", "bob!b@example.org"])
+        self.assertEqual(["@alice", "bob"], list(nicks))
+
+    def test_matches_sorted_list_across_blocks(self):
+        nicks = NickList()
+        nicks.block_size = 8
+        expected = set()
+        rng = random.Random(1)
+        for _ in range(2000):
+            nick = f"user{rng.randrange(300)}"
+            if nick in expected and rng.random() < 0.5:
+                index = nicks.remove(nick)
+                self.assertEqual(sorted(expected).index(nick), index)
+                expected.remove(nick)
+            elif nick not in expected:
+                expected.add(nick)
+                self.assertEqual(sorted(expected).index(nick), nicks.add(nick))
+        self.assertEqual(sorted(expected), list(nicks))
+        self.assertEqual(sorted(expected)[10:25], nicks.slice(10, 25))
+        for nick in expected:
+            self.assertEqual(sorted(expected).index(nick), nicks.index(nick))
@@ -0,0 +1,138 @@
+import unittest
+import socket
+import sys
+import time
+import os
+
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), os.path.pardir)
+)
+
+from event_loop import EventLoop
+from irc_client import IRC
+from outbound import SendQueue, TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TokenBucketTests(unittest.TestCase):
+    def test_burst_then_steady_rate(self):
+        clock = FakeClock()
+        bucket = TokenBucket(3, 0.5, clock)
+        self.assertEqual([True, True, True, False], [
+            bucket.consume() for _ in range(4)
+        ])
+        self.assertAlmostEqual(2.0, bucket.delay())
+        clock.now = 2.0
+        self.assertTrue(bucket.consume())
+        self.assertFalse(bucket.consume())
+
+
+class SendQueueTests(unittest.TestCase):
+    def setUp(self):
+        self.loop = EventLoop()
+        self.local, self.remote = socket.socketpair()
+        self.clock = FakeClock()
+        self.errors = []
+        self.queue = SendQueue(
+            self.local,
+            TokenBucket(2, 1, self.clock),
+            self.loop,
+            lambda: self.errors.append(True),
+        )
+
+    def tearDown(self):
+        self.queue.close()
+        self.local.close()
+        self.remote.close()
+
+    def test_commands_are_paced_and_coalesced(self):
+        self.queue.put("PRIVMSG #test :one")
+        self.queue.put("PRIVMSG #test :two")
+        self.queue.put("PRIVMSG #test :three")
+        self.assertEqual(
+            b"PRIVMSG #test :one\nPRIVMSG #test :two\n",
+            self.remote.recv(4096),
+        )
+        self.assertEqual(1, self.queue.depth())
+        self.clock.now = 1.0
+        self.queue.put("PRIVMSG #test :four")
+        self.assertEqual(b"PRIVMSG #test :three\n", self.remote.recv(4096))
+        self.assertEqual(1, self.queue.depth())
+
+    def test_urgent_commands_skip_the_queue(self):
+        for i in range(4):
+            self.queue.put(f"PRIVMSG #test :{i}")
+        self.remote.recv(4096)
+        self.queue.put("PONG :server", urgent=True)
+        self.assertEqual(b"PONG :server\n", self.remote.recv(4096))
+        self.assertEqual(2, self.queue.depth())
+
+    def test_drain_respects_flood_control(self):
+        for i in range(4):
+            self.queue.put(f"PRIVMSG #test :{i}")
+        self.remote.recv(4096)
+        self.clock.now = 1.0
+        self.queue.put("QUIT :bye", urgent=True)
+        self.queue.drain()
+        self.assertEqual(
+            b"QUIT :bye\nPRIVMSG #test :2\n", self.remote.recv(4096)
+        )
+        self.assertEqual(0, self.queue.depth())
+        self.remote.setblocking(False)
+        with self.assertRaises(BlockingIOError):
+            self.remote.recv(4096)
+
+    def test_drain_gives_up_on_a_stuck_peer(self):
+        self.local.settimeout(None)
+        self.queue.drain_timeout = 0.1
+        self.queue.max_write = 1 << 24
+        self.queue.pending += b"x" * (1 << 24)
+        start = time.monotonic()
+        self.queue.drain()
+        self.assertLess(time.monotonic() - start, 2)
+        self.assertIsNone(self.local.gettimeout())
+
+    def test_send_error_closes_queue(self):
+        self.remote.close()
+        self.queue.put("QUIT")
+        self.queue.put("QUIT")
+        self.assertEqual([True], self.errors)
+        self.assertTrue(self.queue.closed)
+
+
+class CtcpReplyTests(unittest.TestCase):
+    def setUp(self):
+        self.irc = IRC(nick="me", ui_backend="null")
+        self.local, self.remote = socket.socketpair()
+        self.remote.setblocking(False)
+        self.irc.use_socket(self.local, TokenBucket(5, 0.5))
+
+    def tearDown(self):
+        self.irc.connected = False
+        self.irc.ui.quit()
+        self.irc.outbound.close()
+        self.local.close()
+        self.remote.close()
+
+    def test_many_senders_cannot_flood_or_starve_us(self):
+        for i in range(500):
+            self.irc.process_line(f":n{i}!u@h PRIVMSG me :\x01VERSION\x01")
+        self.assertEqual(0, self.irc.outbound.depth())
+        self.irc.send("PRIVMSG #test :still here")
+        sent = self.remote.recv(65536).decode().splitlines()
+        self.assertEqual(self.irc.ctcp_total_burst + 1, len(sent))
+        self.assertEqual("PRIVMSG #test :still here", sent[-1])
+
+    def test_no_replies_behind_a_backlog(self):
+        for i in range(10):
+            self.irc.send(f"PRIVMSG #test :{i}")
+        self.irc.process_line(":bob!u@h PRIVMSG me :\x01VERSION\x01")
+        queued = [entry[0] for entry in self.irc.outbound.commands]
+        self.assertFalse(any(line.startswith(b"NOTICE") for line in queued))
@@ -10,12 +10,23 @@ sys.path.append(
 )
 
 from irc_client import SocketThread, IRC
+from framing import LineFramer
+from irc_message import parse_line
 
 
 def socket_iterator(*args):
     yield from args
     while True:
-        yield ""
+        yield b""
+
+
+def recv_into_side_effect(chunks):
+    def recv_into(buffer, size=0):
+        chunk = next(chunks)
+        buffer[: len(chunk)] = chunk
+        return len(chunk)
+
+    return recv_into
 
 
 class ParsePacketTests(unittest.TestCase):
@@ -38,15 +49,19 @@ class ParsePacketTests(unittest.TestCase):
         self.event = None
 
     def test_socket_thread_work(self):
-        self.socket.recv = Mock()
-        self.socket.recv.side_effect = socket_iterator(
-            bytes(
-                "weber.freenode.net NOTICE * :*** Looking up your hostname\n",
-                "utf-8",
-            ),
-            bytes(
-                "weber.freenode.net NOTICE * :*** Checking Ident\n", "utf-8"
-            ),
+        self.socket.recv_into = Mock()
+        self.socket.recv_into.side_effect = recv_into_side_effect(
+            socket_iterator(
+                bytes(
+                    "weber.freenode.net NOTICE * "
+                    ":*** Looking up your hostname\n",
+                    "utf-8",
+                ),
+                bytes(
+                    "weber.freenode.net NOTICE * :*** Checking Ident\n",
+                    "utf-8",
+                ),
+            )
         )
 
         self.socket_thread.start()
@@ -81,3 +96,101 @@ class ParsePacketTests(unittest.TestCase):
             ["MODE", "#test", "+v", "Zeliboba"],
         )
         self.assertEqual(expected, IRC.parse_message(message))
+
+    def test_PRIVMSG_prefix_split(self):
+        message = parse_line(
+            ":alice!~alice@unaffiliated/alice PRIVMSG #test :hello there"
+        )
+        self.assertEqual("PRIVMSG", message.command)
+        self.assertEqual(["#test", "hello there"], message.params)
+        self.assertEqual("alice", message.nick)
+        self.assertEqual("~alice", message.user)
+        self.assertEqual("unaffiliated/alice", message.host)
+
+    def test_prefix_without_user(self):
+        message = parse_line(":alice@host PRIVMSG #test :hi")
+        self.assertEqual(
+            ("alice", "", "host"), (message.nick, message.user, message.host)
+        )
+        message = parse_line(":irc.server.net 001 alice :Welcome")
+        self.assertEqual("irc.server.net", message.nick)
+
+    def test_tags_parse(self):
+        message = parse_line(
+            "@time=2020-01-05T21:41:03.123Z;+draft/label=a\\sb\\:c;flag "
+            ":nick!user@host PRIVMSG #test :tagged"
+        )
+        self.assertEqual(
+            ("nick!user@host", "PRIVMSG", ["#test", "tagged"]),
+            message.as_tuple(),
+        )
+        self.assertEqual(
+            {
+                "time": "2020-01-05T21:41:03.123Z",
+                "+draft/label": "a b;c",
+                "flag": "",
+            },
+            message.tags,
+        )
+
+    def test_empty_line_parse(self):
+        message = parse_line("")
+        self.assertEqual(("", "", []), message.as_tuple())
+        self.assertEqual({}, message.tags)
+        message = parse_line("@a=b :irc.server.net")
+        self.assertEqual(("irc.server.net", "", []), message.as_tuple())
+        self.assertEqual({"a": "b"}, message.tags)
+
+    def test_message_unpacks_like_tuple(self):
+        prefix, command, args = parse_line("PING :weber.freenode.net")
+        self.assertEqual(("", "PING", ["weber.freenode.net"]), (
+            prefix, command, args
+        ))
+
+
+class LineFramerTests(unittest.TestCase):
+    def setUp(self):
+        self.framer = LineFramer(read_size=16, max_line_length=32)
+
+    def test_lines_split_across_reads(self):
+        self.assertEqual([], self.framer.feed(b"PING :tol"))
+        self.assertEqual(
+            ["PING :tolsun.oulu.fi", "PING :x"],
+            self.framer.feed(b"sun.oulu.fi\r\nPING :x\nPI"),
+        )
+        self.assertEqual(["PING :y"], self.framer.feed(b"NG :y\r\n"))
+        self.assertEqual(0, self.framer.pending())
+
+    def test_invalid_utf8_is_replaced(self):
+        self.assertEqual(
+            ["PRIVMSG #test :caf\ufffd"],
+            self.framer.feed(b"PRIVMSG #test :caf\xe9\r\n"),
+        )
+
+    def test_overlong_line_is_dropped(self):
+        self.framer.feed(b"PRIVMSG #test :" + b"x" * 40)
+        self.assertEqual(
+            ["PING :after"], self.framer.feed(b"xxxx\r\nPING :after\r\n")
+        )
+        self.assertEqual(1, self.framer.dropped_lines)
+
+    def test_complete_overlong_line_is_dropped(self):
+        line = b"x" * 40 + b"\r\n"
+        self.assertEqual([], self.framer.feed(line))
+        for split in (20, 30):
+            self.assertEqual([], self.framer.feed(line[:split]))
+            self.assertEqual(
+                ["PING :ok"], self.framer.feed(line[split:] + b"PING :ok\r\n")
+            )
+        self.assertEqual(["y" * 32], self.framer.feed(b"y" * 32 + b"\n"))
+        self.assertEqual(3, self.framer.dropped_lines)
+
+    def test_fill_uses_recv_into(self):
+        sock = Mock()
+        sock.recv_into.side_effect = recv_into_side_effect(
+            iter([b"NOTICE * :a\r\nNOT", b"ICE * :b\r\n"])
+        )
+        self.assertEqual(16, self.framer.fill(sock))
+        self.assertEqual(["NOTICE * :a"], self.framer.pop_lines())
+        self.framer.fill(sock)
+        self.assertEqual(["NOTICE * :b"], self.framer.pop_lines())
@@ -0,0 +1,73 @@
+import unittest
+import sys
+import os
+import tempfile
+import threading
+
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), os.path.pardir)
+)
+
+from profiling import MemoryProfiler, Profiler
+
+
+def busy_loop(stop):
+    while not stop.is_set():
+        sum(range(100))
+
+
+class ProfilerTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        for name in os.listdir(self.directory):
+            os.remove(os.path.join(self.directory, name))
+        os.rmdir(self.directory)
+
+    def test_profile_covers_main_and_other_threads(self):
+        stop = threading.Event()
+        worker = threading.Thread(target=busy_loop, args=(stop,))
+        worker.start()
+        profiler = Profiler()
+        profiler.start()
+        self.assertTrue(profiler.running)
+        sorted(range(10000), key=lambda value: -value)
+        threading.Event().wait(0.05)
+        path = os.path.join(self.directory, "run.prof")
+        lines = profiler.stop(path)
+        stop.set()
+        worker.join()
+        self.assertFalse(profiler.running)
+        self.assertTrue(os.path.exists(path))
+        self.assertTrue(os.path.exists(path + ".txt"))
+        report = "\n".join(lines)
+        self.assertIn("<lambda>", report)
+        self.assertIn("busy_loop", report)
+
+    def test_failed_dump_stops_the_profiler(self):
+        profiler = Profiler()
+        profiler.start()
+        path = os.path.join(self.directory, "missing", "run.prof")
+        with self.assertRaises(OSError):
+            profiler.stop(path)
+        self.assertFalse(profiler.running)
+        profiler.start()
+        self.assertTrue(profiler.running)
+        profiler.stop(os.path.join(self.directory, "run.prof"))
+
+    def test_memory_diff_shows_growth(self):
+        profiler = MemoryProfiler()
+        self.assertIsNone(profiler.diff())
+        profiler.snapshot()
+        kept = [bytearray(1024) for _ in range(256)]
+        path = os.path.join(self.directory, "mem.txt")
+        lines = profiler.diff(path)
+        profiler.stop()
+        self.assertIn("test_profiling.py", "\n".join(lines[1:3]))
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(256, len(kept))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+import unittest
+import sys
+import os
+import tempfile
+
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), os.path.pardir)
+)
+
+from irc_client import IRC
+from rules import RuleError, RuleSet, load_rules, parse_rule
+
+RULES = """
+# noisy bots and join/part spam
+drop nick ^\\w+bot$
+drop:join,part,quit channel ^#huge$
+dim host \\.example\\.com$
+highlight text \\b(deploy|outage)\\b
+"""
+
+
+class RuleSetTests(unittest.TestCase):
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp()
+        with os.fdopen(handle, "w") as rules_file:
+            rules_file.write(RULES)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_load_and_match(self):
+        rules = load_rules(self.path)
+        self.assertEqual(4, len(rules))
+        match = rules.match("message", "LogBot", "h", "#c", "hi")
+        self.assertEqual("drop", match.action)
+        match = rules.match("message", "bob", "a.example.com", "#c", "hi")
+        self.assertEqual("dim", match.action)
+        match = rules.match("message", "bob", "h", "#c", "Outage now")
+        self.assertEqual("highlight", match.action)
+        self.assertIsNone(rules.match("message", "bob", "h", "#c", "hi"))
+        match = rules.match("join", "a", "h", "#huge", "")
+        self.assertEqual("drop", match.action)
+        self.assertIsNone(rules.match("join", "a", "h", "#small", ""))
+        self.assertEqual([1, 1, 1, 1], [n for _, n in rules.counts()])
+
+    def test_drop_wins_over_other_actions(self):
+        rules = RuleSet(
+            [parse_rule("highlight text deploy"), parse_rule("drop nick bot")]
+        )
+        self.assertEqual(
+            "drop", rules.match("message", "bot", "", "", "deploy").action
+        )
+
+    def test_errors_name_the_line(self):
+        with open(self.path, "a") as rules_file:
+            rules_file.write("drop text (unclosed\n")
+        with self.assertRaisesRegex(RuleError, ":7: bad pattern"):
+            load_rules(self.path)
+        with self.assertRaises(RuleError):
+            parse_rule("erase nick x")
+
+    def test_patterns_that_cannot_be_combined(self):
+        for pattern in ("(?i)spam", "(a)\\1", "(a)(b)\\2"):
+            with self.subTest(pattern=pattern):
+                with self.assertRaises(RuleError):
+                    parse_rule(f"drop text {pattern}")
+        rules = RuleSet(
+            [
+                parse_rule("drop text ^x$"),
+                parse_rule("drop text (?P<word>a)-(?P=word)"),
+            ]
+        )
+        match = rules.match("message", "", "", "", "a-a")
+        self.assertEqual("(?P<word>a)-(?P=word)", match.pattern)
+        with open(self.path, "a") as rules_file:
+            rules_file.write("drop text (?P<word>b)\n")
+            rules_file.write("drop text (?P<word>c)\n")
+        with self.assertRaisesRegex(RuleError, "cannot be combined"):
+            load_rules(self.path)
+        irc = IRC(ui_backend="null")
+        self.assertFalse(irc.ui.load_rules(self.path))
+        irc.ui.quit()
+
+
+class ClientRulesTests(unittest.TestCase):
+    def test_rules_run_before_rendering(self):
+        handle, path = tempfile.mkstemp()
+        with os.fdopen(handle, "w") as rules_file:
+            rules_file.write(RULES)
+        irc = IRC(nick="me", ui_backend="null", rules_file=path)
+        os.remove(path)
+        irc.process_line(":me!u@h JOIN #huge")
+        irc.process_line(":srv 353 me = #huge :me")
+        irc.process_line(":srv 366 me #huge :End")
+        buffer = irc.ui.find_buffer(irc, "#huge")
+        before = len(buffer.scrollback)
+        irc.process_line(":a!u@h JOIN #huge")
+        irc.process_line(":newsbot!u@h PRIVMSG #huge :spam")
+        irc.process_line(":b!u@x.example.com PRIVMSG #huge :meh")
+        self.assertEqual(before + 1, len(buffer.scrollback))
+        self.assertEqual(irc.ui.dim_color, buffer.scrollback.entries[-1][2])
+        self.assertIn("a", buffer.nicknames)
+        irc.ui.show_buffer(irc.ui.buffers.buffers[0])
+        irc.process_line(":c!u@h PRIVMSG #huge :deploy done")
+        self.assertEqual(1, buffer.highlights)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+import unittest
+import sys
+import os
+
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), os.path.pardir)
+)
+
+from scrollback import Scrollback, ENTRY_OVERHEAD
+
+
+class ScrollbackTests(unittest.TestCase):
+    def setUp(self):
+        self.scrollback = Scrollback(max_lines=5)
+        self.scrollback.format = lambda entry: entry[3]
+
+    def test_evicts_by_line_count(self):
+        for i in range(8):
+            self.scrollback.append(f"line {i}", nick=f"nick{i % 2}")
+        self.assertEqual(5, len(self.scrollback))
+        self.assertEqual(3, self.scrollback.first_seq)
+        self.assertEqual("line 3", self.scrollback.entries[0][3])
+        self.assertEqual(2, len(self.scrollback.nick_ids))
+
+    def test_evicts_by_bytes(self):
+        scrollback = Scrollback(max_bytes=3 * (ENTRY_OVERHEAD + 10))
+        for i in range(5):
+            scrollback.append("x" * 10, nick=f"nick{i}")
+        self.assertEqual(3, len(scrollback))
+        self.assertEqual(["nick2", "nick3", "nick4"], sorted(
+            scrollback.nick_ids
+        ))
+
+    def test_page_is_bottom_aligned_and_wrapped(self):
+        self.scrollback.append("aaaaaa", 1)
+        self.scrollback.append("bb", 2)
+        rows, offset = self.scrollback.page(0, 3, 4)
+        self.assertEqual([(1, "aaaa"), (1, "aa"), (2, "bb")], rows)
+        rows, offset = self.scrollback.page(1, 2, 4)
+        self.assertEqual([(1, "aaaa"), (1, "aa")], rows)
+        rows, offset = self.scrollback.page(10, 2, 4)
+        self.assertEqual(1, offset)
+
+    def test_resize_only_wraps_visible_lines(self):
+        for i in range(5):
+            self.scrollback.append(f"line {i}")
+        self.scrollback.page(0, 2, 10)
+        self.assertEqual(2, len(self.scrollback.wrap_cache))
+        rows, offset = self.scrollback.page(0, 2, 3)
+        self.assertEqual([(0, "lin"), (0, "e 4")], rows)
+        self.assertEqual(1, len(self.scrollback.wrap_cache))
@@ -0,0 +1,210 @@
+import unittest
+import sys
+import os
+import shutil
+import tempfile
+
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), os.path.pardir)
+)
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from bench_startup import run_bench
+from fake_ircd import FakeIRCServer
+from irc_client import IRC
+from snapshot import (
+    BufferState,
+    Snapshot,
+    SnapshotError,
+    decode_snapshot,
+    encode_snapshot,
+    load_snapshot,
+    save_snapshot,
+)
+
+
+def make_snapshot():
+    return Snapshot(
+        "irc.example.net",
+        6697,
+        True,
+        "alice",
+        "#b",
+        [
+            BufferState(
+                "#a",
+                True,
+                True,
+                "Tópic",
+                ["@op", "+bob", "alice"],
+                [(1.5, 3, "bob", "hi ☃"), (2.0, 7, None, "bob left")],
+            ),
+            BufferState("#b", True, False, "", [], []),
+            BufferState("bob", False, False, "", [], [(3.0, 1, "bob", "")]),
+        ],
+        saved_at=100.0,
+    )
+
+
+class FormatTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "state")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_round_trip(self):
+        save_snapshot(self.path, make_snapshot())
+        snapshot = load_snapshot(self.path)
+        self.assertEqual(
+            ("irc.example.net", 6697, True, "alice", "#b", 100.0),
+            (
+                snapshot.server,
+                snapshot.port,
+                snapshot.tls,
+                snapshot.nick,
+                snapshot.active,
+                snapshot.saved_at,
+            ),
+        )
+        self.assertEqual(
+            ["#a", "#b", "bob"], [buffer.name for buffer in snapshot.buffers]
+        )
+        first = snapshot.buffers[0]
+        self.assertEqual(
+            (True, True, "Tópic"),
+            (first.is_channel, first.joined, first.topic),
+        )
+        self.assertEqual(["@op", "+bob", "alice"], first.nicknames)
+        self.assertEqual(
+            [(1.5, 3, "bob", "hi ☃"), (2.0, 7, None, "bob left")],
+            first.lines,
+        )
+        self.assertEqual([], snapshot.buffers[1].nicknames)
+        self.assertFalse(snapshot.buffers[2].is_channel)
+        self.assertFalse(os.path.exists(self.path + ".tmp"))
+
+    def test_rejects_bad_data(self):
+        data = encode_snapshot(make_snapshot())
+        for name, broken in (
+            ("magic", b"NOTASNAP" + data[8:]),
+            ("version", data[:8] + b"\xff\xff" + data[10:]),
+            ("truncated", data[:-3]),
+            ("header", data[:5]),
+        ):
+            with self.subTest(name=name):
+                with self.assertRaises(SnapshotError):
+                    decode_snapshot(broken)
+        open(self.path, "wb").close()
+        with self.assertRaises(SnapshotError):
+            load_snapshot(self.path)
+
+
+class WarmStartTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "state")
+        self.clients = []
+
+    def tearDown(self):
+        for irc in self.clients:
+            irc.connected = False
+            irc.ui.quit()
+        shutil.rmtree(self.directory)
+
+    def client(self, **options):
+        options.setdefault("nick", "alice")
+        irc = IRC(ui_backend="null", state_file=self.path, **options)
+        irc.sent = []
+        irc.send = lambda line, urgent=False: irc.sent.append(line)
+        self.clients.append(irc)
+        return irc
+
+    def test_quit_saves_state(self):
+        irc = self.client()
+        for line in (
+            ":alice!u@h JOIN #a",
+            ":server 332 alice #a :The topic",
+            ":server 353 alice = #a :@op bob alice",
+            ":server 366 alice #a :End",
+            ":bob!u@h PRIVMSG #a :hello",
+        ):
+            irc.process_line(line)
+        irc.server = "irc.example.net"
+        irc.port = 6667
+        irc.ui.quit()
+        snapshot = load_snapshot(self.path)
+        self.assertEqual(
+            ("irc.example.net", 6667, "#a"),
+            (snapshot.server, snapshot.port, snapshot.active),
+        )
+        (buffer,) = snapshot.buffers
+        self.assertEqual("The topic", buffer.topic)
+        self.assertTrue(buffer.joined)
+        self.assertEqual(["@op", "alice", "bob"], buffer.nicknames)
+        self.assertEqual("hello", buffer.lines[-1][3])
+        self.assertEqual("bob", buffer.lines[-1][2])
+
+    def test_restore_and_reconcile(self):
+        server = FakeIRCServer(welcome=False)
+        self.addCleanup(server.close)
+        snapshot = make_snapshot()
+        snapshot.server = "127.0.0.1"
+        snapshot.port = server.port
+        snapshot.tls = False
+        save_snapshot(self.path, snapshot)
+        irc = self.client(nick="")
+        self.assertEqual("alice", irc.nick)
+        self.assertIsNotNone(irc.connector)
+        self.assertEqual(("127.0.0.1", server.port), (irc.server, irc.port))
+        irc.disconnect()
+        active = irc.ui.buffers.active
+        self.assertEqual("#b", active.name)
+        channel = irc.get_channel_buffer("#a")
+        self.assertFalse(channel.joined)
+        self.assertEqual(["@op", "+bob", "alice"], list(channel.nicknames))
+        self.assertEqual(
+            ["hi ☃", "bob left"],
+            [entry[3] for entry in channel.scrollback.entries],
+        )
+        self.assertEqual(0, channel.unread)
+        self.assertIsNotNone(irc.ui.find_buffer(irc, "bob"))
+        irc.connected = True
+        irc.process_line(":server 001 alice :Welcome")
+        self.assertIn("JOIN #a,#b", irc.sent)
+        for line in (
+            ":alice!u@h JOIN #a",
+            ":server 353 alice = #a :alice carol",
+            ":server 366 alice #a :End",
+        ):
+            irc.process_line(line)
+        self.assertTrue(channel.joined)
+        self.assertEqual(["alice", "carol"], list(channel.nicknames))
+
+    def test_explicit_nick_wins(self):
+        save_snapshot(self.path, make_snapshot())
+        irc = self.client(nick="bob")
+        self.assertEqual("bob", irc.nick)
+
+    def test_corrupt_state_is_ignored(self):
+        with open(self.path, "wb") as output:
+            output.write(b"garbage")
+        irc = self.client()
+        self.assertIsNone(irc.snapshot)
+        status = irc.ui.buffers.status.scrollback.entries
+        self.assertTrue(
+            any("Ignoring state file" in entry[3] for entry in status)
+        )
+
+    def test_startup_bench(self):
+        result = run_bench(1, 2, 20, 10, 0)
+        self.assertGreaterEqual(result["warm"]["lines_on_first_screen"], 10)
+        self.assertLess(
+            result["cold"]["lines_on_first_screen"],
+            result["warm"]["lines_on_first_screen"],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
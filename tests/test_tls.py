@@ -0,0 +1,118 @@
+import unittest
+import sys
+import os
+import time
+
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), os.path.pardir)
+)
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from bench_tls import measure_reconnects
+from fake_ircd import TLS_CERT, FakeIRCServer, make_tls_context
+from irc_client import IRC
+from tls import parse_server_url
+
+
+class ServerUrlTests(unittest.TestCase):
+    def test_parse_server_url(self):
+        self.assertEqual(
+            ("irc.example.net", 6697, True),
+            parse_server_url("ircs://irc.example.net"),
+        )
+        self.assertEqual(
+            ("irc.example.net", 7000, True),
+            parse_server_url("ircs://irc.example.net:7000/"),
+        )
+        self.assertEqual(
+            ("irc.example.net", 6667, False),
+            parse_server_url("irc://irc.example.net"),
+        )
+        self.assertEqual(("::1", 6667, None), parse_server_url("[::1]:6667"))
+        self.assertEqual(("host", 6667, None), parse_server_url("host:6667"))
+        for value in ("host", "host:port", "http://host:80", "ircs://"):
+            with self.subTest(value=value):
+                with self.assertRaises(ValueError):
+                    parse_server_url(value)
+
+
+class TLSConnectionTests(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeIRCServer(tls=make_tls_context())
+        self.irc = None
+
+    def tearDown(self):
+        if self.irc is not None:
+            self.irc.ui.quit()
+        self.server.close()
+
+    def connect(self, threaded=False, **options):
+        options.setdefault("tls_cafile", TLS_CERT)
+        self.irc = IRC(
+            nick="bench",
+            ui_backend="null",
+            threaded=threaded,
+            reconnect=False,
+            tls=True,
+            **options,
+        )
+        self.irc.connect("127.0.0.1", self.server.port)
+        return self.irc
+
+    def drive(self, predicate, timeout=5):
+        deadline = time.monotonic() + timeout
+        while not predicate():
+            self.assertLess(time.monotonic(), deadline)
+            if self.irc.threaded:
+                self.irc.poll(0.01)
+            else:
+                self.irc.loop.run_once(0.01)
+
+    def last_line(self, name="#a"):
+        buffer = self.irc.ui.find_buffer(self.irc, name)
+        if buffer is None or not buffer.scrollback.entries:
+            return None
+        return buffer.scrollback.entries[-1][3]
+
+    def check_traffic(self, threaded):
+        irc = self.connect(threaded)
+        self.drive(lambda: irc.lines_processed >= 2)
+        self.assertIsNotNone(
+            self.server.wait_for(lambda line: line == "CAP LS 302")
+        )
+        self.server.send([":bench!u@h JOIN #a"])
+        # Each write of 64 lines of 256 bytes fills one 16 KiB TLS record,
+        # far more than a read, so most of it waits inside the TLS layer.
+        lines = [
+            f":bob!b@h PRIVMSG #a :{i:04} " + "x" * 228 for i in range(640)
+        ]
+        self.server.send(lines, chunk=64)
+        self.drive(lambda: self.last_line() == lines[-1].split(":")[2])
+        irc.ui.show_buffer(irc.ui.find_buffer(irc, "#a"))
+        irc.keyboard.parse_input("over tls")
+        self.assertIsNotNone(
+            self.server.wait_for(lambda line: line == "PRIVMSG #a :over tls")
+        )
+        self.assertIn("TLS", irc.last_handshake.describe())
+
+    def test_event_loop_connection(self):
+        self.check_traffic(False)
+
+    def test_threaded_connection(self):
+        self.check_traffic(True)
+
+    def test_untrusted_certificate_is_rejected(self):
+        irc = self.connect(tls_cafile=None)
+        self.drive(lambda: irc.connector is None)
+        self.assertFalse(irc.connected)
+        self.assertIsNone(irc.last_handshake)
+
+    def test_reconnect_resumes_session(self):
+        result = measure_reconnects(3, True)
+        self.assertEqual(3, result["resumed"])
+        result = measure_reconnects(3, False)
+        self.assertEqual(0, result["resumed"])
+
+
+if __name__ == "__main__":
+    unittest.main()
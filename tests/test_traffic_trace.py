@@ -0,0 +1,87 @@
+import unittest
+import sys
+import os
+import tempfile
+
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), os.path.pardir)
+)
+
+from irc_client import IRC
+from traffic_trace import (
+    RECEIVED,
+    SENT,
+    SESSION,
+    TraceFormatError,
+    TraceWriter,
+    read_trace,
+)
+
+
+class TrafficTraceTests(unittest.TestCase):
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix=".trace")
+        os.close(handle)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def write_session(self, lines):
+        writer = TraceWriter(self.path)
+        for kind, line in lines:
+            if kind == SENT:
+                writer.sent(line)
+            else:
+                writer.received(line)
+        writer.close()
+
+    def test_round_trip(self):
+        self.write_session([(SENT, "NICK bot"), (RECEIVED, "PING :x")])
+        self.write_session([(RECEIVED, ":a!b@c PRIVMSG #c :é")])
+        records = list(read_trace(self.path))
+        self.assertEqual(
+            [SESSION, SENT, RECEIVED, SESSION, RECEIVED],
+            [kind for kind, offset, line in records],
+        )
+        self.assertEqual(":a!b@c PRIVMSG #c :é", records[-1][2])
+        offsets = [offset for kind, offset, line in records[:3]]
+        self.assertEqual(sorted(offsets), offsets)
+
+    def test_rejects_other_files(self):
+        with open(self.path, "wb") as trace:
+            trace.write(b"PING :not a trace\r\n")
+        with self.assertRaises(TraceFormatError):
+            list(read_trace(self.path))
+
+    def test_replay_rebuilds_state(self):
+        self.write_session(
+            [
+                (SENT, "NICK bot"),
+                (RECEIVED, ":bot!u@h JOIN #test"),
+                (RECEIVED, ":srv 353 bot = #test :bot bob"),
+                (RECEIVED, ":srv 366 bot #test :End"),
+                (RECEIVED, ":bob!b@h PRIVMSG #test :hello"),
+            ]
+        )
+        irc = IRC(ui_backend="null")
+        finished = []
+        irc.replay(self.path, speed=0)
+        irc.replayer.on_finished = finished.append
+        while not finished:
+            irc.loop.run_once(0.01)
+        self.assertEqual("bot", irc.nick)
+        self.assertEqual(4, irc.replayer.lines)
+        buffer = irc.ui.find_buffer(irc, "#test")
+        self.assertEqual(["bob", "bot"], list(buffer.nicknames))
+        self.assertEqual("hello", buffer.scrollback.entries[-1][3])
+
+    def test_recording_client_writes_received_lines(self):
+        irc = IRC(ui_backend="null", record=self.path)
+        irc.process_line("PING :abc")
+        irc.trace.close()
+        records = list(read_trace(self.path))
+        self.assertEqual((RECEIVED, "PING :abc"), records[-1][::2])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,164 @@
+import ssl
+import time
+
+URL_SCHEMES = {"irc": False, "ircs": True}
+DEFAULT_PORTS = {False: 6667, True: 6697}
+
+
+def make_context(cafile=None, verify=True):
+    context = ssl.create_default_context(cafile=cafile)
+    if not verify:
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+    return context
+
+
+def parse_server_url(value):
+    # irc://host:port or ircs://host:port; a bare host:port keeps the
+    # caller's TLS setting.
+    tls = None
+    scheme, separator, rest = value.partition("://")
+    if separator:
+        if scheme.lower() not in URL_SCHEMES:
+            raise ValueError(f"Unknown scheme {scheme}")
+        tls = URL_SCHEMES[scheme.lower()]
+        value = rest.rstrip("/")
+    if value.startswith("["):
+        host, _, port = value[1:].partition("]")
+        port = port[1:]
+    elif value.count(":") == 1:
+        host, _, port = value.partition(":")
+    else:
+        host, port = value, ""
+    if not host:
+        raise ValueError("Missing server name")
+    if port:
+        if not port.isdigit():
+            raise ValueError("Port must be specified as an integer")
+        port = int(port)
+    elif tls is not None:
+        port = DEFAULT_PORTS[tls]
+    else:
+        raise ValueError("Missing port")
+    return host, port, tls
+
+
+class SessionCache:
+    def __init__(self):
+        self.sessions = {}
+
+    def get(self, host, port):
+        return self.sessions.get((host, port))
+
+    def store(self, host, port, sock):
+        # TLS 1.3 tickets only arrive after the handshake, so this is
+        # called again when the connection closes.
+        session = getattr(sock, "session", None)
+        if session is not None:
+            self.sessions[(host, port)] = session
+
+    def forget(self, host, port):
+        self.sessions.pop((host, port), None)
+
+
+class TLSHandshake:
+    def __init__(
+        self,
+        loop,
+        sock,
+        context,
+        hostname,
+        on_done,
+        on_failed,
+        timeout=10,
+        session=None,
+    ):
+        self.loop = loop
+        self.raw = sock
+        self.sock = None
+        self.context = context
+        self.hostname = hostname
+        self.on_done = on_done
+        self.on_failed = on_failed
+        self.timeout = timeout
+        self.session = session
+        self.timer = None
+        self.started = None
+        self.elapsed = None
+        self.done = False
+
+    def start(self):
+        self.started = time.perf_counter()
+        self.raw.setblocking(False)
+        try:
+            self.sock = self.context.wrap_socket(
+                self.raw,
+                server_hostname=self.hostname,
+                do_handshake_on_connect=False,
+                session=self.session,
+            )
+        except (OSError, ValueError) as error:
+            self.raw.close()
+            self.fail(error)
+            return
+        self.timer = self.loop.call_later(self.timeout, self.on_timeout)
+        self.step()
+
+    def step(self, sock=None):
+        try:
+            self.sock.do_handshake()
+        except ssl.SSLWantReadError:
+            self.wait(read=True)
+            return
+        except ssl.SSLWantWriteError:
+            self.wait(read=False)
+            return
+        except (OSError, ValueError) as error:
+            self.cancel()
+            self.fail(error)
+            return
+        self.elapsed = time.perf_counter() - self.started
+        self.finish()
+        self.on_done(self.sock)
+
+    def wait(self, read):
+        if read:
+            self.loop.remove_writer(self.sock)
+            self.loop.add_reader(self.sock, self.step)
+        else:
+            self.loop.remove_reader(self.sock)
+            self.loop.add_writer(self.sock, self.step)
+
+    @property
+    def resumed(self):
+        return self.sock is not None and self.sock.session_reused
+
+    def describe(self):
+        how = "resumed" if self.resumed else "full handshake"
+        return (
+            f"{self.sock.version()}, {how}, "
+            f"{self.elapsed * 1000:.1f} ms"
+        )
+
+    def finish(self):
+        self.done = True
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if self.sock is not None:
+            self.loop.remove_reader(self.sock)
+            self.loop.remove_writer(self.sock)
+
+    def fail(self, error):
+        self.done = True
+        self.on_failed(error)
+
+    def on_timeout(self):
+        self.timer = None
+        self.cancel()
+        self.fail("TLS handshake timed out")
+
+    def cancel(self):
+        self.finish()
+        if self.sock is not None:
+            self.sock.close()
@@ -0,0 +1,141 @@
+import struct
+import time
+
+RECEIVED = 0
+SENT = 1
+SESSION = 2
+TRACE_MAGIC = b"IRCTRACE 1"
+RECORD = struct.Struct("<BQH")
+MAX_RECORD_LENGTH = 0xFFFF
+
+
+class TraceFormatError(Exception):
+    pass
+
+
+class TraceWriter:
+    flush_interval = 1_000_000_000
+
+    def __init__(self, path):
+        self.file = open(path, "ab", buffering=64 * 1024)
+        self.start = time.monotonic_ns()
+        self.last_flush = self.start
+        self.records = 0
+        self.write(SESSION, TRACE_MAGIC, self.start)
+
+    def write(self, kind, data, now=None):
+        if now is None:
+            now = time.monotonic_ns()
+        data = data[:MAX_RECORD_LENGTH]
+        self.file.write(RECORD.pack(kind, now - self.start, len(data)))
+        self.file.write(data)
+        self.records += 1
+        if now - self.last_flush > self.flush_interval:
+            self.file.flush()
+            self.last_flush = now
+
+    def received(self, line):
+        self.write(RECEIVED, line.encode("utf-8", "replace"))
+
+    def sent(self, line):
+        self.write(SENT, line.encode("utf-8", "replace"))
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+
+
+def read_trace(path):
+    with open(path, "rb") as trace:
+        first = True
+        while True:
+            header = trace.read(RECORD.size)
+            if not header:
+                return
+            if len(header) < RECORD.size:
+                raise TraceFormatError("truncated record header")
+            kind, offset, length = RECORD.unpack(header)
+            data = trace.read(length)
+            if len(data) < length:
+                raise TraceFormatError("truncated record")
+            if first and (kind != SESSION or data != TRACE_MAGIC):
+                raise TraceFormatError("not a trace file")
+            first = False
+            yield kind, offset, data.decode("utf-8", "replace")
+
+
+class TraceReplayer:
+    time_slice = 0.02
+
+    def __init__(self, irc, path, speed=1.0, on_finished=None):
+        self.irc = irc
+        self.path = path
+        self.speed = speed
+        self.on_finished = on_finished
+        self.records = read_trace(path)
+        self.pending = None
+        self.session_start = 0
+        self.lines = 0
+        self.started = None
+        self.elapsed = 0
+        self.error = None
+
+    def start(self):
+        self.started = time.monotonic()
+        self.session_start = self.started
+        self.irc.loop.call_later(0, self.step)
+
+    def due(self, offset):
+        return self.session_start + offset / 1e9 / self.speed
+
+    def step(self):
+        deadline = time.monotonic() + self.time_slice
+        with self.irc.ui.batch():
+            while True:
+                record = self.pending
+                self.pending = None
+                if record is None:
+                    try:
+                        record = next(self.records, None)
+                    except (OSError, TraceFormatError) as e:
+                        self.error = e
+                        record = None
+                if record is None:
+                    self.finish()
+                    return
+                kind, offset, line = record
+                now = time.monotonic()
+                if kind == SESSION:
+                    self.session_start = now
+                    continue
+                if self.speed > 0 and self.due(offset) > now:
+                    self.pending = record
+                    self.irc.loop.call_later(
+                        self.due(offset) - now, self.step
+                    )
+                    return
+                self.apply(kind, line)
+                if now > deadline:
+                    self.irc.loop.call_later(0, self.step)
+                    return
+
+    def apply(self, kind, line):
+        if kind == RECEIVED:
+            self.lines += 1
+            self.irc.process_line(line)
+        elif kind == SENT and line.startswith("NICK "):
+            self.irc.nick = line[5:].lstrip(":")
+
+    def finish(self):
+        self.elapsed = time.monotonic() - self.started
+        if self.on_finished is not None:
+            self.on_finished(self)
+
+    def summary(self):
+        if self.error is not None:
+            return f"Replay of {self.path} failed: {self.error}"
+        rate = self.lines / self.elapsed if self.elapsed else 0
+        return (
+            f"Replayed {self.lines} lines from {self.path} "
+            f"in {self.elapsed:.3f}s ({rate:.0f} lines/s)"
+        )
@@ -0,0 +1,150 @@
+import os
+import select
+import stat
+import sys
+from contextlib import contextmanager
+
+
+class UIBackend:
+    banner = False
+    colors = 8
+
+    def __init__(self, irc, max_fps=30, buffer=None):
+        self.irc = irc
+        self.active = buffer
+        self.debug_enabled = False
+        self.input = None
+
+    def run(self):
+        while True:
+            self.irc.ui.poll()
+            yield None
+
+    def read_keyboard(self):
+        return iter(())
+
+    @contextmanager
+    def batch(self):
+        yield
+
+    def update(self):
+        pass
+
+    def add_message(self, buffer):
+        pass
+
+    def add_inactive_message(self, buffer):
+        pass
+
+    def add_debug_message(self, message):
+        pass
+
+    def show_buffer(self, buffer):
+        self.active = buffer
+
+    def set_activity(self, activity):
+        pass
+
+    def set_nicknames(self, nicknames, start=0):
+        pass
+
+    def redraw_input(self):
+        pass
+
+    def request_resize(self, query_terminal=False):
+        pass
+
+    def get_render_stats(self):
+        return {}
+
+    def init_colors(self):
+        pass
+
+    def toggle_debug(self):
+        self.debug_enabled = not self.debug_enabled
+
+    def shutdown(self):
+        pass
+
+
+class NullInterface(UIBackend):
+    def __init__(self, irc, max_fps=30, buffer=None):
+        super().__init__(irc, max_fps, buffer)
+        self.lines = 0
+
+    def add_message(self, buffer):
+        self.lines += 1
+
+    def add_inactive_message(self, buffer):
+        self.lines += 1
+
+    def get_render_stats(self):
+        return {"lines": self.lines}
+
+
+class StdoutInterface(UIBackend):
+    def __init__(self, irc, max_fps=30, buffer=None, stdin=None, stdout=None):
+        super().__init__(irc, max_fps, buffer)
+        self.input = stdin or sys.stdin
+        if not self.is_pollable(self.input):
+            self.input = None
+        self.output = stdout or sys.stdout
+        self.pending_input = ""
+        self.lines = 0
+
+    @staticmethod
+    def is_pollable(stream):
+        try:
+            mode = os.fstat(stream.fileno()).st_mode
+        except (OSError, ValueError):
+            return False
+        return stat.S_ISFIFO(mode) or stat.S_ISSOCK(mode) or stream.isatty()
+
+    def run(self):
+        while True:
+            self.irc.ui.poll()
+            if self.input is None:
+                yield None
+                continue
+            readable, _, _ = select.select([self.input], [], [], 0)
+            if readable:
+                yield from self.read_keyboard()
+
+    def read_keyboard(self):
+        data = os.read(self.input.fileno(), 4096)
+        if not data:
+            self.irc.loop.remove_reader(self.input)
+            self.input = None
+            lines = [self.pending_input]
+            self.pending_input = ""
+        else:
+            self.pending_input += data.decode("utf-8", "replace")
+            *lines, self.pending_input = self.pending_input.split("\n")
+        for line in lines:
+            line = line.rstrip("\r")
+            if line:
+                yield line
+
+    def write(self, buffer):
+        name = buffer.name if buffer.connection else "*"
+        entry = buffer.scrollback.entries[-1]
+        self.output.write(f"{name} {buffer.scrollback.format(entry)}\n")
+        self.output.flush()
+        self.lines += 1
+
+    def add_message(self, buffer):
+        self.write(buffer)
+
+    def add_inactive_message(self, buffer):
+        self.write(buffer)
+
+    def add_debug_message(self, message):
+        if self.debug_enabled:
+            self.output.write(f"debug {message}\n")
+            self.output.flush()
+
+    def get_render_stats(self):
+        return {"lines": self.lines}
+
+    def shutdown(self):
+        self.output.flush()